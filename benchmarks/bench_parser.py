@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the log line parser engines, measuring the number of lines parsed per second on a generated log file
+
+Usage: python -m benchmarks.bench_parser [--lines 2000000] [--path ./bench_access.log]
+"""
+import argparse
+import os
+import random
+import time
+
+from datetime import datetime, timedelta
+
+from lib.follower import FileFollower
+from lib.parser import LINE_PARSERS
+
+HOSTS = ['127.0.0.1', '10.0.0.2', '192.168.1.12']
+NAMES = ['john', 'mary', 'paul']
+METHODS = ['GET', 'POST', 'PUT']
+URL = ['/api/user', '/book/1', '/book/4', '/contact/3', '/', '/cooking/2', '/recipes', '/cleaning/3']
+PROTOCOL = ['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0']
+
+LINES_PER_SECOND = 1000  # Number of consecutive lines sharing the same date in the generated file
+
+
+def generate_log_file(file_path, line_count):
+    start = datetime(year=2018, month=12, day=12)
+
+    with open(file_path, 'w') as file:
+        for i in range(line_count):
+            date = start + timedelta(seconds=i // LINES_PER_SECOND)
+
+            file.write('{} - {} [{}] "{} {} {}" {} {}\n'.format(
+                random.choice(HOSTS),
+                random.choice(NAMES),
+                date.strftime('%d/%b/%Y:%H:%M:%S +0000'),
+                random.choice(METHODS),
+                random.choice(URL),
+                random.choice(PROTOCOL),
+                random.randint(100, 599),
+                random.randint(0, 10000)
+            ))
+
+
+def benchmark(file_path, engine):
+    """
+    Read and parse the whole file with the given engine
+
+    :return: a tuple of the number of lines parsed and the elapsed time in seconds
+    """
+    line_parser = LINE_PARSERS[engine]()
+    follower = FileFollower(file_path)
+    parsed_count = 0
+
+    start = time.perf_counter()
+
+    lines = follower.read_lines()
+
+    while lines:
+        for line in lines:
+            if line_parser.parse(line):
+                parsed_count += 1
+
+        lines = follower.read_lines()
+
+    elapsed = time.perf_counter() - start
+    follower.close()
+
+    return parsed_count, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", help="number of lines to generate", type=int, default=2000000)
+    parser.add_argument("-p", "--path", help="file path of the generated log file", default='./bench_access.log')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print('Generating {} lines in {}'.format(args.lines, args.path))
+        generate_log_file(args.path, args.lines)
+
+    for engine in sorted(LINE_PARSERS):
+        parsed_count, elapsed = benchmark(args.path, engine)
+        print('{:>6}: {} lines in {:.2f}s -> {:,.0f} lines/s'.format(engine, parsed_count, elapsed,
+                                                                   parsed_count / elapsed))
@@ -0,0 +1,99 @@
+"""
+Benchmark of the multiprocess parsing pipeline, measuring the number of lines parsed and merged into a LogQueue per
+second, parsing in the main process and with 1, 2, 4 and 8 worker processes
+
+Usage: python -m benchmarks.bench_parser_pool [--lines 2000000] [--path ./bench_access.log]
+"""
+import argparse
+import math
+import os
+import time
+
+from benchmarks.bench_parser import generate_log_file
+from lib.follower import FileFollower
+from lib.log import Log
+from lib.log_queue import LogQueue
+from lib.parser import create_line_parser, ENGINE_FAST
+from lib.parser_pool import ParserPool
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def read_blocks(file_path):
+    """
+    :return: yields the blocks of lines of the file, then an empty list
+    """
+    follower = FileFollower(file_path)
+    lines = follower.read_lines()
+
+    while lines:
+        yield lines
+        lines = follower.read_lines()
+
+    yield []
+    follower.close()
+
+
+def create_unbounded_log_queue():
+    """
+    :return: a LogQueue retaining every log, so that no log is sampled out or dropped and every run does the same work
+    """
+    log_queue = LogQueue()
+    log_queue.capacity = math.inf
+
+    return log_queue
+
+
+def benchmark_without_pool(file_path):
+    log_queue = create_unbounded_log_queue()
+    line_parser = create_line_parser(ENGINE_FAST)
+    parsed_count = 0
+
+    start = time.perf_counter()
+
+    for lines in read_blocks(file_path):
+        for line in lines:
+            parsed_line = line_parser.parse(line)
+
+            if parsed_line:
+                log_queue.append(Log(*parsed_line))
+                parsed_count += 1
+
+    return parsed_count, time.perf_counter() - start
+
+
+def benchmark_with_pool(file_path, worker_count):
+    log_queue = create_unbounded_log_queue()
+    parser_pool = ParserPool(worker_count, ENGINE_FAST)
+    parsed_count = 0
+
+    start = time.perf_counter()
+
+    for batch in parser_pool.parse_blocks(read_blocks(file_path)):
+        log_queue.append_batch(batch.get_rows(), batch.buckets)
+        parsed_count += len(batch)
+
+    elapsed = time.perf_counter() - start
+    parser_pool.close()
+
+    return parsed_count, elapsed
+
+
+def report(name, parsed_count, elapsed):
+    print('{:>9}: {} lines in {:.2f}s -> {:,.0f} lines/s'.format(name, parsed_count, elapsed, parsed_count / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", help="number of lines to generate", type=int, default=2000000)
+    parser.add_argument("-p", "--path", help="file path of the generated log file", default='./bench_access.log')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print('Generating {} lines in {}'.format(args.lines, args.path))
+        generate_log_file(args.path, args.lines)
+
+    report('no pool', *benchmark_without_pool(args.path))
+
+    for worker_count in WORKER_COUNTS:
+        report('{} workers'.format(worker_count), *benchmark_with_pool(args.path, worker_count))
@@ -0,0 +1,443 @@
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+from lib import app_config
+from lib.app_config import KEY_TOP_K_CAPACITY, KEY_ALERT_RULES
+from lib.log import RESPONSE_CODE_SERVER_ERROR
+from lib.sketches import SpaceSaving, HyperLogLog, DDSketch
+
+SECTION_HITS = 'section_hits'
+REMOTE_HOST_HITS = 'remote_host_hits'
+SECTION_COUNTS = 'section_counts'
+REMOTE_HOST_COUNTS = 'remote_host_counts'
+SECOND_HITS = 'second_hits'
+SECOND_SERVER_ERRORS = 'second_server_errors'
+AUTH_USER_HITS = 'auth_user_hits'
+UNIQUE_REMOTE_HOSTS = 'unique_remote_hosts'
+UNIQUE_RESOURCES = 'unique_resources'
+BYTES_QUANTILES = 'bytes_quantiles'
+DURATION_QUANTILES = 'duration_quantiles'
+RESPONSE_CODE_TYPES = 'response_code_types'
+BYTES = 'bytes'
+
+
+class Bucket:
+    """
+    Aggregates of the logs received during 1 second, or of several seconds once buckets are merged together.
+    Besides the hit count, a bucket holds one accumulator per entry of BUCKET_ACCUMULATORS, all fed by the same single
+    pass over the logs, so that a new stat only needs a new accumulator and not a new traversal.
+    """
+
+    def __init__(self, names=None):
+        """
+        :param names: the names of the accumulators of BUCKET_ACCUMULATORS held by the bucket, the ones returned by
+        get_default_names if None
+        """
+        names = get_default_names() if names is None else names
+
+        self.hits = 0
+        self.accumulators = {name: BUCKET_ACCUMULATORS[name]() for name in names}
+        self.accumulator_list = list(self.accumulators.values())
+
+    def add(self, log):
+        self.hits += 1
+
+        for accumulator in self.accumulator_list:
+            accumulator.add(log)
+
+    def merge(self, bucket):
+        self.hits += bucket.hits
+
+        # The accumulators of the buckets differ when the alert rules changed in between
+        for name, accumulator in self.accumulators.items():
+            if name in bucket.accumulators:
+                accumulator.merge(bucket.accumulators[name])
+
+    def subtract(self, bucket):
+        self.hits -= bucket.hits
+
+        for name, accumulator in self.accumulators.items():
+            if name in bucket.accumulators:
+                accumulator.subtract(bucket.accumulators[name])
+
+    def get(self, name):
+        """
+        :param name: the name of the accumulator in BUCKET_ACCUMULATORS
+        :return: the value aggregated by the accumulator
+        """
+        return self.accumulators[name].value
+
+    def copy(self):
+        bucket = Bucket()
+        bucket.merge(self)
+        return bucket
+
+
+class SumAccumulator:
+    """
+    Sum of a numeric attribute of the logs
+    """
+
+    SUBTRACTABLE = True
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self.value = 0
+
+    def add(self, log):
+        self.value += getattr(log, self.attribute)
+
+    def merge(self, accumulator):
+        self.value += accumulator.value
+
+    def subtract(self, accumulator):
+        self.value -= accumulator.value
+
+
+class CounterAccumulator:
+    """
+    Number of logs per distinct value of an attribute of the logs
+    """
+
+    SUBTRACTABLE = True
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self.value = Counter()
+
+    def add(self, log):
+        self.value[getattr(log, self.attribute)] += 1
+
+    def merge(self, accumulator):
+        self.value.update(accumulator.value)
+
+    def subtract(self, accumulator):
+        for key, count in accumulator.value.items():
+            remaining_count = self.value[key] - count
+
+            if remaining_count > 0:
+                self.value[key] = remaining_count
+            else:
+                del self.value[key]  # Do not keep keys not seen anymore
+
+
+class KeyCounterAccumulator(CounterAccumulator):
+    """
+    Number of logs per value of an attribute of the logs, only for the values watched, so that the counters do not grow
+    with the number of distinct values
+    """
+
+    def __init__(self, attribute, keys):
+        """
+        :param keys: the set of the values counted, None to count all of them
+        """
+        super().__init__(attribute)
+        self.keys = keys
+
+    def add(self, log):
+        key = getattr(log, self.attribute)
+
+        if self.keys is None or key in self.keys:
+            self.value[key] += 1
+
+    def add_counts(self, counts):
+        """
+        :param counts: dictionary of values to their number of logs, counted in another way
+        """
+        for key, count in counts.items():
+            if self.keys is None or key in self.keys:
+                self.value[key] += count
+
+
+class SecondCounterAccumulator(CounterAccumulator):
+    """
+    Number of logs per second of their date, of all the logs or only of the ones matching a condition, to follow the
+    traffic second by second over the retention period
+    """
+
+    def __init__(self, condition=None):
+        """
+        :param condition: function of a log returning whether it is counted, a module function so that the
+        accumulator can be sent to another process
+        """
+        super().__init__('date')
+        self.condition = condition
+
+    def add(self, log):
+        if self.condition is None or self.condition(log):
+            date = log.date
+            self.value[date.replace(microsecond=0) if date.microsecond else date] += 1
+
+
+class TopKAccumulator:
+    """
+    Approximate number of logs of the most frequent values of an attribute of the logs, in a bounded memory whatever
+    the number of distinct values. Its value is a SpaceSaving sketch, read like a Counter with most_common.
+    A sketch can not be subtracted from another one.
+    """
+
+    SUBTRACTABLE = False
+
+    def __init__(self, attribute, capacity):
+        self.attribute = attribute
+        self.value = SpaceSaving(capacity)
+
+    def add(self, log):
+        self.value.add(getattr(log, self.attribute))
+
+    def merge(self, accumulator):
+        self.value.merge(accumulator.value)
+
+
+class DistinctCountAccumulator:
+    """
+    Approximate number of distinct values of an attribute of the logs, in a constant memory. Its value is a
+    HyperLogLog sketch, read with count. A sketch can not be subtracted from another one.
+    """
+
+    SUBTRACTABLE = False
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self.value = HyperLogLog()
+
+    def add(self, log):
+        self.value.add(getattr(log, self.attribute))
+
+    def merge(self, accumulator):
+        self.value.merge(accumulator.value)
+
+
+class QuantileAccumulator:
+    """
+    Approximate distribution of a numeric attribute of the logs, in a bounded memory. Its value is a DDSketch, read
+    with quantile. Logs without a value for the attribute are not counted.
+    """
+
+    SUBTRACTABLE = True
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self.value = DDSketch()
+
+    def add(self, log):
+        value = getattr(log, self.attribute)
+
+        if value is not None:
+            self.value.add(value)
+
+    def merge(self, accumulator):
+        self.value.merge(accumulator.value)
+
+    def subtract(self, accumulator):
+        self.value.subtract(accumulator.value)
+
+
+class BucketWindow:
+    """
+    Per second buckets of the logs retained, updated as logs are received, along with a running sum of all the buckets
+    retained: new buckets are added to the sum, and expired buckets are subtracted from it. Stats and alerts are then
+    computed from a few buckets rather than from every log.
+    A new bucket is only added to the sum when the sum is read, so a log is aggregated once and not twice while its
+    bucket is the newest one. The accumulators which can not be subtracted are not part of the running sum, they are
+    merged from the retained buckets when the sum is read.
+    It is not thread safe, the LogQueue owning it guards its access.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.seconds = []  # Seconds of the buckets, sorted
+        self.total = Bucket([name for name in get_default_names() if BUCKET_ACCUMULATORS[name]().SUBTRACTABLE])
+        self.unsummed_seconds = set()  # Seconds of the buckets not added to the sum yet
+        self.expiry_timestamp = -math.inf
+
+    def add(self, log, timestamp):
+        """
+        :param log: the log received
+        :param timestamp: the date of the log in epoch seconds
+        """
+        if timestamp <= self.expiry_timestamp:
+            return  # Received too late, the logs of this second have already expired
+
+        second = math.floor(timestamp)
+        bucket = self.buckets.get(second)
+
+        if bucket is None:
+            bucket = self._create_bucket(second)
+
+        bucket.add(log)
+
+        if second not in self.unsummed_seconds:
+            self.total.add(log)
+
+    def add_buckets(self, buckets):
+        """
+        Add logs already aggregated by second, by a parser worker process for instance
+
+        :param buckets: dictionary of epoch second to the Bucket of the logs of that second
+        """
+        for second, bucket in buckets.items():
+            if second <= self.expiry_timestamp:
+                continue
+
+            window_bucket = self.buckets.get(second)
+
+            if window_bucket is None:
+                window_bucket = self._create_bucket(second)
+
+            window_bucket.merge(bucket)
+
+            if second not in self.unsummed_seconds:
+                self.total.merge(bucket)
+
+    def flush_expired(self, expiry_timestamp):
+        """
+        Remove the buckets of the seconds up to the expiry time, and subtract them from the running sum
+
+        :param expiry_timestamp: epoch seconds under which a log is considered expired
+        :return: dictionary of epoch second to the Bucket of the logs of that second, of the seconds removed
+        """
+        self.expiry_timestamp = max(self.expiry_timestamp, expiry_timestamp)
+
+        expired_count = bisect_right(self.seconds, expiry_timestamp)
+        expired_buckets = {}
+
+        for second in self.seconds[:expired_count]:
+            bucket = expired_buckets[second] = self.buckets.pop(second)
+
+            if second in self.unsummed_seconds:
+                self.unsummed_seconds.remove(second)
+            else:
+                self.total.subtract(bucket)
+
+        del self.seconds[:expired_count]
+
+        return expired_buckets
+
+    def get_interval(self, start_timestamp, end_timestamp):
+        """
+        :return: a bucket merging the buckets of the seconds in [start_timestamp, end_timestamp[
+        """
+        interval = Bucket()
+
+        start = bisect_left(self.seconds, start_timestamp)
+        end = bisect_left(self.seconds, end_timestamp, start)
+
+        for second in self.seconds[start:end]:
+            interval.merge(self.buckets[second])
+
+        return interval
+
+    def get_total(self, names=None):
+        """
+        :param names: the names of the accumulators to aggregate, all of them if None. Only the accumulators of the
+        running sum are then read in O(1), whatever the number of seconds retained
+        :return: a bucket aggregating all the logs retained
+        """
+        for second in self.unsummed_seconds:
+            self.total.merge(self.buckets[second])
+
+        self.unsummed_seconds.clear()
+
+        total = Bucket(names)
+        total.hits = self.total.hits
+
+        for name, accumulator in total.accumulators.items():
+            if name in self.total.accumulators:
+                accumulator.merge(self.total.accumulators[name])
+                continue
+
+            for second in self.seconds:
+                bucket = self.buckets[second]
+
+                if name in bucket.accumulators:
+                    accumulator.merge(bucket.accumulators[name])
+
+        return total
+
+    def _create_bucket(self, second):
+        bucket = self.buckets[second] = Bucket()
+        insort(self.seconds, second)
+        self.unsummed_seconds.add(second)
+
+        return bucket
+
+
+def is_server_error(log):
+    return log.response_code_type == RESPONSE_CODE_SERVER_ERROR
+
+
+def get_default_names():
+    """
+    :return: the names of the accumulators of BUCKET_ACCUMULATORS held by the buckets: all of them but the exact counts
+    per key no alert rule of the app config reads
+    """
+    return _get_watched_keys()[1]
+
+
+def get_watched_keys(name):
+    """
+    :param name: the name of an accumulator of WATCHED_KEY_RULE_TYPES
+    :return: the set of the keys counted by the accumulator, the scopes of the alert rules of the app config reading
+    it, None to count all the keys if one of them has no scope or if none reads it
+    """
+    return _get_watched_keys()[0].get(name)
+
+
+def _get_watched_keys():
+    """
+    :return: the tuple of the keys watched for each accumulator of WATCHED_KEY_RULE_TYPES and of the default names,
+    computed again only when the alert rules of the app config change
+    """
+    global _watched_keys
+
+    rule_configs = app_config.get(KEY_ALERT_RULES)
+
+    if _watched_keys is not None and _watched_keys[0] is rule_configs:
+        return _watched_keys[1]
+
+    keys_by_name = {}
+    default_names = [name for name in BUCKET_ACCUMULATORS if name not in WATCHED_KEY_RULE_TYPES]
+
+    for name, rule_type in WATCHED_KEY_RULE_TYPES.items():
+        scopes = [rule_config.get('scope') for rule_config in rule_configs
+                  if isinstance(rule_config, dict) and rule_config.get('type') == rule_type]
+
+        if scopes:
+            default_names.append(name)
+
+            if None not in scopes:
+                keys_by_name[name] = set(scopes)
+
+    _watched_keys = (rule_configs, (keys_by_name, default_names))
+
+    return _watched_keys[1]
+
+
+# Type of the alert rules reading the exact counts per key of an accumulator, which is only held by the buckets when
+# such a rule exists, and only counts the scopes of the rules when they all have one
+WATCHED_KEY_RULE_TYPES = {
+    SECTION_COUNTS: 'section_traffic',
+    REMOTE_HOST_COUNTS: 'host_traffic'
+}
+
+_watched_keys = None  # Tuple of the alert rules of the app config, and of what get_watched_keys computed for them
+
+
+BUCKET_ACCUMULATORS = {
+    SECTION_HITS: lambda: TopKAccumulator('section', app_config.get(KEY_TOP_K_CAPACITY)),
+    REMOTE_HOST_HITS: lambda: TopKAccumulator('remote_host', app_config.get(KEY_TOP_K_CAPACITY)),
+    # Exact counts per section and per host, kept in the running sum of the window for the alert thresholds
+    SECTION_COUNTS: lambda: KeyCounterAccumulator('section', get_watched_keys(SECTION_COUNTS)),
+    REMOTE_HOST_COUNTS: lambda: KeyCounterAccumulator('remote_host', get_watched_keys(REMOTE_HOST_COUNTS)),
+    SECOND_HITS: lambda: SecondCounterAccumulator(),
+    SECOND_SERVER_ERRORS: lambda: SecondCounterAccumulator(is_server_error),
+    AUTH_USER_HITS: lambda: TopKAccumulator('auth_user', app_config.get(KEY_TOP_K_CAPACITY)),
+    UNIQUE_REMOTE_HOSTS: lambda: DistinctCountAccumulator('remote_host'),
+    UNIQUE_RESOURCES: lambda: DistinctCountAccumulator('resource'),
+    RESPONSE_CODE_TYPES: lambda: CounterAccumulator('response_code_type'),
+    BYTES: lambda: SumAccumulator('bytes'),
+    BYTES_QUANTILES: lambda: QuantileAccumulator('bytes'),
+    DURATION_QUANTILES: lambda: QuantileAccumulator('duration')
+}
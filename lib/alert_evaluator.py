@@ -0,0 +1,69 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from math import floor
+from threading import Thread
+
+from lib import app_config, alerts
+from lib.app_config import KEY_ALERT_EVALUATION_TIME_S, KEY_LOG_RETENTION_TIME_S, KEY_CHECKPOINT_TIME_S
+
+
+class AlertEvaluatorThread(Thread):
+    """
+    Evaluate the alerts every evaluation time, independently of the refresh of the stats, so that a burst is flagged
+    within a second rather than at the next refresh. Each evaluation only reads the running sum of the retained logs
+    kept by the LogQueue, restricted to the accumulators read by the alert rules, so it does not depend on the number of
+    logs retained.
+    It also saves the checkpoints, between 2 evaluations, so that the alerts saved are never being updated.
+    """
+
+    def __init__(self, log_queue, console_model, checkpointer=None):
+        """
+        :param checkpointer: Checkpointer saving a checkpoint every checkpoint time, if any
+        """
+        super().__init__()
+
+        self.daemon = True
+        self.evaluation_time = app_config.get(KEY_ALERT_EVALUATION_TIME_S)
+        self.retention_time = timedelta(seconds=app_config.get(KEY_LOG_RETENTION_TIME_S))
+        self.log_queue = log_queue
+        self.console_model = console_model
+
+        self.checkpointer = checkpointer
+        self.checkpoint_time = app_config.get(KEY_CHECKPOINT_TIME_S)
+
+    def run(self):
+        """
+        Evaluate every evaluation time, scheduled on a monotonic clock like the ClockThread ticks
+        """
+        start_monotonic_time = time.monotonic()
+        tick = 0
+        next_checkpoint_time = start_monotonic_time + self.checkpoint_time
+
+        while True:
+            try:
+                self.evaluate(datetime.utcnow())
+
+                if self.checkpointer is not None and time.monotonic() >= next_checkpoint_time:
+                    next_checkpoint_time = time.monotonic() + self.checkpoint_time
+                    self.checkpointer.save()
+            except Exception:
+                # The thread would stop on the exception, and no alert would be evaluated for the rest of the session
+                logging.exception('Alert evaluation failed')
+
+            elapsed_ticks = floor((time.monotonic() - start_monotonic_time) / self.evaluation_time)
+            tick = max(tick + 1, elapsed_ticks)
+
+            time.sleep(max(0, start_monotonic_time + tick * self.evaluation_time - time.monotonic()))
+
+    def evaluate(self, evaluation_time):
+        """
+        :param evaluation_time: the datetime of the evaluation, the logs retained being the ones of the retention time
+        before it
+        """
+        self.log_queue.flush_expired(evaluation_time - self.retention_time)
+
+        retained_aggregates = self.log_queue.get_retained_aggregates(alerts.get_accumulator_names())
+        computed_alerts = alerts.compute(evaluation_time, retained_aggregates)
+
+        self.console_model.update_alerts(evaluation_time, computed_alerts)
@@ -1,24 +1,56 @@
+import inspect
+import math
+from collections import deque
+from datetime import timedelta
 from math import floor
 
 from lib import app_config
-from lib.app_config import KEY_REQUEST_FREQUENCY_PER_S, KEY_LOG_RETENTION_TIME_S
+from lib.aggregates import SECTION_COUNTS, REMOTE_HOST_COUNTS, SECOND_HITS, SECOND_SERVER_ERRORS, RESPONSE_CODE_TYPES, \
+    BYTES
+from lib.app_config import KEY_REQUEST_FREQUENCY_PER_S, KEY_LOG_RETENTION_TIME_S, KEY_ALERT_RULES
+from lib.log import RESPONSE_CODE_SERVER_ERROR
 
 TYPE_HIGH_TRAFFIC = 'high_traffic_type'
+TYPE_SECTION_TRAFFIC = 'section_traffic_type'
+TYPE_HOST_TRAFFIC = 'host_traffic_type'
+TYPE_ERROR_RATIO = 'error_ratio_type'
+TYPE_BYTES_RATE = 'bytes_rate_type'
+TYPE_TRAFFIC_ANOMALY = 'traffic_anomaly_type'
+TYPE_ERROR_RATIO_ANOMALY = 'error_ratio_anomaly_type'
+
+METRIC_HITS = 'hits'
+METRIC_ERROR_RATIO = 'error_ratio'
+
+DIRECTION_UP = 'up'
+DIRECTION_DOWN = 'down'
+DIRECTION_BOTH = 'both'
+
+ONE_SECOND = timedelta(seconds=1)
+
+# Below this number of hits in the retention window, the ratio of server errors is not meaningful
+ERROR_RATIO_MIN_HITS = 20
 
 
 class Alert:
 
-    def __init__(self, time, type, message, recovered=False):
+    def __init__(self, time, type, message, recovered=False, scope=None):
         self.time = time
         self.type = type
         self.message = message
         self.recovered = recovered
+        self.scope = scope  # What the alert is about, like a section or a host, None for the whole traffic
+
+        # An alert is identified by its type and scope, its message changes with the values measured
+        self.key = (type, scope)
 
     def is_in(self, alerts):
-        return any([self.is_same_alert(alert) for alert in alerts])
+        """
+        :param alerts: a dictionary of alert keys to alerts
+        """
+        return self.key in alerts
 
     def is_same_alert(self, alert):
-        return self.type == alert.type
+        return self.key == alert.key
 
     def recover(self, recover_time):
         """
@@ -26,41 +58,460 @@ class Alert:
 
         :return: an Alert with recovered parameter set to True
         """
-        return Alert(recover_time, self.type, 'Recovered "{}"'.format(self.message), recovered=True)
+        return Alert(recover_time, self.type, 'Recovered "{}"'.format(self.message), recovered=True, scope=self.scope)
 
     def __str__(self):
         return '[{}] {}'.format(self.time.strftime("%Y-%m-%d %H:%M:%S"), self.message)
 
 
-def compute(time, logs):
+class HighTrafficRule:
+    """
+    Detect if high traffic by averaging the number of requests over the retention period and detecting if it is not
+    smaller than the threshold of requests tolerated per second
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold  # Requests per second, the one of the app config if None
+        self.accumulator_names = []  # Only reads the hit count
+
+    def evaluate(self, time, aggregates, retention_time):
+        threshold = self.threshold if self.threshold is not None else app_config.get(KEY_REQUEST_FREQUENCY_PER_S)
+        average_hits_count = floor(aggregates.hits / retention_time)
+
+        if average_hits_count < threshold:
+            return []
+
+        return [Alert(time, TYPE_HIGH_TRAFFIC, 'High traffic - {} hits/s'.format(average_hits_count))]
+
+
+class KeyTrafficRule:
+    """
+    Detect the high traffic of a value of an attribute of the logs, like a section or a host, from the exact hit counts
+    per value of the retained logs. These counters are updated as logs are received and the counts of a whole second
+    are subtracted when it expires, so the traffic of a given value is a single lookup whatever the number of logs
+    """
+
+    ACCUMULATOR = None
+    TYPE = None
+    LABEL = None
+
+    def __init__(self, threshold, scope=None):
+        self.threshold = threshold  # Requests per second
+        self.scope = scope  # The value checked, all the values if None
+        self.accumulator_names = [self.ACCUMULATOR]
+
+    def evaluate(self, time, aggregates, retention_time):
+        hits_by_key = aggregates.get(self.ACCUMULATOR)
+
+        if self.scope is None:
+            keys = hits_by_key.keys()
+        else:
+            keys = [self.scope]
+
+        alerts = []
+
+        for key in keys:
+            average_hits_count = floor(hits_by_key.get(key, 0) / retention_time)
+
+            if average_hits_count >= self.threshold:
+                alerts.append(Alert(time, self.TYPE, 'High traffic on {} {} - {} hits/s'.format(self.LABEL, key,
+                                                                                               average_hits_count),
+                                    scope=key))
+
+        return alerts
+
+
+class SectionTrafficRule(KeyTrafficRule):
+    ACCUMULATOR = SECTION_COUNTS
+    TYPE = TYPE_SECTION_TRAFFIC
+    LABEL = 'section'
+
+
+class HostTrafficRule(KeyTrafficRule):
+    ACCUMULATOR = REMOTE_HOST_COUNTS
+    TYPE = TYPE_HOST_TRAFFIC
+    LABEL = 'host'
+
+
+class ErrorRatioRule:
+    """
+    Detect if the share of the requests answered with a server error (5xx) is not smaller than the threshold
+    """
+
+    def __init__(self, threshold, min_hits=ERROR_RATIO_MIN_HITS):
+        self.threshold = threshold  # Ratio between 0 and 1
+        self.min_hits = min_hits
+        self.accumulator_names = [RESPONSE_CODE_TYPES]
+
+    def evaluate(self, time, aggregates, retention_time):
+        if aggregates.hits < self.min_hits:
+            return []
+
+        error_ratio = aggregates.get(RESPONSE_CODE_TYPES)[RESPONSE_CODE_SERVER_ERROR] / aggregates.hits
+
+        if error_ratio < self.threshold:
+            return []
+
+        return [Alert(time, TYPE_ERROR_RATIO, 'High server error ratio - {:.0%} of requests'.format(error_ratio))]
+
+
+class BytesRateRule:
+    """
+    Detect if the number of bytes sent per second over the retention period is not smaller than the threshold
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold  # Bytes per second
+        self.accumulator_names = [BYTES]
+
+    def evaluate(self, time, aggregates, retention_time):
+        bytes_rate = floor(aggregates.get(BYTES) / retention_time)
+
+        if bytes_rate < self.threshold:
+            return []
+
+        return [Alert(time, TYPE_BYTES_RATE, 'High bandwidth - {} bytes/s'.format(bytes_rate))]
+
+
+class Baseline:
+    """
+    Exponentially weighted moving average and variance of a series of values, updated in O(1) per value, the weight of
+    a value being halved every `half_life` values. Until there are enough values, all of them have the same weight, so
+    that the first value does not weigh more than the others
+    """
+
+    def __init__(self, half_life):
+        self.alpha = 1 - 0.5 ** (1 / half_life)
+        self.mean = 0
+        self.variance = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+
+        alpha = max(self.alpha, 1 / self.count)
+        difference = value - self.mean
+        increment = alpha * difference
+
+        self.mean += increment
+        self.variance = (1 - alpha) * (self.variance + difference * increment)
+
+    def get_standard_deviation(self):
+        return math.sqrt(self.variance)
+
+
+class AnomalyRule:
+    """
+    Detect if the traffic, or the ratio of server errors, over the retention period deviates from its usual values by
+    at least `deviations` standard deviations. The usual values are a Baseline of the values over the retention period
+    ending at each second, updated once per second of logs as they are received, and optionally kept per hour of the
+    day so that busy hours and nights are compared to themselves. The values over the retention period vary much less
+    than the values of single seconds, so both the baseline and the value checked are computed over the same period.
+    Only the logs of the last seconds are kept, no longer history.
+    """
+
+    def __init__(self, metric=METRIC_HITS, deviations=3, half_life=3600, seasonal=False, warmup=600,
+                 direction=DIRECTION_UP):
+        """
+        :param metric: METRIC_HITS for the hits per second, METRIC_ERROR_RATIO for the ratio of server errors
+        :param deviations: number of standard deviations from the average triggering the alert
+        :param half_life: number of seconds of logs after which the weight of a second in a baseline is halved
+        :param seasonal: whether to keep a baseline per hour of the day rather than a single one
+        :param warmup: number of seconds of logs added to a baseline before it is used
+        :param direction: whether to detect values above (DIRECTION_UP), below (DIRECTION_DOWN) or both
+        """
+        if metric not in (METRIC_HITS, METRIC_ERROR_RATIO):
+            raise ValueError('Unknown anomaly metric {}'.format(metric))
+
+        if direction not in (DIRECTION_UP, DIRECTION_DOWN, DIRECTION_BOTH):
+            raise ValueError('Unknown anomaly direction {}'.format(direction))
+
+        if half_life <= 0:
+            raise ValueError('The half life of an anomaly baseline must be positive')
+
+        self.metric = metric
+        self.deviations = deviations
+        self.half_life = half_life
+        self.seasonal = seasonal
+        self.warmup = warmup
+        self.direction = direction
+        self.accumulator_names = [SECOND_HITS, SECOND_SERVER_ERRORS] if metric == METRIC_ERROR_RATIO else [SECOND_HITS]
+
+        self.baselines = {}  # Hour of the day to its baseline, or None to the single baseline if not seasonal
+        self.last_second = None  # The last second added to the baselines
+
+        # Hits and server errors of the last seconds added, as many as the seconds of the retention period, and sums
+        self.window = deque()
+        self.window_hits = 0
+        self.window_server_errors = 0
+
+    def evaluate(self, time, aggregates, retention_time):
+        hits_by_second = aggregates.get(SECOND_HITS)
+
+        if not hits_by_second:
+            return []
+
+        # The logs of the newest second may still be coming
+        newest_second = max(hits_by_second)
+        self._update_baselines(aggregates, newest_second, retention_time)
+
+        if len(self.window) < retention_time:
+            return []
+
+        baseline = self.baselines.get(self.last_second.hour if self.seasonal else None)
+        value = self._get_window_value(retention_time)
+
+        if baseline is None or baseline.count < self.warmup or value is None:
+            return []
+
+        standard_deviation = baseline.get_standard_deviation()
+
+        if not standard_deviation:
+            return []  # The values have always been the same, a deviation can not be measured
+
+        if not self._is_anomalous((value - baseline.mean) / standard_deviation):
+            return []
+
+        if self.metric == METRIC_HITS:
+            return [Alert(time, TYPE_TRAFFIC_ANOMALY, 'Traffic anomaly - {:.0f} hits/s, usually {:.0f} ± {:.0f}'
+                          .format(value, baseline.mean, standard_deviation))]
+
+        return [Alert(time, TYPE_ERROR_RATIO_ANOMALY, 'Server error ratio anomaly - {:.1%} of requests, usually '
+                                                      '{:.1%} ± {:.1%}'.format(value, baseline.mean,
+                                                                               standard_deviation))]
+
+    def _is_anomalous(self, deviation_count):
+        if self.direction == DIRECTION_UP:
+            return deviation_count >= self.deviations
+
+        if self.direction == DIRECTION_DOWN:
+            return deviation_count <= -self.deviations
+
+        return abs(deviation_count) >= self.deviations
+
+    def _update_baselines(self, aggregates, newest_second, retention_time):
+        """
+        Add the seconds retained before the newest one which have not been added yet, seconds without logs after the
+        first log included, to the window. The value of each full window is added to the baselines
+        """
+        if self.last_second is None:
+            second = min(aggregates.get(SECOND_HITS))
+        else:
+            second = max(newest_second - timedelta(seconds=retention_time - 1), self.last_second + ONE_SECOND)
+
+            if second > self.last_second + ONE_SECOND:
+                self._clear_window()  # The seconds in between are not retained anymore
+
+        while second < newest_second:
+            self._add_to_window(aggregates, second, retention_time)
+
+            value = self._get_window_value(retention_time)
+
+            if len(self.window) == retention_time and value is not None:
+                self._add_to_baseline(self._get_baseline(second), value)
+
+            self.last_second = second
+            second += ONE_SECOND
+
+    def _add_to_window(self, aggregates, second, retention_time):
+        hits = aggregates.get(SECOND_HITS).get(second, 0)
+        server_errors = aggregates.get(SECOND_SERVER_ERRORS).get(second, 0) if self.metric == METRIC_ERROR_RATIO else 0
+
+        self.window.append((hits, server_errors))
+        self.window_hits += hits
+        self.window_server_errors += server_errors
+
+        while len(self.window) > retention_time:
+            hits, server_errors = self.window.popleft()
+            self.window_hits -= hits
+            self.window_server_errors -= server_errors
+
+    def _clear_window(self):
+        self.window.clear()
+        self.window_hits = 0
+        self.window_server_errors = 0
+
+    def _add_to_baseline(self, baseline, value):
+        """
+        Add a value to a baseline, clamped to the values which are not anomalous once the baseline is used, so that an
+        anomaly does not quickly become the usual values while a lasting change still moves the baseline
+        """
+        if baseline.count >= self.warmup and baseline.variance:
+            max_deviation = self.deviations * baseline.get_standard_deviation()
+            value = min(max(value, baseline.mean - max_deviation), baseline.mean + max_deviation)
+
+        baseline.add(value)
+
+    def _get_window_value(self, retention_time):
+        """
+        :return: the value of the metric for the logs of the window, None if it has none
+        """
+        if self.metric == METRIC_HITS:
+            return self.window_hits / retention_time
+
+        return self.window_server_errors / self.window_hits if self.window_hits else None
+
+    def _get_baseline(self, second):
+        season = second.hour if self.seasonal else None
+        baseline = self.baselines.get(season)
+
+        if baseline is None:
+            baseline = self.baselines[season] = Baseline(self.half_life)
+
+        return baseline
+
+
+class RuleEngine:
+    """
+    Evaluate alert rules against the aggregates of the logs retained. Rules only read the aggregates, which have a
+    bounded size, so hundreds of rules can be evaluated at each refresh whatever the traffic.
+    """
+
+    def __init__(self, rule_configs):
+        """
+        :param rule_configs: list of dictionaries with the 'type' of the rule in RULE_TYPES, and the parameters of the
+        rule
+        """
+        self.rule_configs = rule_configs
+        self.rules = [create_rule(rule_config) for rule_config in rule_configs]
+
+        # The accumulators read by the rules, the only ones to aggregate for them
+        self.accumulator_names = sorted(set(name for rule in self.rules for name in rule.accumulator_names))
+
+    def evaluate(self, time, aggregates):
+        retention_time = app_config.get(KEY_LOG_RETENTION_TIME_S)
+
+        alerts = []
+
+        for rule in self.rules:
+            alerts += rule.evaluate(time, aggregates, retention_time)
+
+        return alerts
+
+
+_rule_engine = None  # Engine of the rules of the app config, created again if they change
+
+
+def compute(time, aggregates):
     alerts = []
 
     for compute_alert in ALERT_COMPUTERS:
-        alerts += compute_alert(time, logs)
+        alerts += compute_alert(time, aggregates)
 
     return alerts
 
 
-def compute_alert_high_traffic(time, logs):
+def get_accumulator_names():
+    """
+    :return: the names of the accumulators of BUCKET_ACCUMULATORS read by the alert computers, so that the alerts can be
+    computed from aggregates holding only these accumulators
+    """
+    return _get_rule_engine().accumulator_names
+
+
+def compute_alerts_from_rules(time, aggregates):
     """
-    Detect if high traffic by averaging the number of requests over the retention period and detecting if it is smaller
-    than the threshold of requests tolerated per minutes
+    Evaluate the alert rules of the app config
 
     :param time: the time at which the update task started
-    :param logs: a list of all the logs retained
-    :return: an alert if high traffic is detected, else None
+    :param aggregates: a Bucket aggregating all the logs retained
+    :return: the alerts of the rules triggered
+    """
+    return _get_rule_engine().evaluate(time, aggregates)
+
+
+def get_rules():
+    """
+    :return: the tuple of the rule configs of the app config and of their rules, along with the state the rules keep
+    between evaluations (the baselines of the anomaly rules)
+    """
+    rule_engine = _get_rule_engine()
+
+    return rule_engine.rule_configs, rule_engine.rules
+
+
+def restore_rules(rule_configs, rules):
+    """
+    Evaluate the rules saved by get_rules from now on, unless the rule configs of the app config have changed since
+
+    :return: True if the rules were restored, else False
     """
-    retention_time = app_config.get(KEY_LOG_RETENTION_TIME_S)
-    request_frequency_per_second = app_config.get(KEY_REQUEST_FREQUENCY_PER_S)
+    rule_engine = _get_rule_engine()
+
+    if rule_configs != rule_engine.rule_configs:
+        return False
+
+    rule_engine.rules = rules
+
+    return True
+
+
+def _get_rule_engine():
+    global _rule_engine
+
+    rule_configs = app_config.get(KEY_ALERT_RULES)
+
+    if _rule_engine is None or _rule_engine.rule_configs is not rule_configs:
+        _rule_engine = RuleEngine(rule_configs)
+
+    return _rule_engine
+
+
+def create_rule(rule_config):
+    """
+    :param rule_config: dictionary with the 'type' of the rule in RULE_TYPES, and the parameters of the rule
+    :return: the rule
+    :raise ValueError: if the type or the parameters are not the ones of a rule
+    """
+    if not isinstance(rule_config, dict):
+        raise ValueError('An alert rule must be a dictionary, not {}'.format(rule_config))
+
+    parameters = dict(rule_config)
+    rule_type = RULE_TYPES.get(parameters.pop('type', None))
+
+    if rule_type is None:
+        raise ValueError('Unknown alert rule type in {}'.format(rule_config))
+
+    defaults = {name: parameter.default for name, parameter in inspect.signature(rule_type).parameters.items()}
+
+    for name, value in parameters.items():
+        types = RULE_PARAMETER_TYPES.get(name)
+
+        # None is only valid where it is the default of the rule, bool is an int but never a valid number
+        if types is None or (value is None and name in defaults and defaults[name] is None):
+            continue
+
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise ValueError('Invalid {} {} for the alert rule {}'.format(name, value, rule_config))
 
-    average_hits_count = floor(len(logs) / retention_time)
+    try:
+        return rule_type(**parameters)
+    except TypeError:
+        raise ValueError('Invalid parameters for the alert rule {}'.format(rule_config))
 
-    if average_hits_count < request_frequency_per_second:
-        return []
 
-    return [Alert(time, TYPE_HIGH_TRAFFIC, 'High traffic - {} hits/s'.format(average_hits_count))]
+# Types of the parameters of the rules, checked when a rule is created rather than when it is evaluated
+RULE_PARAMETER_TYPES = {
+    'threshold': (int, float),
+    'scope': (str,),
+    'min_hits': (int, float),
+    'metric': (str,),
+    'deviations': (int, float),
+    'half_life': (int, float),
+    'seasonal': (bool,),
+    'warmup': (int, float),
+    'direction': (str,)
+}
 
+RULE_TYPES = {
+    'high_traffic': HighTrafficRule,
+    'section_traffic': SectionTrafficRule,
+    'host_traffic': HostTrafficRule,
+    'error_ratio': ErrorRatioRule,
+    'bytes_rate': BytesRateRule,
+    'anomaly': AnomalyRule
+}
 
 ALERT_COMPUTERS = [
-    compute_alert_high_traffic
-]
\ No newline at end of file
+    compute_alerts_from_rules
+]
@@ -5,13 +5,57 @@ A Global configuration for the application, to fetch all the configurable parame
 KEY_REFRESH_TIME_S           = 'KEY_REFRESH_TIME_S'
 KEY_REQUEST_FREQUENCY_PER_S  = 'KEY_REQUEST_FREQUENCY_PER_S'
 KEY_LOG_RETENTION_TIME_S     = 'KEY_LOG_RETENTION_TIME_S'
-KEY_LOG_FILE_PATH            = 'KEY_LOG_FILE_PATH'
+KEY_LOG_FILE_PATHS           = 'KEY_LOG_FILE_PATHS'
+KEY_PARSER_ENGINE            = 'KEY_PARSER_ENGINE'
+KEY_LOG_STORE                = 'KEY_LOG_STORE'
+KEY_REORDER_WINDOW_S         = 'KEY_REORDER_WINDOW_S'
+KEY_REORDER_BUFFER_SIZE      = 'KEY_REORDER_BUFFER_SIZE'
+KEY_PARSER_WORKERS           = 'KEY_PARSER_WORKERS'
+KEY_MAX_RETAINED_LOGS        = 'KEY_MAX_RETAINED_LOGS'
+KEY_MAX_MEMORY_MB            = 'KEY_MAX_MEMORY_MB'
+KEY_OVERLOAD_POLICY          = 'KEY_OVERLOAD_POLICY'
+KEY_REPLAY                   = 'KEY_REPLAY'
+KEY_QUIET                    = 'KEY_QUIET'
+KEY_TOP_K_CAPACITY           = 'KEY_TOP_K_CAPACITY'
+KEY_ALERT_RULES              = 'KEY_ALERT_RULES'
+KEY_ALERT_EVALUATION_TIME_S  = 'KEY_ALERT_EVALUATION_TIME_S'
+KEY_ALERT_HYSTERESIS_S       = 'KEY_ALERT_HYSTERESIS_S'
+KEY_HISTORY_PATH             = 'KEY_HISTORY_PATH'
+KEY_HISTORY_QUERY            = 'KEY_HISTORY_QUERY'
+KEY_CHECKPOINT_PATH          = 'KEY_CHECKPOINT_PATH'
+KEY_CHECKPOINT_TIME_S        = 'KEY_CHECKPOINT_TIME_S'
+KEY_FOLLOWER_START           = 'KEY_FOLLOWER_START'
+KEY_INGESTION_HOST           = 'KEY_INGESTION_HOST'
+KEY_INGESTION_UDP_PORT       = 'KEY_INGESTION_UDP_PORT'
+KEY_INGESTION_TCP_PORT       = 'KEY_INGESTION_TCP_PORT'
 
 _CONFIG = {
     KEY_REFRESH_TIME_S: 10,
     KEY_REQUEST_FREQUENCY_PER_S: 10,
     KEY_LOG_RETENTION_TIME_S: 120,
-    KEY_LOG_FILE_PATH: '/var/log/access.log'
+    KEY_LOG_FILE_PATHS: ['/var/log/access.log'],
+    KEY_PARSER_ENGINE: 'fast',
+    KEY_LOG_STORE: 'objects',
+    KEY_REORDER_WINDOW_S: 2,
+    KEY_REORDER_BUFFER_SIZE: 100000,
+    KEY_PARSER_WORKERS: 0,
+    KEY_MAX_RETAINED_LOGS: 2000000,
+    KEY_MAX_MEMORY_MB: 1000,
+    KEY_OVERLOAD_POLICY: 'sample',
+    KEY_REPLAY: False,
+    KEY_QUIET: False,
+    KEY_TOP_K_CAPACITY: 100,
+    KEY_ALERT_RULES: [{'type': 'high_traffic'}],
+    KEY_ALERT_EVALUATION_TIME_S: 1,
+    KEY_ALERT_HYSTERESIS_S: 0,
+    KEY_HISTORY_PATH: None,
+    KEY_HISTORY_QUERY: None,
+    KEY_CHECKPOINT_PATH: None,
+    KEY_CHECKPOINT_TIME_S: 30,
+    KEY_FOLLOWER_START: 'beginning',
+    KEY_INGESTION_HOST: '0.0.0.0',
+    KEY_INGESTION_UDP_PORT: None,
+    KEY_INGESTION_TCP_PORT: None
 }
 
 
@@ -21,5 +65,5 @@ def get(key):
 
 def update(configs):
     for config_key in configs:
-        if configs.get(config_key):
+        if configs.get(config_key) is not None:
             _CONFIG[config_key] = configs[config_key]
\ No newline at end of file
@@ -0,0 +1,225 @@
+import gzip
+import heapq
+import itertools
+import re
+from queue import Queue, Full
+from threading import Thread, Event
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Optional dependency, zstd compressed files can only be read when it is installed
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Number of blocks read ahead by a BlockReaderThread, waiting to be parsed
+READ_AHEAD_BLOCKS = 8
+
+# Time after which a BlockReaderThread blocked on a full queue checks if its reader has stopped
+READ_AHEAD_TIMEOUT_S = 0.1
+
+GZIP_EXTENSION = '.gz'
+ZSTD_EXTENSION = '.zst'
+
+# Suffix of a rotated log file: its rotation number (logrotate default) or its rotation date (logrotate dateext)
+ROTATION_SUFFIX_REGEX = re.compile(r'^(.*?)(?:\.(\d+)|-(\d{8,10}))?$')
+
+_END_OF_FILE = object()
+
+
+def is_compressed(file_path):
+    return file_path.endswith((GZIP_EXTENSION, ZSTD_EXTENSION))
+
+
+def open_log_file(file_path):
+    """
+    :return: a binary file object, decompressing the file if it is gzip or zstd compressed
+    :raise ValueError: if the file is zstd compressed and zstandard is not installed
+    """
+    if file_path.endswith(GZIP_EXTENSION):
+        return gzip.open(file_path, 'rb')  # Closes the file it opens along with the decompressor
+
+    if file_path.endswith(ZSTD_EXTENSION):
+        if zstandard is None:
+            raise ValueError('zstandard must be installed to read {} (pip install zstandard)'.format(file_path))
+
+        # Large buffers, as the file is read by large blocks anyway. The reader closes the file when closed
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb', buffering=READ_BLOCK_SIZE),
+                                                          read_size=READ_BLOCK_SIZE, closefd=True)
+
+    return open(file_path, 'rb', buffering=READ_BLOCK_SIZE)
+
+
+def read_blocks(file, block_size=READ_BLOCK_SIZE):
+    """
+    Read a binary file until its end by large blocks
+
+    :return: yields the lists of lines of each block read, without their line ending
+    """
+    remainder = b''
+
+    while True:
+        block = file.read(block_size)
+
+        if not block:
+            break
+
+        data = remainder + block
+        end_of_last_line = data.rfind(b'\n')
+
+        if end_of_last_line < 0:
+            remainder = data
+            continue
+
+        remainder = data[end_of_last_line + 1:]
+        yield data[:end_of_last_line].decode('utf-8', 'replace').split('\n')
+
+    if remainder:
+        yield [remainder.decode('utf-8', 'replace')]
+
+
+def read_blocks_in_background(file_path, block_size=READ_BLOCK_SIZE):
+    """
+    Read a file like read_blocks, the file being read, decompressed and split into lines by a BlockReaderThread while
+    the lines already read are parsed. zlib and zstd release the GIL while decompressing, so decompression and parsing
+    run in parallel
+
+    :return: yields the lists of lines of each block read, without their line ending
+    """
+    reader_thread = BlockReaderThread(file_path, block_size)
+    reader_thread.start()
+
+    try:
+        while True:
+            lines = reader_thread.blocks.get()
+
+            if lines is _END_OF_FILE:
+                break
+
+            if isinstance(lines, Exception):
+                raise lines
+
+            yield lines
+    finally:
+        reader_thread.stopped.set()  # The lines may not be read until the end
+
+
+class BlockReaderThread(Thread):
+    """
+    Read the blocks of lines of a file ahead of their parsing, into a bounded queue so that a slow parser does not
+    make the lines read pile up in memory
+    """
+
+    def __init__(self, file_path, block_size=READ_BLOCK_SIZE):
+        super().__init__(name='reader {}'.format(file_path))
+
+        self.daemon = True
+        self.file_path = file_path
+        self.block_size = block_size
+        self.blocks = Queue(READ_AHEAD_BLOCKS)  # Lists of lines, then _END_OF_FILE or the exception raised
+        self.stopped = Event()
+
+    def run(self):
+        try:
+            with open_log_file(self.file_path) as file:
+                for lines in read_blocks(file, self.block_size):
+                    if not self._put(lines):
+                        return
+
+            self._put(_END_OF_FILE)
+
+        except Exception as exception:
+            self._put(exception)  # Raised again by the reader
+
+    def _put(self, item):
+        """
+        :return: True once the item is queued, False if the reader stopped reading meanwhile
+        """
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=READ_AHEAD_TIMEOUT_S)
+                return True
+            except Full:
+                pass
+
+        return False
+
+
+def group_rotated_files(file_paths):
+    """
+    Group the rotated files of a same log, like access.log.2.gz, access.log.1 and access.log, whose logs follow each
+    other
+
+    :return: list of the lists of the paths of each log, from the oldest rotated file to the current file
+    """
+    groups = {}
+
+    for file_path in file_paths:
+        name = file_path
+
+        for extension in (GZIP_EXTENSION, ZSTD_EXTENSION):
+            if name.endswith(extension):
+                name = name[:-len(extension)]
+
+        base_name, number, date = ROTATION_SUFFIX_REGEX.match(name).groups()
+
+        # The higher the rotation number the older the file, while rotation dates sort chronologically
+        if number is not None:
+            rotation_key = (0, -int(number), '')
+        elif date is not None:
+            rotation_key = (0, 0, date)
+        else:
+            rotation_key = (1, 0, '')
+
+        groups.setdefault(base_name, []).append((rotation_key, file_path))
+
+    return [[file_path for _, file_path in sorted(group)] for group in groups.values()]
+
+
+def merge_rotated(iterables, key):
+    """
+    Merge sorted iterables like heapq.merge, but only start iterating each one once the merge reaches its first item.
+    The rotated files of a log barely overlap, so they are read one after the other instead of all at once, while
+    overlapping files are still merged.
+
+    :param iterables: list of the sorted iterables, in the order of their first item
+    :param key: function returning the key the items are sorted by
+    :return: yields the items of all the iterables, sorted
+    """
+    heap = []  # Tuples (key of the next item, index of the iterable, next item, iterator)
+    upcoming_iterators = (iter(iterable) for iterable in iterables)
+    upcoming = None  # The next iterable not merged yet, with its first item
+    indexes = itertools.count()
+
+    def next_entry(iterator, index):
+        for item in iterator:
+            return key(item), index, item, iterator
+
+        return None
+
+    while True:
+        while upcoming is None:
+            iterator = next(upcoming_iterators, None)
+
+            if iterator is None:
+                break
+
+            upcoming = next_entry(iterator, next(indexes))
+
+        if upcoming is not None and (not heap or upcoming[0] <= heap[0][0]):
+            heapq.heappush(heap, upcoming)
+            upcoming = None
+            continue
+
+        if not heap:
+            return
+
+        _, index, item, iterator = heap[0]
+        yield item
+
+        entry = next_entry(iterator, index)
+
+        if entry is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, entry)
@@ -0,0 +1,96 @@
+import os
+import pickle
+from contextlib import ExitStack
+
+from lib import alerts
+
+# Incremented when the content of a checkpoint changes, a checkpoint of another version being ignored
+CHECKPOINT_VERSION = 1
+
+
+class Checkpointer:
+    """
+    Periodically save to a local file what a restart needs to go on where the application stopped: the position of
+    each log file after the lines parsed, the state of the LogQueue the stats and alerts of the retained logs are
+    computed from, and the alerts. On restart, the log files are read from the saved positions instead of from their
+    beginning, and the alerts are right from the first evaluation.
+    The file is written to a temporary file first and then renamed, so a crash never leaves a partial checkpoint.
+    """
+
+    def __init__(self, path, log_queue, console_model, parser_threads):
+        self.path = path
+        self.log_queue = log_queue
+        self.console_model = console_model
+        self.parser_threads = parser_threads
+
+    def save(self):
+        """
+        Save a checkpoint. Must be called from the thread updating the alerts, so that they do not change meanwhile
+        """
+        with ExitStack() as stack:
+            # Wait for the parsers to finish appending their current block, so the positions match the queue
+            for parser_thread in self.parser_threads:
+                stack.enter_context(parser_thread.block_lock)
+
+            positions = {parser_thread.file_path: parser_thread.get_position() for parser_thread in self.parser_threads
+                         if parser_thread.file_path is not None}
+            log_queue_snapshot = self.log_queue.get_snapshot()
+
+        rule_configs, rules = alerts.get_rules()
+
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'positions': positions,
+            'store': type(self.log_queue).__name__,
+            'log_queue': log_queue_snapshot,
+            'alerts': self.console_model.get_alert_state(),
+            'rule_configs': rule_configs,
+            'rules': rules
+        }
+
+        temporary_path = '{}.tmp'.format(self.path)
+
+        with open(temporary_path, 'wb') as checkpoint_file:
+            pickle.dump(checkpoint, checkpoint_file, pickle.HIGHEST_PROTOCOL)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+        os.replace(temporary_path, self.path)
+
+
+def load(path):
+    """
+    :param path: the path of a checkpoint file saved by a Checkpointer
+    :return: the dictionary of the checkpoint, None if there is none or if it can not be read
+    """
+    try:
+        with open(path, 'rb') as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None  # Corrupted or saved by an incompatible version, start from scratch
+
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+
+    return checkpoint
+
+
+def restore(checkpoint, log_queue, console_model):
+    """
+    Restore the state of the LogQueue, the alerts of the ConsoleModel and the state of the alert rules saved in a
+    checkpoint. The positions of the log files are given to the parser threads
+
+    :param checkpoint: the dictionary returned by load
+    :return: dictionary of the path of each log file to the position to resume parsing it from
+    """
+    # The state of the queue depends on its store, and the positions must match the logs it counts
+    if checkpoint['store'] != type(log_queue).__name__:
+        return {}
+
+    log_queue.restore_snapshot(checkpoint['log_queue'])
+    console_model.restore_alert_state(checkpoint['alerts'])
+    alerts.restore_rules(checkpoint['rule_configs'], checkpoint['rules'])
+
+    return checkpoint['positions']
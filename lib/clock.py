@@ -1,6 +1,7 @@
 import time
 
 from datetime import datetime, timedelta
+from math import floor
 from threading import Thread
 
 from lib import app_config
@@ -18,19 +19,33 @@ class ClockThread(Thread):
         self.generator = generator
 
     def run(self):
-        current_time = datetime.utcnow()
-        previous_time = current_time - timedelta(seconds=self.refresh_time)
+        """
+        Tick every refresh time. Ticks are scheduled on a monotonic clock from the start time rather than by sleeping
+        the refresh time after each tick, so the time spent generating a task does not make the next ticks drift
+        """
+        start_monotonic_time = time.monotonic()
+        start_time = datetime.utcnow()
+
+        previous_time = start_time - timedelta(seconds=self.refresh_time)
+        tick = 0
 
         while True:
-            current_time = datetime.utcnow()
+            scheduled_monotonic_time = start_monotonic_time + tick * self.refresh_time
+            current_time = start_time + timedelta(seconds=tick * self.refresh_time)
 
             self.generator.generate(task_start_time=current_time,
                                     start_interval=previous_time,
                                     end_interval=current_time,
-                                    expiry_time=current_time - timedelta(seconds=self.retention_time))
+                                    expiry_time=current_time - timedelta(seconds=self.retention_time),
+                                    tick_lateness=time.monotonic() - scheduled_monotonic_time)
 
             # Keep track of time at which we started so we do no miss any logs, due to some millisecond error
             # Each log will be in strictly 1 interval
             previous_time = current_time
 
-            time.sleep(self.refresh_time)
\ No newline at end of file
+            # If ticks were missed (the process was suspended for instance), go straight to the latest one, the next
+            # interval covering all the time missed
+            elapsed_ticks = floor((time.monotonic() - start_monotonic_time) / self.refresh_time)
+            tick = max(tick + 1, elapsed_ticks)
+
+            time.sleep(max(0, start_monotonic_time + tick * self.refresh_time - time.monotonic()))
@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from lib import app_config
-from lib.app_config import KEY_LOG_RETENTION_TIME_S
+from lib.app_config import KEY_LOG_RETENTION_TIME_S, KEY_ALERT_HYSTERESIS_S
 
 
 OK_MESSAGE = 'Traffic looking good!'
@@ -17,14 +17,22 @@ class ConsoleModel:
         self.log_retention_time = app_config.get(KEY_LOG_RETENTION_TIME_S)
         self.last_update_time = datetime.utcnow()
 
+        # Time during which an alert must not be detected anymore to recover, so that it does not flap
+        self.alert_hysteresis = timedelta(seconds=app_config.get(KEY_ALERT_HYSTERESIS_S))
+
         self.previous_alerts = []
-        self.current_alerts = []
+        self.previous_alerts_time = None  # Time the previous alerts recovered, to keep them until they are displayed
+        self.current_alerts = {}  # Alert key to the alert, to find if an alert is still detected in O(1)
+        self.alert_detection_times = {}  # Alert key to the last time the current alert was detected
 
         self.stats = []
         self.alerts_history = []
 
+        self.monitor_metrics = None
+        self.input_messages = []
+
     def get_current_alerts(self):
-        return self.current_alerts
+        return list(self.current_alerts.values())
 
     def get_previous_alerts(self):
         return self.previous_alerts
@@ -35,41 +43,97 @@ class ConsoleModel:
     def update(self, task_time, stats, alerts):
         """
         Method updating the state of the console model with the given stats and alerts.
-        2 sets of alerts are recorded, the current alerts and the previous alerts that are no longer valid, which help
-        keep track on display of the changes that occurred during this update.
-        A history of the alerts is also used to display all the alerts that happened on the screen.
 
         :param task_time: the datetime at which the update was triggered
         :param stats: the computed statistics object
         :param alerts: the computed alerts objects
         """
+        self.update_stats(task_time, stats)
+        self.update_alerts(task_time, alerts)
+
+    def update_stats(self, task_time, stats):
+        # The recovered alerts are displayed until the refresh following a whole refresh interval of display, as the
+        # alerts may be updated much more often than the display
+        if self.previous_alerts_time is not None and self.previous_alerts_time <= self.last_update_time:
+            self.previous_alerts = []
+            self.previous_alerts_time = None
+
         self.last_update_time = task_time
         self.stats = stats
 
+    def update_alerts(self, task_time, alerts):
+        """
+        Method updating the alerts, either with the stats or more often by an AlertEvaluatorThread.
+        2 sets of alerts are recorded, the current alerts and the previous alerts that are no longer valid, which help
+        keep track on display of the changes that occurred during the last update changing the alerts. The previous
+        alerts are kept until a display refresh clears them, or until a newer update changes the alerts.
+        A history of the alerts is also used to display all the alerts that happened on the screen.
+
+        :param task_time: the datetime at which the alerts were computed
+        :param alerts: the computed alerts objects
+        """
         new_previous_alerts = []
-        new_current_alerts = []
+        new_current_alerts = {}
+
+        alerts_by_key = {alert.key: alert for alert in alerts}
 
         # Check if the current alerts are still valid
-        for current_alert in self.current_alerts:
-            if current_alert.is_in(alerts):
-                new_current_alerts.append(current_alert)
+        for current_alert in self.current_alerts.values():
+            if current_alert.is_in(alerts_by_key):
+                new_current_alerts[current_alert.key] = current_alert
+                self.alert_detection_times[current_alert.key] = task_time
                 continue
 
+            if task_time - self.alert_detection_times[current_alert.key] < self.alert_hysteresis:
+                new_current_alerts[current_alert.key] = current_alert
+                continue
+
+            del self.alert_detection_times[current_alert.key]
+
             # If a current alert is no longer found in the new alert batch, it means it has recovered and is no longer
             # valid, so we create a recovered Alert object that we put in the previous_alerts and in the alert history
             recovered_alert = current_alert.recover(task_time)
             new_previous_alerts.append(recovered_alert)
             self.insert_alert_history(recovered_alert)
 
+        changed = bool(new_previous_alerts)
+
         # Add the new detected alerts the the current alerts
         for alert in alerts:
             if not alert.is_in(new_current_alerts):
-                new_current_alerts.append(alert)
+                new_current_alerts[alert.key] = alert
+                self.alert_detection_times[alert.key] = task_time
                 self.insert_alert_history(alert)
+                changed = True
+
+        if changed:
+            self.previous_alerts = new_previous_alerts
+            self.previous_alerts_time = task_time
 
-        self.previous_alerts = new_previous_alerts
         self.current_alerts = new_current_alerts
 
+    def get_alert_state(self):
+        """
+        :return: a dictionary of the current alerts, the previous alerts and the alert history, for a checkpoint
+        """
+        return {
+            'previous_alerts': list(self.previous_alerts),
+            'previous_alerts_time': self.previous_alerts_time,
+            'current_alerts': dict(self.current_alerts),
+            'alert_detection_times': dict(self.alert_detection_times),
+            'alerts_history': list(self.alerts_history)
+        }
+
+    def restore_alert_state(self, alert_state):
+        """
+        :param alert_state: a dictionary returned by get_alert_state
+        """
+        self.previous_alerts = alert_state['previous_alerts']
+        self.previous_alerts_time = alert_state['previous_alerts_time']
+        self.current_alerts = alert_state['current_alerts']
+        self.alert_detection_times = alert_state['alert_detection_times']
+        self.alerts_history = alert_state['alerts_history']
+
     def get_alert_status_message(self):
         """
         Method determining the current status to show on the main screen, based on the current alerts and the
@@ -85,7 +149,7 @@ class ConsoleModel:
             return '{} alerts detected'.format(len(self.current_alerts)), COLOR_ALERTS
 
         elif len(self.current_alerts) == 1:
-            return self.current_alerts[0], COLOR_ALERTS
+            return next(iter(self.current_alerts.values())), COLOR_ALERTS
 
         elif len(self.previous_alerts) > 1:
             return '{} alerts recovered'.format(len(self.previous_alerts)), COLOR_RECOVERED
@@ -95,11 +159,22 @@ class ConsoleModel:
 
         return OK_MESSAGE, COLOR_NO_ALERTS
 
+    def update_monitor_metrics(self, monitor_metrics):
+        self.monitor_metrics = str(monitor_metrics)
+
+    def update_input_messages(self, input_messages):
+        self.input_messages = input_messages
+
     def get_last_updated_message(self):
-        return '[{}]'.format(self.last_update_time.strftime("%Y-%m-%d %H:%M:%S"))
+        last_update_message = '[{}]'.format(self.last_update_time.strftime("%Y-%m-%d %H:%M:%S"))
+
+        if self.monitor_metrics:
+            return '{} - {}'.format(last_update_message, self.monitor_metrics)
+
+        return last_update_message
 
     def get_stats_messages(self):
-        return self.stats
+        return self.stats + self.input_messages
 
     def get_alert_history_messages(self):
         return self.alerts_history
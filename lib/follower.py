@@ -0,0 +1,366 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+READ_BLOCK_SIZE = 256 * 1024  # Number of bytes read from the file with a single system call
+
+POLL_MIN_INTERVAL_S = 0.01
+POLL_MAX_INTERVAL_S = 1.0
+
+# Even with inotify, wake up regularly to detect a rotation, as the watch follows the old inode and not the path
+ROTATION_CHECK_INTERVAL_S = 1.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+
+INOTIFY_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+
+# Where a file is first read from: its beginning, its end, or the first line of the retention time
+START_BEGINNING = 'beginning'
+START_END = 'end'
+START_RETENTION = 'retention'
+
+STARTS = [START_BEGINNING, START_END, START_RETENTION]
+
+
+class FileFollower:
+    """
+    Follow a file being actively written to, like 'tail -F'. The file is read by large blocks which are split in memory
+    into lines, and when no new data is available the follower sleeps until the file is modified instead of spinning.
+    Rotations (the path now points to a new inode) and truncations (copytruncate) are detected and the file reopened.
+    """
+
+    def __init__(self, file_path, block_size=READ_BLOCK_SIZE, start_position=None, find_start_offset=None):
+        """
+        :param start_position: position returned by get_position to resume reading from when the file is first opened,
+        if it is still the same file
+        :param find_start_offset: function of the file descriptor and of the size of the file returning the offset of
+        the line to start reading from when the file is first opened without a start position, else the file is read
+        from its beginning. Files opened after a rotation are always read from their beginning
+        """
+        self.file_path = file_path
+        self.block_size = block_size
+        self.start_position = start_position
+        self.find_start_offset = find_start_offset
+
+        self.fd = None
+        self.inode = None
+        self.device = None
+        self.offset = 0
+        self.remainder = b''  # Incomplete last line of the previous block, waiting for its end
+
+        self.watcher = None
+
+    def follow(self):
+        """
+        A generator that never stops reading the file, continuously reading where it left of
+
+        :return: yields new lines added to the file, without their line ending
+        """
+        for lines in self.follow_blocks():
+            yield from lines
+
+    def follow_blocks(self):
+        """
+        A generator that never stops reading the file, yielding the lines block by block. An empty list is yielded
+        each time the end of the file is reached, before sleeping, so the caller can flush the work it has pending
+
+        :return: yields lists of the new lines added to the file, without their line ending
+        """
+        if self.watcher is None:
+            self.watcher = create_watcher()
+
+            if self.fd is not None:
+                self.watcher.watch(self.file_path)
+
+        while True:
+            lines = self.read_lines()
+
+            if lines:
+                self.watcher.notify_activity()
+                yield lines
+                continue
+
+            if self._reopen_if_replaced():
+                continue
+
+            yield lines
+            self.watcher.wait(ROTATION_CHECK_INTERVAL_S)
+
+    def read_lines(self):
+        """
+        Read a single block of the file and split it into lines. Never blocks.
+
+        :return: a list of the complete lines read, empty if no new data is available
+        """
+        if self.fd is None and not self._open():
+            return []
+
+        data = self.remainder
+        end_of_last_line = -1
+
+        # Keep reading while the block does not contain a line end, for lines longer than a block
+        while end_of_last_line < 0:
+            block = os.read(self.fd, self.block_size)
+
+            if not block:
+                self.remainder = data
+                return []
+
+            self.offset += len(block)
+
+            end_of_last_line = block.rfind(b'\n')
+
+            if end_of_last_line >= 0:
+                end_of_last_line += len(data)
+
+            data += block
+
+        self.remainder = data[end_of_last_line + 1:]
+
+        # Decode the whole block at once rather than line by line, it is a lot cheaper
+        return data[:end_of_last_line].decode('utf-8', 'replace').split('\n')
+
+    def get_position(self):
+        """
+        :return: a tuple (inode, device, offset) of the first byte not returned in a line yet, None if the file has not
+        been opened
+        """
+        if self.fd is None:
+            return None
+
+        return self.inode, self.device, self.offset - len(self.remainder)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+
+    def _open(self):
+        try:
+            fd = os.open(self.file_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+
+        stat = os.fstat(fd)
+
+        self.fd = fd
+        self.inode = stat.st_ino
+        self.device = stat.st_dev
+        self.offset = 0
+        self.remainder = b''
+
+        start_position, self.start_position = self.start_position, None
+        find_start_offset, self.find_start_offset = self.find_start_offset, None
+
+        # Resume where a previous run stopped, unless the file was rotated or truncated since
+        if start_position is not None:
+            inode, device, offset = start_position
+
+            if (inode, device) == (stat.st_ino, stat.st_dev) and offset <= stat.st_size:
+                self.offset = os.lseek(fd, offset, os.SEEK_SET)
+                find_start_offset = None
+
+        if find_start_offset is not None:
+            self.offset = os.lseek(fd, find_start_offset(fd, stat.st_size), os.SEEK_SET)
+
+        if self.watcher is not None:
+            self.watcher.watch(self.file_path)
+
+        return True
+
+    def _reopen_if_replaced(self):
+        """
+        Called when the end of the file has been reached, to check if the file has been rotated or truncated
+
+        :return: True if the file was reopened or rewound and new data may be available, else False
+        """
+        if self.fd is None:
+            return self._open()
+
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False  # In the middle of a rotation, keep the old file until the new one is created
+
+        if stat.st_ino != self.inode or stat.st_dev != self.device:
+            # The old file has been fully read as we reached its end, so we can safely switch to the new one
+            os.close(self.fd)
+            self.fd = None
+            return self._open()
+
+        if stat.st_size < self.offset:
+            # The file was truncated in place, start again from its beginning
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            self.offset = 0
+            self.remainder = b''
+            return True
+
+        return False
+
+
+def find_end_offset(fd, size, block_size=READ_BLOCK_SIZE):
+    """
+    :param fd: file descriptor of the file
+    :param size: size of the file
+    :return: the offset of the start of the last line of the file, its size if the file ends with a line end, so that
+    a line still being written is read once complete
+    """
+    end = size
+
+    # Read backward until a line end, for lines longer than a block
+    while end > 0:
+        start = max(0, end - block_size)
+        end_of_line = _read_at(fd, start, end - start).rfind(b'\n')
+
+        if end_of_line >= 0:
+            return start + end_of_line + 1
+
+        end = start
+
+    return 0
+
+
+def find_date_offset(fd, size, get_date, date, block_size=READ_BLOCK_SIZE):
+    """
+    Binary search the lines of a file in chronological order for the first line not older than a date. Each probe only
+    reads the first line starting after an offset, so a few dozens of blocks are read whatever the size of the file.
+    Lines written slightly out of order may be found on either side of the offset returned.
+
+    :param fd: file descriptor of the file
+    :param size: size of the file
+    :param get_date: function returning the datetime of a line, None if it has none
+    :param date: the datetime of the first line to read
+    :return: the offset of the start of a line, less than a block before the first line not older than the date
+    """
+    low = 0  # Start of a line older than the date, or of the file
+    high = size
+
+    while high - low > block_size:
+        middle = (low + high) // 2
+        line_offset, line_date = _find_line_date(fd, middle, get_date, block_size)
+
+        if line_date is not None and line_date < date and line_offset < high:
+            low = line_offset
+        else:
+            high = middle
+
+    return low
+
+
+def _find_line_date(fd, offset, get_date, block_size):
+    """
+    :return: a tuple of the offset and of the date of the first line with a date starting after the offset, in the
+    block read from the offset, (None, None) if there is none
+    """
+    data = _read_at(fd, offset - 1, block_size)
+    start = data.find(b'\n') + 1  # The byte before the offset is read, to know if the offset starts a line
+
+    if not start:
+        return None, None
+
+    while True:
+        end = data.find(b'\n', start)
+
+        if end < 0:
+            return None, None
+
+        line_date = get_date(data[start:end].decode('utf-8', 'replace'))
+
+        if line_date is not None:
+            return offset - 1 + start, line_date
+
+        start = end + 1
+
+
+def _read_at(fd, offset, size):
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+class PollingWatcher:
+    """
+    Portable fallback watcher, sleeping between 2 reads with an exponential backoff while the file stays idle
+    """
+
+    def __init__(self):
+        self.interval = POLL_MIN_INTERVAL_S
+
+    def watch(self, file_path):
+        pass
+
+    def notify_activity(self):
+        self.interval = POLL_MIN_INTERVAL_S
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        self.interval = min(self.interval * 2, POLL_MAX_INTERVAL_S)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux watcher, sleeping until the kernel notifies us that the watched file has been modified
+    """
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.watch_descriptor = None
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def watch(self, file_path):
+        if self.watch_descriptor is not None:
+            self.libc.inotify_rm_watch(self.fd, self.watch_descriptor)  # Fails silently if the file was deleted
+
+        watch_descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(file_path), INOTIFY_MASK)
+        self.watch_descriptor = watch_descriptor if watch_descriptor >= 0 else None
+
+    def notify_activity(self):
+        pass
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if readable:
+            self._drain_events()
+
+    def close(self):
+        os.close(self.fd)
+
+    def _drain_events(self):
+        # We only care about being woken up, not about the content of the events
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+
+def create_watcher():
+    """
+    Create the most efficient watcher available on the platform
+
+    :return: an InotifyWatcher on Linux, else a PollingWatcher
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            return InotifyWatcher(libc)
+        except (OSError, AttributeError):
+            pass
+
+    return PollingWatcher()
@@ -0,0 +1,289 @@
+import json
+import math
+import sqlite3
+from collections import Counter, deque
+from threading import Lock
+
+from lib.aggregates import SECTION_HITS, RESPONSE_CODE_TYPES, BYTES
+from lib.log import RESPONSE_CODE_INFORMATIONAL, RESPONSE_CODE_SUCCESS, RESPONSE_CODE_REDIRECTION, \
+    RESPONSE_CODE_CLIENT_ERROR, RESPONSE_CODE_SERVER_ERROR, RESPONSE_CODE_TYPES_FORMATTED
+
+RESOLUTION_SECOND = 1
+RESOLUTION_MINUTE = 60
+RESOLUTION_HOUR = 3600
+
+# Each resolution is rolled up into the next one, and its rows are deleted once older than its retention in seconds.
+# Rows of the coarsest resolution are kept
+RESOLUTIONS = [RESOLUTION_SECOND, RESOLUTION_MINUTE, RESOLUTION_HOUR]
+RETENTIONS = {
+    RESOLUTION_SECOND: 24 * 3600,
+    RESOLUTION_MINUTE: 30 * 24 * 3600
+}
+
+# Number of sections kept per row. Rollups only merge the top sections of their rows, so the top sections of a long
+# period are approximate, but the sections hit the most are kept
+HISTORY_TOP_SECTIONS_COUNT = 20
+
+RESPONSE_CODE_TYPE_COLUMNS = {
+    RESPONSE_CODE_INFORMATIONAL: 'informational',
+    RESPONSE_CODE_SUCCESS: 'success',
+    RESPONSE_CODE_REDIRECTION: 'redirection',
+    RESPONSE_CODE_CLIENT_ERROR: 'client_error',
+    RESPONSE_CODE_SERVER_ERROR: 'server_error'
+}
+
+COLUMNS = ['hits', 'bytes'] + list(RESPONSE_CODE_TYPE_COLUMNS.values()) + ['sections']
+
+# The accumulators of the buckets read to store their aggregates
+HISTORY_ACCUMULATORS = [SECTION_HITS, RESPONSE_CODE_TYPES, BYTES]
+
+
+class HistoryStore:
+    """
+    Per second aggregates of the logs, kept on disk in a SQLite database once they expire from the LogQueue, so that
+    hours or days of traffic can be looked back at without parsing the logs again.
+    Rows are indexed by resolution and time. Once a minute (an hour) has expired, its seconds (its minutes) are rolled
+    up into a single row, and the rows of each resolution are deleted after their retention, so a query over a day
+    reads a few dozens of rows whatever the traffic.
+    It is thread safe, as logs expire from the monitor and the alert evaluator threads.
+    """
+
+    def __init__(self, path):
+        self.lock = Lock()
+        self.pending = deque()  # Tuples (buckets, expiry timestamp) queued to be written, in the order they expired
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')  # Only syncs at checkpoints in WAL mode
+            self.connection.execute('CREATE TABLE IF NOT EXISTS aggregates (resolution INTEGER, time INTEGER, {}, '
+                                    'PRIMARY KEY (resolution, time)) WITHOUT ROWID'.format(', '.join(COLUMNS)))
+            # Time until which the rows of a resolution are rolled up into the next one
+            self.connection.execute('CREATE TABLE IF NOT EXISTS rollups (resolution INTEGER PRIMARY KEY, '
+                                    'rolled_until INTEGER)')
+
+        self.rolled_until = dict(self.connection.execute('SELECT resolution, rolled_until FROM rollups'))
+
+    def append(self, buckets, expiry_timestamp):
+        """
+        Store the aggregates of expired seconds, and roll up the minutes and hours fully expired
+
+        :param buckets: dictionary of epoch second to the Bucket of the logs of that second
+        :param expiry_timestamp: epoch seconds under which no log can be received anymore
+        """
+        self.enqueue(buckets, expiry_timestamp)
+        self.write_enqueued()
+
+    def enqueue(self, buckets, expiry_timestamp):
+        """
+        Queue the aggregates of expired seconds without writing them, so that a LogQueue can queue them in order while
+        holding its lock, and only write them to the disk once its lock is released
+
+        :param buckets: dictionary of epoch second to the Bucket of the logs of that second
+        :param expiry_timestamp: epoch seconds under which no log can be received anymore
+        """
+        self.pending.append((buckets, expiry_timestamp))
+
+    def write_enqueued(self):
+        """
+        Write the aggregates queued, in the order they were queued. A thread waiting for another one writing may find
+        its aggregates already written by it, but they are written by the time the method returns
+        """
+        with self.lock:
+            while self.pending:
+                buckets, expiry_timestamp = self.pending.popleft()
+
+                with self.connection:
+                    self._write(buckets, expiry_timestamp)
+
+    def _write(self, buckets, expiry_timestamp):
+        rows = [(second, _to_row(bucket)) for second, bucket in buckets.items()]
+        self._upsert(RESOLUTION_SECOND, rows)
+
+        # Late logs of a period already rolled up, expired at a lower expiry time by another thread, are added to the
+        # rollups too
+        for resolution, rollup_resolution in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            rolled_until = self.rolled_until.get(resolution, -math.inf)
+            rows = [(time // rollup_resolution * rollup_resolution, row) for time, row in rows if time < rolled_until]
+
+            if not rows:
+                break
+
+            self._upsert(rollup_resolution, rows)
+
+        for resolution, rollup_resolution in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            self._roll_up(resolution, rollup_resolution, expiry_timestamp)
+
+    def summarize(self, start_timestamp, end_timestamp):
+        """
+        :return: a HistorySummary of the logs between the 2 epoch seconds, read from the coarsest rows covering the
+        interval
+        """
+        summary = HistorySummary()
+
+        with self.lock:
+            for row in self._read(start_timestamp, end_timestamp, len(RESOLUTIONS) - 1):
+                summary.add(row)
+
+        return summary
+
+    def query(self, start_timestamp, end_timestamp, resolution):
+        """
+        :return: the list of tuples (epoch second, HistorySummary) of the rows of the given resolution in the interval
+        """
+        with self.lock:
+            rows = sorted(self._select(resolution, start_timestamp, end_timestamp))
+
+        return [(row[0], HistorySummary(row[1:])) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _read(self, start_timestamp, end_timestamp, level):
+        """
+        :return: the rows covering the interval, the periods of the resolution of the level fully in the interval and
+        rolled up being read from it, and the rest of the interval from the finer resolutions
+        """
+        resolution = RESOLUTIONS[level]
+
+        if not level:
+            return self._select(resolution, start_timestamp, end_timestamp)
+
+        # The rows of a resolution are the rollups of the finer one
+        rolled_until = self.rolled_until.get(RESOLUTIONS[level - 1], -math.inf)
+
+        start = math.ceil(start_timestamp / resolution) * resolution
+        end = min(math.floor(end_timestamp / resolution) * resolution, rolled_until)
+
+        if start >= end:
+            return self._read(start_timestamp, end_timestamp, level - 1)
+
+        return (self._select(resolution, start, end) + self._read(start_timestamp, start, level - 1) +
+                self._read(end, end_timestamp, level - 1))
+
+    def _roll_up(self, resolution, rollup_resolution, expiry_timestamp):
+        rolled_until = self.rolled_until.get(resolution)
+
+        if rolled_until is None:
+            rolled_until = self.connection.execute('SELECT MIN(time) FROM aggregates WHERE resolution = ?',
+                                                   (resolution,)).fetchone()[0]
+
+            if rolled_until is None:
+                return
+
+            rolled_until = rolled_until // rollup_resolution * rollup_resolution
+
+        # Only the periods whose seconds have all expired are complete
+        until = math.floor((expiry_timestamp + 1) / rollup_resolution) * rollup_resolution
+
+        if until <= rolled_until:
+            return
+
+        summaries = {}
+
+        for row in self._select(resolution, rolled_until, until):
+            time = row[0] // rollup_resolution * rollup_resolution
+
+            if time not in summaries:
+                summaries[time] = HistorySummary()
+
+            summaries[time].add(row)
+
+        self._upsert(rollup_resolution, [(time, summary.to_row()) for time, summary in summaries.items()])
+
+        self.connection.execute('DELETE FROM aggregates WHERE resolution = ? AND time < ?',
+                                (resolution, until - RETENTIONS[resolution]))
+        self.connection.execute('INSERT OR REPLACE INTO rollups VALUES (?, ?)', (resolution, until))
+        self.rolled_until[resolution] = until
+
+    def _select(self, resolution, start_timestamp, end_timestamp):
+        """
+        :return: the list of the stored rows of the resolution in [start_timestamp, end_timestamp[, as tuples of the
+        time and of the values of the COLUMNS
+        """
+        return self.connection.execute('SELECT time, {} FROM aggregates WHERE resolution = ? AND time >= ? AND time < ?'
+                                       .format(', '.join(COLUMNS)),
+                                       (resolution, math.ceil(start_timestamp), math.ceil(end_timestamp))).fetchall()
+
+    def _upsert(self, resolution, rows):
+        """
+        Add the rows, merging them with the rows already stored for the same time, for logs received late
+        """
+        for time, row in rows:
+            stored_row = self.connection.execute('SELECT time, {} FROM aggregates WHERE resolution = ? AND time = ?'
+                                                 .format(', '.join(COLUMNS)), (resolution, time)).fetchone()
+
+            if stored_row is not None:
+                summary = HistorySummary()
+                summary.add(stored_row)
+                summary.add((time,) + row)
+                row = summary.to_row()
+
+            self.connection.execute('INSERT OR REPLACE INTO aggregates VALUES (?, ?, {})'
+                                    .format(', '.join('?' * len(COLUMNS))), (resolution, time) + row)
+
+
+class HistorySummary:
+    """
+    Aggregates of the logs of a period read from the history: hits, bytes, count per response code type and the hits of
+    the top sections
+    """
+
+    def __init__(self, row=None):
+        """
+        :param row: a tuple of the values of the COLUMNS of a stored row
+        """
+        self.hits = 0
+        self.bytes = 0
+        self.response_code_types = Counter()
+        self.sections = Counter()
+
+        if row is not None:
+            self.add((None,) + tuple(row))
+
+    def add(self, row):
+        """
+        :param row: a tuple of the time and of the values of the COLUMNS of a stored row
+        """
+        self.hits += row[1]
+        self.bytes += row[2]
+
+        for code_type, count in zip(RESPONSE_CODE_TYPE_COLUMNS, row[3:-1]):
+            if count:
+                self.response_code_types[code_type] += count
+
+        self.sections.update(json.loads(row[-1]))
+
+    def to_row(self):
+        return ((self.hits, self.bytes) +
+                tuple(self.response_code_types[code_type] for code_type in RESPONSE_CODE_TYPE_COLUMNS) +
+                (json.dumps(dict(self.sections.most_common(HISTORY_TOP_SECTIONS_COUNT))),))
+
+    def get_messages(self):
+        """
+        :return: the lines describing the summary
+        """
+        messages = ['Total hits: {}'.format(self.hits), 'Bytes: {}'.format(self.bytes)]
+
+        messages += ['Response status {}: {}'.format(RESPONSE_CODE_TYPES_FORMATTED[code_type], count)
+                     for code_type, count in sorted(self.response_code_types.items())]
+        messages += ['Most hit section {}: {} ({})'.format(i + 1, section, hits)
+                     for i, (section, hits) in enumerate(self.sections.most_common(5))]
+
+        return messages
+
+
+def _to_row(bucket):
+    """
+    :return: the values of the COLUMNS of the aggregates of a Bucket
+    """
+    summary = HistorySummary()
+    summary.hits = bucket.hits
+    summary.bytes = bucket.get(BYTES)
+    summary.response_code_types.update({code_type: count for code_type, count in bucket.get(RESPONSE_CODE_TYPES).items()
+                                        if code_type in RESPONSE_CODE_TYPE_COLUMNS})
+    summary.sections.update(dict(bucket.get(SECTION_HITS).most_common(HISTORY_TOP_SECTIONS_COUNT)))
+
+    return summary.to_row()
+
@@ -0,0 +1,339 @@
+import asyncio
+import re
+import time
+from queue import Queue, Full, Empty
+from threading import Thread, Event, Lock
+
+from lib.parser import ParserThread
+
+# Maximum number of lines of a batch of UDP datagrams, and number of batches waiting to be parsed. Once the parser is
+# behind by that many batches, TCP senders are not read anymore and UDP datagrams are dropped
+UDP_BATCH_SIZE = 1000
+BATCH_QUEUE_SIZE = 100
+
+TCP_READ_SIZE = 64 * 1024  # Number of bytes read from a connection at once, batched into the parser together
+MAX_LINE_LENGTH = 64 * 1024  # Longer lines are dropped, so that a sender without line ends does not fill the memory
+
+# Time after which the lines of a batch not full are sent to the parser, and the parser checks for new batches
+BATCH_FLUSH_INTERVAL_S = 0.1
+
+# Time between 2 attempts to hand a batch of a TCP connection to a full queue
+BACKPRESSURE_INTERVAL_S = 0.01
+
+# Number of senders reported, the most active ones
+REPORTED_SENDER_COUNT = 3
+
+# Number of senders counted separately between 2 reports, the lines of the other senders are counted together under
+# OTHER_SENDERS, so that a server receiving from many short lived senders keeps a bounded memory
+MAX_COUNTED_SENDERS = 1000
+OTHER_SENDERS = 'others'
+
+# Syslog header before the message (RFC 3164 and RFC 5424): the priority, then the timestamp, the host and the tag, or
+# the version, the timestamp, the host, the application, the process, the message id and the structured data
+SYSLOG_HEADER_REGEX = re.compile(r'<\d{1,3}>(?:'
+                                 r'1 \S+ \S+ \S+ \S+ \S+ (?:-|(?:\[(?:[^\]\\]|\\.)*\])+) ?'
+                                 r'|(?:[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d )?(?:\S+ )?[^ :\[]+(?:\[\d+\])?: ?'
+                                 r')?')
+
+
+class IngestionServer(Thread):
+    """
+    Receive log lines over the network from many senders at once, on an asyncio event loop run by the thread: syslog
+    datagrams over UDP, and newline delimited lines over TCP (syslog framed or not). The lines received are handed to
+    the parser by batches, through a bounded queue. When the parser falls behind and the queue is full, the TCP
+    connections are not read anymore until it catches up, so that their senders are slowed down by TCP flow control,
+    while the UDP datagrams, which can not be slowed down, are dropped and counted.
+    """
+
+    def __init__(self, host, udp_port=None, tcp_port=None):
+        """
+        :param host: the address to listen on
+        :param udp_port: the UDP port receiving syslog datagrams, None to not listen on UDP
+        :param tcp_port: the TCP port receiving newline delimited lines, None to not listen on TCP
+        """
+        super().__init__(name='ingestion')
+
+        self.daemon = True
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+
+        self.batches = Queue(BATCH_QUEUE_SIZE)  # Lists of lines, without their line ending nor their syslog header
+        self.metrics = IngestionMetrics(self._get_name())
+
+        # The addresses actually listened on, once ready, as the ports may be chosen by the system
+        self.udp_address = None
+        self.tcp_address = None
+        self.ready = Event()
+        self.error = None  # The exception raised while starting to listen, if any
+
+        self.loop = None
+        self.stopped = None
+        self.udp_batch = []
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    def wait_ready(self):
+        """
+        Wait until the server listens
+
+        :raise OSError: the error raised by the thread if it could not listen, like an address already in use
+        """
+        self.ready.wait()
+
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        """
+        Stop listening, and wait for the thread to end
+        """
+        self.ready.wait()
+
+        if self.error is None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+        self.join()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+
+        udp_transport = tcp_server = None
+
+        try:
+            if self.udp_port is not None:
+                udp_transport, _ = await self.loop.create_datagram_endpoint(lambda: SyslogProtocol(self),
+                                                                            local_addr=(self.host, self.udp_port))
+                self.udp_address = udp_transport.get_extra_info('sockname')
+
+            if self.tcp_port is not None:
+                tcp_server = await asyncio.start_server(self._receive_connection, self.host, self.tcp_port)
+                self.tcp_address = tcp_server.sockets[0].getsockname()
+        except OSError as error:
+            self.error = error  # Raised again by wait_ready, in the thread starting the server
+
+            if udp_transport is not None:
+                udp_transport.close()
+
+            return
+        finally:
+            self.ready.set()
+
+        flush_task = self.loop.create_task(self._flush_udp_batches())
+
+        await self.stopped.wait()
+
+        flush_task.cancel()
+
+        if udp_transport is not None:
+            udp_transport.close()
+
+        if tcp_server is not None:
+            tcp_server.close()
+            await tcp_server.wait_closed()
+
+    def receive_datagram(self, data, sender):
+        """
+        Batch the lines of a UDP datagram, dropping them if the parser is too far behind
+
+        :param data: the bytes of the datagram, one or several lines
+        :param sender: the address of the sender
+        """
+        lines = [strip_syslog_header(line) for line in data.decode('utf-8', 'replace').splitlines() if line]
+
+        if len(self.udp_batch) >= UDP_BATCH_SIZE and not self._hand_udp_batch():
+            self.metrics.add(sender, dropped_count=len(lines))
+            return
+
+        self.udp_batch += lines
+        self.metrics.add(sender, received_count=len(lines))
+
+        if len(self.udp_batch) >= UDP_BATCH_SIZE:
+            self._hand_udp_batch()
+
+    async def _flush_udp_batches(self):
+        while True:
+            await asyncio.sleep(BATCH_FLUSH_INTERVAL_S)
+
+            if self.udp_batch:
+                self._hand_udp_batch()
+
+    def _hand_udp_batch(self):
+        """
+        :return: True if the batch was queued, False if the queue is full
+        """
+        try:
+            self.batches.put_nowait(self.udp_batch)
+        except Full:
+            return False
+
+        self.udp_batch = []
+
+        return True
+
+    async def _receive_connection(self, reader, writer):
+        """
+        Read the lines of a TCP connection by chunks until it is closed, each chunk being a batch
+        """
+        sender = writer.get_extra_info('peername')[0]
+        remainder = b''
+
+        try:
+            while True:
+                data = await reader.read(TCP_READ_SIZE)
+
+                if not data:
+                    break
+
+                data = remainder + data
+                end_of_last_line = data.rfind(b'\n')
+
+                if end_of_last_line < 0:
+                    remainder = data
+
+                    if len(remainder) > MAX_LINE_LENGTH:
+                        self.metrics.add(sender, dropped_count=1)
+                        remainder = b''
+
+                    continue
+
+                remainder = data[end_of_last_line + 1:]
+                lines = [strip_syslog_header(line) for line in
+                         data[:end_of_last_line].decode('utf-8', 'replace').split('\n') if line]
+
+                self.metrics.add(sender, received_count=len(lines))
+                await self._hand_tcp_batch(lines)
+
+            if remainder:
+                self.metrics.add(sender, received_count=1)
+                await self._hand_tcp_batch([strip_syslog_header(remainder.decode('utf-8', 'replace'))])
+
+        except ConnectionError:
+            pass
+
+        finally:
+            writer.close()
+
+    async def _hand_tcp_batch(self, lines):
+        """
+        Queue the batch, not reading the connection meanwhile while the queue is full
+        """
+        while True:
+            try:
+                self.batches.put_nowait(lines)
+                return
+            except Full:
+                await asyncio.sleep(BACKPRESSURE_INTERVAL_S)
+
+    def _get_name(self):
+        listeners = []
+
+        if self.udp_port is not None:
+            listeners.append('udp:{}'.format(self.udp_port))
+
+        if self.tcp_port is not None:
+            listeners.append('tcp:{}'.format(self.tcp_port))
+
+        return ' '.join(listeners)
+
+
+class SyslogProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, ingestion_server):
+        self.ingestion_server = ingestion_server
+
+    def datagram_received(self, data, address):
+        self.ingestion_server.receive_datagram(data, address[0])
+
+
+class IngestionParserThread(ParserThread):
+    """
+    A ParserThread parsing the batches of lines received by an IngestionServer rather than the lines of a file
+    """
+
+    def __init__(self, log_queue, ingestion_server, parser_pool=None):
+        super().__init__(log_queue, parser_pool=parser_pool, source=ingestion_server.metrics.name)
+
+        self.ingestion_server = ingestion_server
+
+    def _read_new_blocks(self):
+        """
+        :return: yields the batches of lines received, and an empty list when none is received for a while so that the
+        parser pool does not keep the batches it has pending waiting
+        """
+        while True:
+            try:
+                yield self.ingestion_server.batches.get(timeout=BATCH_FLUSH_INTERVAL_S)
+            except Empty:
+                yield []
+
+
+class IngestionMetrics:
+    """
+    Number of lines received and dropped per sender, to spot the senders flooding the server or not sending anymore.
+    The counts per sender are reset at each report, so that the senders gone are not kept
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = Lock()  # Updated by the event loop while the monitor reports
+
+        self.counts = {}  # Sender to a list of its number of lines received and dropped since the last report
+        self.dropped_count = 0
+        self.last_time = time.monotonic()
+
+    def add(self, sender, received_count=0, dropped_count=0):
+        with self.lock:
+            counts = self.counts.get(sender)
+
+            if counts is None:
+                if len(self.counts) >= MAX_COUNTED_SENDERS:
+                    sender = OTHER_SENDERS
+
+                counts = self.counts.setdefault(sender, [0, 0])
+
+            counts[0] += received_count
+            counts[1] += dropped_count
+            self.dropped_count += dropped_count
+
+    def get_rates(self):
+        """
+        :return: dictionary of each sender to its rate of lines received since the last call, in lines/s
+        """
+        current_time = time.monotonic()
+
+        with self.lock:
+            counts, self.counts = self.counts, {}
+
+        elapsed_time = max(current_time - self.last_time, 1e-6)
+        self.last_time = current_time
+
+        return {sender: sender_counts[0] / elapsed_time for sender, sender_counts in counts.items()}
+
+    def get_report(self):
+        """
+        :return: a message with the rate of lines received, the number of lines dropped, and the most active senders
+        """
+        rates = self.get_rates()
+
+        with self.lock:
+            dropped_count = self.dropped_count
+
+        senders = ', '.join('{} {:.1f}/s'.format(sender, rate) for sender, rate in
+                            sorted(rates.items(), key=lambda item: -item[1])[:REPORTED_SENDER_COUNT])
+
+        return 'Input {}: {:.1f} lines/s from {} senders ({} dropped){}'.format(
+            self.name, sum(rates.values()), len(rates), dropped_count, ' - ' + senders if senders else '')
+
+
+def strip_syslog_header(line):
+    """
+    :param line: a line received, possibly a syslog message
+    :return: the message of the line without its syslog header, the line itself if it is not a syslog message
+    """
+    if not line.startswith('<'):
+        return line
+
+    return line[SYSLOG_HEADER_REGEX.match(line).end():]
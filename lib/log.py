@@ -1,13 +1,21 @@
+from datetime import datetime
+
 RESPONSE_CODE_INFORMATIONAL = 100
 RESPONSE_CODE_SUCCESS = 200
 RESPONSE_CODE_REDIRECTION = 300
 RESPONSE_CODE_CLIENT_ERROR = 400
 RESPONSE_CODE_SERVER_ERROR = 500
 
+EPOCH = datetime(1970, 1, 1)  # Dates of the logs are naive UTC datetimes, timestamps are the seconds since the epoch
+
 
 class Log:
 
-    def __init__(self, remote_host, auth_user, date, request_verb, resource, protocol, status, bytes):
+    # The section and the response code type are derived once when the log is created, as every stat reads them
+    __slots__ = ['remote_host', 'auth_user', 'date', 'request_verb', 'resource', 'protocol', 'status', 'bytes',
+                 'duration', 'section', 'response_code_type']
+
+    def __init__(self, remote_host, auth_user, date, request_verb, resource, protocol, status, bytes, duration=None):
         self.remote_host = remote_host
         self.auth_user = auth_user
         self.date = date
@@ -16,6 +24,11 @@ class Log:
         self.protocol = protocol
         self.status = status
         self.bytes = bytes
+        self.duration = duration  # Time taken to serve the request in seconds, if the log format gives it
+
+        # A section is defined as being what's before the second '/'
+        self.section = '/{}'.format(resource.split('/', 2)[1])
+        self.response_code_type = _get_response_code_type(status)
 
     def is_expired(self, expiry_time):
         return self.date <= expiry_time
@@ -24,27 +37,13 @@ class Log:
         return start_interval_time <= self.date < end_interval_time
 
     def get_section_hit(self):
-        return '/{}'.format(self.resource.split('/')[1])  # A section is defined as being what's before the second '/'
+        return self.section
 
     def get_response_code_type(self):
-        if RESPONSE_CODE_INFORMATIONAL <= self.status <  RESPONSE_CODE_SUCCESS:
-            return RESPONSE_CODE_INFORMATIONAL
-
-        elif RESPONSE_CODE_SUCCESS <= self.status <  RESPONSE_CODE_REDIRECTION:
-            return RESPONSE_CODE_SUCCESS
-
-        elif RESPONSE_CODE_REDIRECTION <= self.status < RESPONSE_CODE_CLIENT_ERROR:
-            return RESPONSE_CODE_REDIRECTION
-
-        elif RESPONSE_CODE_CLIENT_ERROR <= self.status < RESPONSE_CODE_SERVER_ERROR:
-            return RESPONSE_CODE_CLIENT_ERROR
-
-        elif RESPONSE_CODE_SERVER_ERROR <= self.status:
-            return RESPONSE_CODE_SERVER_ERROR
+        return self.response_code_type
 
     def get_response_code_type_formatted(self):
-        code_type = self.get_response_code_type()
-        return str(code_type).replace('0', 'x')
+        return RESPONSE_CODE_TYPES_FORMATTED.get(self.response_code_type, 'None')
 
     def __str__(self):
         return '{} - {} [{}] "{} {} {}" {} {}'.format(self.remote_host,
@@ -54,4 +53,27 @@ class Log:
                                                       self.resource,
                                                       self.protocol,
                                                       str(self.status),
-                                                      str(self.bytes))
\ No newline at end of file
+                                                      str(self.bytes))
+
+
+def _get_response_code_type(status):
+    if RESPONSE_CODE_INFORMATIONAL <= status <  RESPONSE_CODE_SUCCESS:
+        return RESPONSE_CODE_INFORMATIONAL
+
+    elif RESPONSE_CODE_SUCCESS <= status <  RESPONSE_CODE_REDIRECTION:
+        return RESPONSE_CODE_SUCCESS
+
+    elif RESPONSE_CODE_REDIRECTION <= status < RESPONSE_CODE_CLIENT_ERROR:
+        return RESPONSE_CODE_REDIRECTION
+
+    elif RESPONSE_CODE_CLIENT_ERROR <= status < RESPONSE_CODE_SERVER_ERROR:
+        return RESPONSE_CODE_CLIENT_ERROR
+
+    elif RESPONSE_CODE_SERVER_ERROR <= status:
+        return RESPONSE_CODE_SERVER_ERROR
+
+
+RESPONSE_CODE_TYPES_FORMATTED = {code_type: str(code_type).replace('0', 'x')
+                                 for code_type in [RESPONSE_CODE_INFORMATIONAL, RESPONSE_CODE_SUCCESS,
+                                                   RESPONSE_CODE_REDIRECTION, RESPONSE_CODE_CLIENT_ERROR,
+                                                   RESPONSE_CODE_SERVER_ERROR]}
@@ -1,30 +1,150 @@
-import collections
+import itertools
+import math
+import pickle
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from heapq import heappush, heappop
+from threading import Lock
+
+from lib import app_config, numpy_backend
+from lib.aggregates import Bucket, BucketWindow
+from lib.history import HISTORY_ACCUMULATORS
+from lib.app_config import KEY_REORDER_WINDOW_S, KEY_REORDER_BUFFER_SIZE, KEY_MAX_RETAINED_LOGS, KEY_MAX_MEMORY_MB, \
+    KEY_OVERLOAD_POLICY
+from lib.log import Log, EPOCH
+
+STORE_OBJECTS = 'objects'
+STORE_COLUMNAR = 'columnar'
+STORE_NUMPY = 'numpy'
+
+POLICY_DROP = 'drop'
+POLICY_SAMPLE = 'sample'
+
+# With the sample policy, once the queue is filled above this share of its capacity, only 1 log out of SAMPLING_RATE
+# is kept, so the logs kept keep being spread over time
+SAMPLING_THRESHOLD = 0.5
+SAMPLING_RATE = 10
+
+# The expired head of the store is only removed once it represents this share of its size, so that removing the
+# expired rows costs an amortized O(1) per row
+COMPACTION_RATIO = 0.5
+
+# On compaction, the strings of the expired logs are released once the strings interned outnumber this share of the
+# logs retained, so that the strings interned stay bounded by the logs retained, while columns with few distinct strings
+# are not scanned at every compaction
+INTERNER_COMPACTION_RATIO = 0.25
+INTERNER_COMPACTION_MIN_SIZE = 1024
+
+# Largest status the typed arrays of the statuses can hold
+MAX_STORED_STATUS = 65535
 
 
 class LogQueue:
+    """
+    The logs retained, kept sorted by date alongside an array of their timestamps, so that interval queries and expiry
+    are binary searches.
+    Logs written by several workers are not strictly in chronological order, so appended logs first wait in a bounded
+    reorder buffer until no older log is expected anymore. A log arriving after newer logs have left the buffer is
+    stored with the date of the newest log released, so it is still counted.
+    Logs are also aggregated per second as soon as they are appended, for the stats and alerts not to read every log.
+    The number of logs retained is bounded: when a traffic spike fills the queue, logs are dropped or sampled according
+    to the overload policy. The aggregates still count every log, so the stats and alerts stay exact.
+    """
+
+    ENTRY_SIZE = 500  # Estimation of the memory used by a retained log, in bytes
+    AGGREGATE_ON_APPEND = True  # Whether the logs are aggregated per second when appended, or when queried
+
     def __init__(self):
-        self.deque = collections.deque()  # Use a deque to store the logs, as it is a concurrent object
+        self.reorder_window_s = app_config.get(KEY_REORDER_WINDOW_S)
+        self.reorder_buffer_size = app_config.get(KEY_REORDER_BUFFER_SIZE)
+
+        self.overload_policy = app_config.get(KEY_OVERLOAD_POLICY)
+        self.capacity = min(app_config.get(KEY_MAX_RETAINED_LOGS),
+                            app_config.get(KEY_MAX_MEMORY_MB) * 1000000 // self.ENTRY_SIZE)
+        self.dropped_count = 0
+        self.sampled_out_count = 0
+        self.sampling_counter = 0
+
+        self.lock = Lock()  # The parser thread appends while the monitor queries and flushes
+
+        self.reorder_buffer = []  # A heap of (timestamp, sequence number, log), to release logs by date
+        self.sequence = itertools.count()  # Keeps logs of the same date in their arrival order
+        self.newest_timestamp = -math.inf
+        self.last_released_timestamp = -math.inf
+        self.late_count = 0
+
+        self.start = 0  # Index of the first row not expired, rows before it are removed on compaction
+        self.dates = array('d')  # Timestamps of the logs released, in chronological order
+        self.logs = []
+
+        self.aggregates = BucketWindow()
+        self.history = None  # HistoryStore the aggregates of each second are written to once expired, if any
 
     def append(self, log):
-        self.deque.append(log)
+        timestamp = to_timestamp(log.date)
+
+        with self.lock:
+            if self.AGGREGATE_ON_APPEND:
+                self.aggregates.add(log, timestamp)
+
+            self._buffer(log, timestamp)
+
+            self._release_before(self.newest_timestamp - self.reorder_window_s)
+
+    def append_batch(self, rows, buckets):
+        """
+        Append a batch of logs which have already been aggregated per second
+
+        :param rows: iterable of tuples (timestamp of the log in epoch seconds, log)
+        :param buckets: dictionary of epoch second to the Bucket of the logs of that second
+        """
+        with self.lock:
+            if self.AGGREGATE_ON_APPEND:
+                self.aggregates.add_buckets(buckets)
+
+            for timestamp, log in rows:
+                self._buffer(log, timestamp)
+
+            self._release_before(self.newest_timestamp - self.reorder_window_s)
 
     def flush_expired(self, expiry_time):
         """
-        Remove starting from the front the outdated logs. As logs are appended in chronological order, once we have
-        found a log not expired, we stop removing elements.
+        Move the start of the queue after the outdated logs, found by binary search as logs are kept in chronological
+        order
 
         :param expiry_time: datetime representing the time under which a log is considered expired
         """
-        while len(self.deque) > 0:
-            log = self.deque[0]
+        expiry_timestamp = to_timestamp(expiry_time)
 
-            if not log.is_expired(expiry_time):
-                break
+        with self.lock:
+            expired_buckets = self.aggregates.flush_expired(expiry_timestamp)
 
-            self.deque.popleft()
+            self._release_before(math.nextafter(expiry_timestamp, math.inf))
+
+            start = bisect_right(self.dates, expiry_timestamp, self.start)
+
+            # Queued with the lock held, so that the seconds are written in order when several threads flush
+            if self.history is not None:
+                if not self.AGGREGATE_ON_APPEND:
+                    # Only the logs not retained have been aggregated on append
+                    expired_buckets = _merge_buckets(self._aggregate_seconds(self.start, start), expired_buckets)
+
+                self.history.enqueue(expired_buckets, expiry_timestamp)
+
+            self.start = start
+
+            if self.start > len(self.dates) * COMPACTION_RATIO:
+                self._compact()
+
+        # Written once the lock is released, so that the parsers are not blocked by the disk
+        if self.history is not None:
+            self.history.write_enqueued()
 
     def get_all_logs(self):
-        return list(self.deque)
+        with self.lock:
+            self._release_before(math.inf)
+            return LogsView(self, self.start, len(self.dates))
 
     def get_logs(self, start_interval_time, end_interval_time):
         """
@@ -33,12 +153,521 @@ class LogQueue:
 
         :param start_interval_time: start datetime
         :param end_interval_time: end datetime
-        :return: all the log objects with a time between these 2 times
+        :return: a view on all the log objects with a time between these 2 times, valid until the next flush
+        """
+        start_timestamp = to_timestamp(start_interval_time)
+        end_timestamp = to_timestamp(end_interval_time)
+
+        with self.lock:
+            self._release_before(end_timestamp)
+
+            start = bisect_left(self.dates, start_timestamp, self.start)
+            end = bisect_left(self.dates, end_timestamp, start)
+
+            return LogsView(self, start, end)
+
+    def get_aggregates(self, start_interval_time, end_interval_time):
+        """
+        Get the aggregates of the logs between an interval of time, with the same bounds as get_logs
+
+        :param start_interval_time: start datetime
+        :param end_interval_time: end datetime
+        :return: a Bucket aggregating all the logs with a time between these 2 times
+        """
+        with self.lock:
+            return self.aggregates.get_interval(to_timestamp(start_interval_time), to_timestamp(end_interval_time))
+
+    def get_retained_aggregates(self, names=None):
+        """
+        :param names: the names of the accumulators of BUCKET_ACCUMULATORS to aggregate, all of them if None
+        :return: a Bucket aggregating all the logs not expired
+        """
+        with self.lock:
+            return self.aggregates.get_total(names)
+
+    def get_report(self):
+        """
+        :return: a message with the number of logs retained, and of those not retained to bound the memory used
+        """
+        with self.lock:
+            return 'Retained logs: {} ({} dropped, {} sampled out, {} late)'.format(len(self.dates) - self.start,
+                                                                                   self.dropped_count,
+                                                                                   self.sampled_out_count,
+                                                                                   self.late_count)
+
+    def get_snapshot(self):
         """
-        recent_logs = []
+        :return: the serialized state the stats and alerts of the logs retained are computed from, for a LogQueue
+        restarted with restore_snapshot to compute the same ones. The stores aggregating the logs on append only save
+        their per second buckets, and not the logs themselves, so that the snapshot stays small whatever the traffic
+        """
+        with self.lock:
+            # Serialized with the lock held, as the parsers keep updating the buckets
+            return pickle.dumps(self._get_state(), pickle.HIGHEST_PROTOCOL)
+
+    def restore_snapshot(self, snapshot):
+        """
+        :param snapshot: the serialized state returned by get_snapshot, from a LogQueue of the same store
+        """
+        state = pickle.loads(snapshot)
+
+        with self.lock:
+            self._set_state(state)
+
+    def __len__(self):
+        return len(self.dates) - self.start + len(self.reorder_buffer)
+
+    def _get_state(self):
+        return {
+            'aggregates': self.aggregates,
+            'newest_timestamp': self.newest_timestamp,
+            'last_released_timestamp': self.last_released_timestamp
+        }
+
+    def _set_state(self, state):
+        self.aggregates = state['aggregates']
+        self.newest_timestamp = state['newest_timestamp']
+        self.last_released_timestamp = state['last_released_timestamp']
+
+    def _aggregate_seconds(self, start, end):
+        """
+        Aggregate the rows in [start, end[ per second, with the accumulators written to the history
+
+        :return: dictionary of epoch second to the Bucket of the logs of that second
+        """
+        buckets = {}
+
+        for i in range(start, end):
+            second = math.floor(self.dates[i])
+
+            if second not in buckets:
+                buckets[second] = Bucket(HISTORY_ACCUMULATORS)
+
+            buckets[second].add(self._get_row(i))
+
+        return buckets
+
+    def _buffer(self, log, timestamp):
+        heappush(self.reorder_buffer, (timestamp, next(self.sequence), log))
+
+        if timestamp > self.newest_timestamp:
+            self.newest_timestamp = timestamp
+
+    def _release_before(self, until_timestamp):
+        """
+        Move from the reorder buffer to the queue the logs older than the given time, and the oldest logs if the buffer
+        is full. Must be called with the lock held.
+        """
+        while self.reorder_buffer and (self.reorder_buffer[0][0] < until_timestamp
+                                       or len(self.reorder_buffer) > self.reorder_buffer_size):
+            timestamp, _, log = heappop(self.reorder_buffer)
+
+            if timestamp < self.last_released_timestamp:
+                timestamp = self.last_released_timestamp
+                self.late_count += 1
+
+            self.last_released_timestamp = timestamp
+
+            if self._is_overloaded():
+                self._skip_row(log, timestamp)
+                continue
+
+            self.dates.append(timestamp)
+            self._append_row(log, timestamp)
+
+    def _is_overloaded(self):
+        """
+        Apply the overload policy to the log being released
+
+        :return: True if the log must not be retained
+        """
+        retained_count = len(self.dates) - self.start
+
+        if retained_count >= self.capacity:
+            self.dropped_count += 1
+            return True
+
+        if self.overload_policy == POLICY_SAMPLE and retained_count >= self.capacity * SAMPLING_THRESHOLD:
+            self.sampling_counter += 1
+
+            if self.sampling_counter % SAMPLING_RATE:
+                self.sampled_out_count += 1
+                return True
+
+        return False
+
+    def _skip_row(self, log, timestamp):
+        """
+        Called for a log not retained because of the overload policy, already aggregated when it was appended
+        """
+
+    def _append_row(self, log, timestamp):
+        self.logs.append(log)
+
+    def _get_row(self, i):
+        return self.logs[i]
+
+    def _columns(self):
+        return [self.dates, self.logs]
+
+    def _compact(self):
+        for column in self._columns():
+            del column[:self.start]
+
+        self.start = 0
+
+
+class ColumnarLogQueue(LogQueue):
+    """
+    A LogQueue storing the logs in typed arrays, one per field, instead of keeping a Log object per line. Dates are
+    stored as epoch seconds, and the strings are interned into small integer codes, so that a retained log costs a few
+    dozen bytes. Log objects are only created back when the logs are read.
+    """
+
+    # The columns of a log take 48 bytes, and the interned strings are usually shared by many logs. When every log has
+    # its own resource, the strings are released with their logs but take about as much, hence a larger estimation
+    ENTRY_SIZE = 96
+
+    def __init__(self):
+        super().__init__()
+
+        self.statuses = array('H')
+        self.bytes = array('q')
+        self.durations = array('d')  # NaN for the logs without duration
+        self.remote_hosts = array('I')
+        self.auth_users = array('I')
+        self.request_verbs = array('I')
+        self.resources = array('I')
+        self.protocols = array('I')
+
+        self.remote_host_codes = StringInterner()
+        self.auth_user_codes = StringInterner()
+        self.request_verb_codes = StringInterner()
+        self.resource_codes = StringInterner()
+        self.protocol_codes = StringInterner()
+
+    def _append_row(self, log, timestamp):
+        self.statuses.append(encode_status(log.status))
+        self.bytes.append(log.bytes)
+        self.durations.append(encode_duration(log.duration))
+        self.remote_hosts.append(self.remote_host_codes.intern(log.remote_host))
+        self.auth_users.append(self.auth_user_codes.intern(log.auth_user))
+        self.request_verbs.append(self.request_verb_codes.intern(log.request_verb))
+        self.resources.append(self.resource_codes.intern(log.resource))
+        self.protocols.append(self.protocol_codes.intern(log.protocol))
+
+    def _get_row(self, i):
+        return Log(self.remote_host_codes.get(self.remote_hosts[i]),
+                   self.auth_user_codes.get(self.auth_users[i]),
+                   from_timestamp(self.dates[i]),
+                   self.request_verb_codes.get(self.request_verbs[i]),
+                   self.resource_codes.get(self.resources[i]),
+                   self.protocol_codes.get(self.protocols[i]),
+                   self.statuses[i],
+                   self.bytes[i],
+                   decode_duration(self.durations[i]))
+
+    def _columns(self):
+        return [self.dates, self.statuses, self.bytes, self.durations, self.remote_hosts, self.auth_users,
+                self.request_verbs, self.resources, self.protocols]
+
+    def _compact(self):
+        super()._compact()
+
+        for codes, interner in [(self.remote_hosts, self.remote_host_codes), (self.auth_users, self.auth_user_codes),
+                                (self.request_verbs, self.request_verb_codes), (self.resources, self.resource_codes),
+                                (self.protocols, self.protocol_codes)]:
+            if len(interner.strings) > max(len(codes) * INTERNER_COMPACTION_RATIO, INTERNER_COMPACTION_MIN_SIZE):
+                self._compact_interner(codes, interner)
+
+    def _compact_interner(self, codes, interner):
+        interner.compact(codes)
+
+
+class NumpyLogQueue(ColumnarLogQueue):
+    """
+    A ColumnarLogQueue computing the aggregates with vectorized numpy operations over its arrays when they are queried,
+    rather than aggregating each log as it is appended. Only the logs the overload policy does not retain are aggregated
+    per second as they are released, and merged into the aggregates of the rows, so that the stats and alerts stay
+    exact under a traffic spike like the ones of the other stores.
+    """
+
+    AGGREGATE_ON_APPEND = False
+
+    def __init__(self):
+        super().__init__()
+
+        self.resource_sections = array('I')  # Code of the section of each resource code
+        self.section_codes = StringInterner()
+        self.expiry_timestamp = -math.inf
+
+    def flush_expired(self, expiry_time):
+        expiry_timestamp = to_timestamp(expiry_time)
+
+        with self.lock:
+            self.expiry_timestamp = max(self.expiry_timestamp, expiry_timestamp)
+
+            # The logs not retained are aggregated when released, before their seconds expire
+            self._release_before(math.nextafter(expiry_timestamp, math.inf))
+
+        super().flush_expired(expiry_time)
+
+    def get_aggregates(self, start_interval_time, end_interval_time):
+        start_timestamp = to_timestamp(start_interval_time)
+        end_timestamp = to_timestamp(end_interval_time)
+
+        with self.lock:
+            self._release_before(end_timestamp)
+
+            start = bisect_left(self.dates, start_timestamp, self.start)
+            end = bisect_left(self.dates, end_timestamp, start)
+
+            aggregates = self._aggregate_rows(start, end)
+
+            if self.aggregates.seconds:
+                aggregates.merge(self.aggregates.get_interval(start_timestamp, end_timestamp))
+
+            return aggregates
+
+    def get_retained_aggregates(self, names=None):
+        with self.lock:
+            aggregates = self._aggregate_rows(self.start, len(self.dates), names)
+
+            if self.aggregates.seconds:
+                aggregates.merge(self.aggregates.get_total(names))
+
+            # The logs still waiting in the reorder buffer are not in the arrays yet
+            for timestamp, _, log in self.reorder_buffer:
+                if timestamp > self.expiry_timestamp:
+                    aggregates.add(log)
+
+            return aggregates
+
+    def _aggregate_seconds(self, start, end):
+        buckets = {}
+
+        while start < end:
+            second = math.floor(self.dates[start])
+            second_end = bisect_left(self.dates, second + 1, start, end)
+
+            buckets[second] = self._aggregate_rows(start, second_end, HISTORY_ACCUMULATORS)
+            start = second_end
+
+        return buckets
+
+    def _get_state(self):
+        # The aggregates are computed from the rows, so the retained rows are saved, along with the logs not released
+        # and the aggregates of the logs not retained
+        return {
+            'aggregates': self.aggregates,
+            'columns': [column[self.start:] for column in self._columns()],
+            'interners': self._interners(),
+            'resource_sections': self.resource_sections,
+            'reorder_buffer': [(timestamp, log) for timestamp, _, log in sorted(self.reorder_buffer)],
+            'newest_timestamp': self.newest_timestamp,
+            'last_released_timestamp': self.last_released_timestamp,
+            'expiry_timestamp': self.expiry_timestamp
+        }
+
+    def _set_state(self, state):
+        self.aggregates = state['aggregates']
+
+        for column, saved_column in zip(self._columns(), state['columns']):
+            column[:] = saved_column
+
+        (self.remote_host_codes, self.auth_user_codes, self.request_verb_codes, self.resource_codes,
+         self.protocol_codes, self.section_codes) = state['interners']
+
+        self.resource_sections = state['resource_sections']
+        self.start = 0
+        self.newest_timestamp = state['newest_timestamp']
+        self.last_released_timestamp = state['last_released_timestamp']
+        self.expiry_timestamp = state['expiry_timestamp']
+
+        for timestamp, log in state['reorder_buffer']:
+            self._buffer(log, timestamp)
+
+    def _interners(self):
+        return [self.remote_host_codes, self.auth_user_codes, self.request_verb_codes, self.resource_codes,
+                self.protocol_codes, self.section_codes]
+
+    def _compact_interner(self, codes, interner):
+        previous_codes = interner.compact(codes)
+
+        # The sections are indexed by resource code
+        if interner is self.resource_codes:
+            self.resource_sections = array('I', [self.resource_sections[code] for code in previous_codes])
+            self.section_codes.compact(self.resource_sections)
+
+    def _skip_row(self, log, timestamp):
+        self.aggregates.add(log, timestamp)
+
+    def _append_row(self, log, timestamp):
+        super()._append_row(log, timestamp)
+
+        # Codes are given in sequence, so a resource seen for the first time has the next code
+        if self.resources[-1] == len(self.resource_sections):
+            self.resource_sections.append(self.section_codes.intern(log.section))
+
+    def _aggregate_rows(self, start, end, names=None):
+        columns = {
+            'dates': self.dates[start:end],
+            'statuses': self.statuses[start:end],
+            'bytes': self.bytes[start:end],
+            'durations': self.durations[start:end],
+            'remote_hosts': self.remote_hosts[start:end],
+            'remote_host_strings': self.remote_host_codes.strings,
+            'auth_users': self.auth_users[start:end],
+            'auth_user_strings': self.auth_user_codes.strings,
+            'resources': self.resources[start:end],
+            'resource_strings': self.resource_codes.strings,
+            'resource_sections': self.resource_sections,
+            'sections': self.section_codes.strings
+        }
+
+        return numpy_backend.aggregate_columns(columns, lambda: (self._get_row(i) for i in range(start, end)), names)
+
+
+class LogsView:
+    """
+    A read only sequence over a range of rows of a LogQueue, avoiding to copy the logs into a new list
+    """
+
+    def __init__(self, log_queue, start, end):
+        self.log_queue = log_queue
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+
+        if not 0 <= i < len(self):
+            raise IndexError('log view index out of range')
+
+        return self.log_queue._get_row(self.start + i)
+
+    def __iter__(self):
+        get_row = self.log_queue._get_row
+
+        for i in range(self.start, self.end):
+            yield get_row(i)
+
+
+class StringInterner:
+    """
+    Map each distinct string to a small integer code, so a column only stores the code of its strings. The strings not
+    used anymore are only released by a compaction, which gives new codes to the strings still used
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def intern(self, string):
+        code = self.codes.get(string)
+
+        if code is None:
+            code = len(self.strings)
+            self.codes[string] = code
+            self.strings.append(string)
+
+        return code
+
+    def get(self, code):
+        return self.strings[code]
+
+    def compact(self, codes):
+        """
+        Release the strings whose codes are not in the codes given, the strings kept being given new codes in the order
+        they are first used
+
+        :param codes: array of all the codes still used, updated in place with the new codes
+        :return: the list of the previous code of each new code
+        """
+        new_codes = {}
+        previous_codes = []
+
+        for code in codes:
+            if code not in new_codes:
+                new_codes[code] = len(previous_codes)
+                previous_codes.append(code)
+
+        codes[:] = array(codes.typecode, [new_codes[code] for code in codes])
+
+        self.strings = [self.strings[code] for code in previous_codes]
+        self.codes = {string: code for code, string in enumerate(self.strings)}
+
+        return previous_codes
+
+    def __getstate__(self):
+        return self.strings  # Only the strings are sent to another process, the codes are rebuilt from them
+
+    def __setstate__(self, strings):
+        self.strings = strings
+        self.codes = {string: code for code, string in enumerate(strings)}
+
+
+def _merge_buckets(buckets, other_buckets):
+    """
+    :param buckets: dictionary of epoch second to Bucket, updated with the other buckets
+    :param other_buckets: dictionary of epoch second to Bucket
+    :return: the merged dictionary, sorted by second
+    """
+    for second, bucket in other_buckets.items():
+        if second in buckets:
+            buckets[second].merge(bucket)
+        else:
+            buckets[second] = bucket
+
+    return dict(sorted(buckets.items()))
+
+
+def to_timestamp(date):
+    return (date - EPOCH).total_seconds()
+
+
+def from_timestamp(timestamp):
+    return EPOCH + timedelta(seconds=timestamp)
+
+
+def encode_status(status):
+    """
+    :return: the status of a log as stored in an unsigned 16 bits typed array, clamped to its range so that a malformed
+    status can not stop the ingestion. The response code type of a clamped status is the same
+    """
+    return min(max(status, 0), MAX_STORED_STATUS)
+
+
+def encode_duration(duration):
+    """
+    :return: the duration of a log as stored in a typed array, NaN if the log has none
+    """
+    return math.nan if duration is None else duration
+
+
+def decode_duration(value):
+    return None if math.isnan(value) else value
+
+
+LOG_QUEUES = {
+    STORE_OBJECTS: LogQueue,
+    STORE_COLUMNAR: ColumnarLogQueue
+}
+
+if numpy_backend.is_available():
+    LOG_QUEUES[STORE_NUMPY] = NumpyLogQueue
+
 
-        for log in self.get_all_logs():
-            if log.is_in_interval(start_interval_time, end_interval_time):
-                recent_logs.append(log)
+def create_log_queue(store, history=None):
+    """
+    :param store: the name of the store in LOG_QUEUES
+    :param history: HistoryStore to write the aggregates of the expired seconds to, if any
+    """
+    log_queue = LOG_QUEUES[store]()
+    log_queue.history = history
 
-        return recent_logs
+    return log_queue
@@ -1,14 +1,32 @@
-from threading import Thread
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 from lib import stats, alerts, console
 
 
 class MonitorThreadGenerator:
-    def __init__(self, log_queue, console_model):
+    """
+    Dispatch a Monitor pass to a worker thread at each tick of the clock, so a slow pass never delays the clock.
+    Passes never overlap: a tick happening while a pass is still running is skipped, and its interval is coalesced into
+    the interval of the next pass, so no log is left out of the stats.
+    """
+
+    def __init__(self, log_queue, console_model, input_metrics=(), evaluate_alerts=True):
         self.log_queue = log_queue
         self.console_model = console_model
+        self.input_metrics = input_metrics  # ParserMetrics of the inputs, reported after each pass
+        self.evaluate_alerts = evaluate_alerts  # False when the alerts are evaluated by an AlertEvaluatorThread
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='monitor')
+        self.lock = Lock()
+        self.running = False
+        self.pending_start_interval = None
+
+        self.metrics = MonitorMetrics()
 
-    def generate(self, task_start_time, start_interval, end_interval, expiry_time):
+    def generate(self, task_start_time, start_interval, end_interval, expiry_time, tick_lateness=0):
         """
         Main function called to spawn Monitor threads
 
@@ -16,13 +34,66 @@ class MonitorThreadGenerator:
         :param start_interval: start datetime for logs to process
         :param end_interval: end datetime for logs to process
         :param expiry_time: datetime under which logs are considered expired
+        :param tick_lateness: seconds elapsed between the time the tick was scheduled and the call
+        :return: True if a pass has been dispatched, False if it has been skipped
         """
-        monitor = Monitor(self.log_queue, self.console_model, task_start_time, start_interval, end_interval, expiry_time)
-        Thread(target=monitor.run).run()
+        with self.lock:
+            self.metrics.tick_lateness = tick_lateness
+
+            if self.pending_start_interval is not None:
+                start_interval = self.pending_start_interval
+
+            if self.running:
+                self.pending_start_interval = start_interval
+                self.metrics.skipped_passes += 1
+                return False
+
+            self.pending_start_interval = None
+            self.running = True
+
+        monitor = Monitor(self.log_queue, self.console_model, task_start_time, start_interval, end_interval,
+                          expiry_time, evaluate_alerts=self.evaluate_alerts)
+        self.executor.submit(self._run, monitor)
+
+        return True
+
+    def _run(self, monitor):
+        pass_start_time = time.monotonic()
+
+        try:
+            monitor.run()
+        except Exception:
+            # Nobody waits on the future of the pass, so its exception would be lost otherwise
+            logging.exception('Monitor pass failed')
+        finally:
+            with self.lock:
+                self.running = False
+                self.metrics.pass_duration = time.monotonic() - pass_start_time
+
+            self.console_model.update_monitor_metrics(self.metrics)
+            self.console_model.update_input_messages([metrics.get_report() for metrics in self.input_metrics] +
+                                                     [self.log_queue.get_report()])
+
+
+class MonitorMetrics:
+    """
+    Health of the monitoring, to know whether the refresh time can be honored
+    """
+
+    def __init__(self):
+        self.tick_lateness = 0
+        self.pass_duration = 0
+        self.skipped_passes = 0
+
+    def __str__(self):
+        return 'pass {:.0f} ms, tick {:.0f} ms late, {} skipped'.format(self.pass_duration * 1000,
+                                                                         self.tick_lateness * 1000,
+                                                                         self.skipped_passes)
 
 
 class Monitor:
-    def __init__(self, log_queue, console_model, task_start_time, start_interval_time, end_interval_time, expiry_time):
+    def __init__(self, log_queue, console_model, task_start_time, start_interval_time, end_interval_time, expiry_time,
+                 evaluate_alerts=True):
         super().__init__()
 
         self.log_queue = log_queue
@@ -31,6 +102,7 @@ class Monitor:
         self.start_interval_time = start_interval_time
         self.end_interval_time = end_interval_time
         self.expiry_time = expiry_time
+        self.evaluate_alerts = evaluate_alerts
 
     def run(self):
         """
@@ -38,26 +110,34 @@ class Monitor:
         - flushing the outdated elements out of the queue
         - computing the stats and alerts for the logs in the time interval given to the process
         - updating the console model with those computed stats and alerts
+        The alerts are left out when they are evaluated on their own, more often than the stats
         """
         self._flush_expired_logs()
 
-        computed_stats = self._compute_stats()
-        computed_alerts = self._compute_alerts()
+        retained_aggregates = self.log_queue.get_retained_aggregates()
+
+        computed_stats = self._compute_stats(retained_aggregates)
+
+        if not self.evaluate_alerts:
+            self.console_model.update_stats(self.task_start_time, computed_stats)
+            return
+
+        computed_alerts = self._compute_alerts(retained_aggregates)
 
         self._update_console(computed_stats, computed_alerts)
 
     def _flush_expired_logs(self):
         self.log_queue.flush_expired(self.expiry_time)
 
-    def _compute_stats(self):
-        logs_in_interval = self.log_queue.get_logs(self.start_interval_time, self.end_interval_time)
-        computed_stats = stats.compute(self.task_start_time, logs_in_interval)
+    def _compute_stats(self, retained_aggregates):
+        interval_aggregates = self.log_queue.get_aggregates(self.start_interval_time, self.end_interval_time)
+        interval_time_s = (self.end_interval_time - self.start_interval_time).total_seconds()
+        computed_stats = stats.compute(self.task_start_time, interval_aggregates, retained_aggregates, interval_time_s)
 
         return computed_stats
 
-    def _compute_alerts(self):
-        all_logs = self.log_queue.get_all_logs()
-        computed_alerts = alerts.compute(self.task_start_time, all_logs)
+    def _compute_alerts(self, retained_aggregates):
+        computed_alerts = alerts.compute(self.task_start_time, retained_aggregates)
         return computed_alerts
 
     def _update_console(self, computed_stats, computed_alerts):
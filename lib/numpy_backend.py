@@ -0,0 +1,172 @@
+from collections import Counter
+from datetime import timedelta
+
+from lib.aggregates import Bucket, SECTION_HITS, REMOTE_HOST_HITS, SECTION_COUNTS, REMOTE_HOST_COUNTS, \
+    SECOND_HITS, SECOND_SERVER_ERRORS, AUTH_USER_HITS, UNIQUE_REMOTE_HOSTS, UNIQUE_RESOURCES, RESPONSE_CODE_TYPES, \
+    BYTES, BYTES_QUANTILES, DURATION_QUANTILES
+from lib.log import RESPONSE_CODE_SERVER_ERROR, EPOCH
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional dependency, the numpy store is only available when it is installed
+
+# Response code types indexed by the hundreds digit of the status, statuses above 599 being server errors like in Log
+RESPONSE_CODE_TYPE_COUNT = RESPONSE_CODE_SERVER_ERROR // 100 + 1
+
+
+def is_available():
+    return np is not None
+
+
+def aggregate_columns(columns, get_rows, names=None):
+    """
+    Aggregate logs stored by column with vectorized operations, into the same Bucket as adding the logs one by one.
+    Accumulators without a vectorized computation in VECTORIZED_ACCUMULATORS are fed with the logs themselves.
+
+    :param columns: dictionary of the typed arrays of the logs to aggregate: their 'dates' as timestamps, 'statuses',
+    'bytes', 'durations', the codes of their 'remote_hosts', 'auth_users' and 'resources' along with the lists of
+    strings of these codes ('remote_host_strings', 'auth_user_strings' and 'resource_strings'), and
+    'resource_sections' (code of the section of each resource code) with 'sections' (the section of each section code)
+    :param get_rows: function returning the logs to aggregate, only called for the accumulators not vectorized
+    :param names: the names of the accumulators to aggregate, all of them if None
+    :return: a Bucket aggregating the logs
+    """
+    bucket = Bucket(names)
+    bucket.hits = len(columns['statuses'])
+
+    if not bucket.hits:
+        return bucket
+
+    for name, accumulator in bucket.accumulators.items():
+        compute_accumulator = VECTORIZED_ACCUMULATORS.get(name)
+
+        if compute_accumulator:
+            compute_accumulator(accumulator, columns)
+            continue
+
+        for log in get_rows():
+            accumulator.add(log)
+
+    return bucket
+
+
+def _count_codes(codes, strings):
+    """
+    :param codes: numpy array of string codes
+    :param strings: the string of each code
+    :return: a dictionary of string to its number of occurrences, in the order the strings were first seen, like a
+    Counter fed log by log, so that strings with the same count are ranked the same way
+    """
+    unique_codes, first_indexes, counts = np.unique(codes, return_index=True, return_counts=True)
+    order = np.argsort(first_indexes, kind='stable')
+
+    return {strings[unique_codes[i]]: int(counts[i]) for i in order}
+
+
+def _count_sections(columns):
+    resource_sections = np.frombuffer(columns['resource_sections'], dtype=np.uint32)
+    sections = resource_sections[np.frombuffer(columns['resources'], dtype=np.uint32)]
+
+    return _count_codes(sections, columns['sections'])
+
+
+def _count_remote_hosts(columns):
+    return _count_codes(np.frombuffer(columns['remote_hosts'], dtype=np.uint32), columns['remote_host_strings'])
+
+
+def _compute_section_hits(accumulator, columns):
+    accumulator.value.add_counts(_count_sections(columns))
+
+
+def _compute_remote_host_hits(accumulator, columns):
+    accumulator.value.add_counts(_count_remote_hosts(columns))
+
+
+def _compute_section_counts(accumulator, columns):
+    accumulator.add_counts(_count_sections(columns))
+
+
+def _compute_remote_host_counts(accumulator, columns):
+    accumulator.add_counts(_count_remote_hosts(columns))
+
+
+def _compute_auth_user_hits(accumulator, columns):
+    auth_users = np.frombuffer(columns['auth_users'], dtype=np.uint32)
+    accumulator.value.add_counts(_count_codes(auth_users, columns['auth_user_strings']))
+
+
+def _count_seconds(timestamps):
+    """
+    :param timestamps: numpy array of timestamps
+    :return: a Counter of the datetime of each second to its number of timestamps
+    """
+    seconds, counts = np.unique(np.floor(timestamps).astype(np.int64), return_counts=True)
+
+    return Counter({EPOCH + timedelta(seconds=second): count
+                    for second, count in zip(seconds.tolist(), counts.tolist())})
+
+
+def _compute_second_hits(accumulator, columns):
+    accumulator.value = _count_seconds(np.frombuffer(columns['dates'], dtype=np.float64))
+
+
+def _compute_second_server_errors(accumulator, columns):
+    server_errors = np.frombuffer(columns['statuses'], dtype=np.uint16) >= RESPONSE_CODE_SERVER_ERROR
+    accumulator.value = _count_seconds(np.frombuffer(columns['dates'], dtype=np.float64)[server_errors])
+
+
+def _compute_unique_remote_hosts(accumulator, columns):
+    # A distinct count only needs each distinct value once
+    for code in np.unique(np.frombuffer(columns['remote_hosts'], dtype=np.uint32)):
+        accumulator.value.add(columns['remote_host_strings'][code])
+
+
+def _compute_unique_resources(accumulator, columns):
+    for code in np.unique(np.frombuffer(columns['resources'], dtype=np.uint32)):
+        accumulator.value.add(columns['resource_strings'][code])
+
+
+def _compute_bytes_quantiles(accumulator, columns):
+    # Sketch each distinct value once with its count, the same way as the logs one by one
+    values, counts = np.unique(np.frombuffer(columns['bytes'], dtype=np.int64), return_counts=True)
+
+    for value, count in zip(values.tolist(), counts.tolist()):
+        accumulator.value.add(value, count)
+
+
+def _compute_duration_quantiles(accumulator, columns):
+    durations = np.frombuffer(columns['durations'], dtype=np.float64)
+    values, counts = np.unique(durations[~np.isnan(durations)], return_counts=True)
+
+    for value, count in zip(values.tolist(), counts.tolist()):
+        accumulator.value.add(value, count)
+
+
+def _compute_response_code_types(accumulator, columns):
+    hundreds = np.frombuffer(columns['statuses'], dtype=np.uint16) // 100
+    counts = np.bincount(np.minimum(hundreds, RESPONSE_CODE_TYPE_COUNT - 1), minlength=RESPONSE_CODE_TYPE_COUNT)
+
+    # Statuses under 100 have no response code type
+    accumulator.value = Counter({(i * 100 if i else None): int(count) for i, count in enumerate(counts) if count})
+
+
+def _compute_bytes(accumulator, columns):
+    accumulator.value = int(np.frombuffer(columns['bytes'], dtype=np.int64).sum())
+
+
+VECTORIZED_ACCUMULATORS = {
+    SECTION_HITS: _compute_section_hits,
+    REMOTE_HOST_HITS: _compute_remote_host_hits,
+    SECTION_COUNTS: _compute_section_counts,
+    REMOTE_HOST_COUNTS: _compute_remote_host_counts,
+    SECOND_HITS: _compute_second_hits,
+    SECOND_SERVER_ERRORS: _compute_second_server_errors,
+    AUTH_USER_HITS: _compute_auth_user_hits,
+    UNIQUE_REMOTE_HOSTS: _compute_unique_remote_hosts,
+    UNIQUE_RESOURCES: _compute_unique_resources,
+    RESPONSE_CODE_TYPES: _compute_response_code_types,
+    BYTES: _compute_bytes,
+    BYTES_QUANTILES: _compute_bytes_quantiles,
+    DURATION_QUANTILES: _compute_duration_quantiles
+}
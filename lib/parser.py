@@ -1,56 +1,202 @@
+import os
 import re
 import time
-from datetime import datetime
-from threading import Thread
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Thread, Lock
 
 from lib import app_config
-from lib.app_config import KEY_LOG_FILE_PATH
+from lib.app_config import KEY_PARSER_ENGINE, KEY_FOLLOWER_START, KEY_LOG_RETENTION_TIME_S
+from lib.follower import FileFollower, START_END, START_RETENTION, find_end_offset, find_date_offset
 from lib.log import Log
 
 LOG_REGEX = '(.*?) - (.*?) \[(.*?)] \"(.*) (\/.*) (HTTP.*)\" (.*) (.*)'
 
+# Anchored pattern where every field is delimited by a character it can not contain, so a field never backtracks into
+# the next one, and the optional suffix is only retried once without the referer and user agent: matching stays linear
+# in the length of the line. The status is the 3 digits of an HTTP status. The request duration is optional, as the
+# last field of the line right after the bytes (Common Log Format) or after the quoted referer and user agent (Combined
+# Log Format): an integer in microseconds (%D of Apache) or seconds with 3 decimals ($request_time of nginx). Lines
+# with other trailing fields have no duration
+FAST_LOG_REGEX = re.compile(r'([^ ]*) - ([^ ]*) \[([^\]]*)\] "([^ "]*) (/[^ "]*) (HTTP[^"]*)" (\d{3}) (\d+|-)'
+                            r'(?:(?: "[^"]*" "[^"]*")? (\d+\.\d{3}|\d+)$)?')
+
+LOG_DATE_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+LOG_DATE_LENGTH = len('09/May/2018:16:00:39 +0000')
+
+MONTHS = {month: i + 1 for i, month in enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                                   'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])}
+
+TIMESTAMP_CACHE_SIZE = 1024
+
+ENGINE_REGEX = 'regex'
+ENGINE_FAST = 'fast'
+
 
 class ParserThread(Thread):
+    """
+    Parse one log file. Several log files are parsed by as many threads appending to the same log queue, which merges
+    their logs by date while keeping the order of the logs of each file
+    """
+
+    def __init__(self, log_queue, file_path=None, parser_pool=None, start_position=None, source=None):
+        """
+        :param file_path: the path of the log file parsed, None if a subclass reads the lines from another source
+        :param start_position: position of the file saved by a checkpoint, to resume parsing from
+        :param source: the name of the source of the lines, in the metrics, the name of the file by default
+        """
+        source = source if source is not None else os.path.basename(file_path)
 
-    def __init__(self, log_queue):
-        super().__init__()
+        super().__init__(name='parser {}'.format(file_path if file_path is not None else source))
 
         self.daemon = True
-        self.file_path = app_config.get(KEY_LOG_FILE_PATH)
+        self.file_path = file_path
         self.log_queue = log_queue
+        self.follower = FileFollower(self.file_path, start_position=start_position,
+                                     find_start_offset=self._find_start_offset) if file_path is not None else None
+
+        # Position of the file after the last block of lines appended to the queue, updated with the lock held
+        self.position = start_position
+        self.block_lock = Lock()
+
+        self.line_parser = create_line_parser(app_config.get(KEY_PARSER_ENGINE))
+        self.metrics = ParserMetrics(source)
+        self.parser_pool = parser_pool  # If given, lines are parsed by its worker processes rather than by the thread
 
     def run(self):
         """
         Main method of the parsing thread which continuously read from the log file and append the newly parsed line
         info to the log log_queue
         """
-        new_lines = self._read_new_lines()
+        if self.parser_pool:
+            self._run_with_parser_pool()
+            return
+
+        for lines in self._read_new_blocks():
+            # A checkpoint waits for the whole block to be appended, so that the position saved matches the queue
+            with self.block_lock:
+                for line in lines:
+                    parsed_line = self._parse_log_line(line)
+
+                    if not parsed_line:
+                        self.metrics.ignored_count += 1
+                        continue
 
-        for line in new_lines:
-            parsed_line = self._parse_log_line(line)
+                    remote_host, auth_user, date, request_verb, resource, protocol, status, bytes, duration = \
+                        parsed_line
+                    log = Log(remote_host, auth_user, date, request_verb, resource, protocol, status, bytes, duration)
+                    self.log_queue.append(log)
 
-            if parsed_line:
-                remote_host, auth_user, date, request_verb, resource, protocol, status, bytes = parsed_line
-                log = Log(remote_host, auth_user, date, request_verb, resource, protocol, status, bytes)
-                self.log_queue.append(log)
+                    self.metrics.parsed_count += 1
 
-    def _read_new_lines(self):
+                self.position = self._get_read_position()
+
+    def get_position(self):
+        """
+        :return: the position of the file after the lines appended to the queue, to be read with the block lock held,
+        None if the lines are not read from a file
+        """
+        return self.position
+
+    def _get_read_position(self):
+        return self.follower.get_position() if self.follower is not None else None
+
+    def _run_with_parser_pool(self):
+        """
+        Hand the blocks of lines read to the worker processes of the parser pool, and merge their results in the queue
         """
-        A generator that never stops reading the file opened, continuously reading where it left of
+        positions = deque()  # Position after each block handed to the pool, whose batches are returned in order
 
-        :return: yields new line added to the log file
+        def read_blocks():
+            for lines in self._read_new_blocks():
+                if lines:
+                    positions.append(self._get_read_position())
+
+                yield lines
+
+        for batch in self.parser_pool.parse_blocks(read_blocks()):
+            with self.block_lock:
+                self.log_queue.append_batch(batch.get_rows(), batch.buckets)
+                self.position = positions.popleft()
+
+            self.metrics.parsed_count += len(batch)
+            self.metrics.ignored_count += batch.ignored_count
+
+    def _find_start_offset(self, fd, size):
+        """
+        :return: the offset the file is first read from, according to the follower start of the app config. Lines
+        older than the retention time would be expired as soon as parsed, so they can be skipped
         """
-        file = open(self.file_path, "r")
+        start = app_config.get(KEY_FOLLOWER_START)
 
-        while True:
-            line = file.readline()
+        if start == START_END:
+            return find_end_offset(fd, size)
 
-            if not line:
-                continue
+        if start == START_RETENTION:
+            start_date = datetime.utcnow() - timedelta(seconds=app_config.get(KEY_LOG_RETENTION_TIME_S))
+            return find_date_offset(fd, size, self._parse_log_date, start_date)
 
-            yield line
+        return 0
+
+    def _parse_log_date(self, line):
+        parsed_line = self._parse_log_line(line)
+
+        return parsed_line[2] if parsed_line else None
+
+    def _read_new_blocks(self):
+        """
+        A generator that never stops reading the file opened, continuously reading where it left of. The follower
+        sleeps while no new line is written and handles the rotation or truncation of the log file
+
+        :return: yields lists of the new lines added to the log file, empty when the end of the file is reached
+        """
+        return self.follower.follow_blocks()
 
     def _parse_log_line(self, line):
+        """
+        Parse the log line extracted with the parser engine selected in the app config
+
+        :param line: string representing the line extracted from the log file
+        :return: a tuple of elements extracted from the line
+        """
+        return self.line_parser.parse(line)
+
+
+class ParserMetrics:
+    """
+    Throughput of a parser, to check that every log file is kept up with
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.parsed_count = 0
+        self.ignored_count = 0
+
+        self.last_parsed_count = 0
+        self.last_time = time.monotonic()
+
+    def get_report(self):
+        """
+        :return: a message with the number of lines parsed and the rate since the last report
+        """
+        current_time = time.monotonic()
+        parsed_count = self.parsed_count
+
+        rate = (parsed_count - self.last_parsed_count) / max(current_time - self.last_time, 1e-6)
+
+        self.last_parsed_count = parsed_count
+        self.last_time = current_time
+
+        return 'Input {}: {:.1f} lines/s ({} parsed, {} ignored)'.format(self.name, rate, parsed_count,
+                                                                        self.ignored_count)
+
+
+class RegexLineParser:
+    """
+    The original parser, matching the permissive LOG_REGEX and decoding the date with strptime
+    """
+
+    def parse(self, line):
         """
         A simple method parsing the log line extracted using regex
 
@@ -65,8 +211,118 @@ class ParserThread(Thread):
         remote_host, auth_user, date, request_verb, resource, http_version, status, bytes =  match.groups()
 
         # We assume logs will always be UTC time
-        parsed_date = datetime.strptime(date, "%d/%b/%Y:%H:%M:%S %z").replace(tzinfo=None)
+        parsed_date = datetime.strptime(date, LOG_DATE_FORMAT).replace(tzinfo=None)
         parsed_status = int(status)
         parsed_bytes = int(bytes)
 
-        return remote_host, auth_user, parsed_date, request_verb, resource, http_version, parsed_status, parsed_bytes
\ No newline at end of file
+        # The request duration is not parsed by this engine
+        return remote_host, auth_user, parsed_date, request_verb, resource, http_version, parsed_status, parsed_bytes, \
+            None
+
+
+class FastLineParser:
+    """
+    A Common Log Format parser built for throughput: a precompiled non backtracking pattern, and a cached date decoder
+    """
+
+    def __init__(self):
+        self.timestamp_decoder = TimestampDecoder()
+
+    def parse(self, line):
+        """
+        Parse the log line, returning the same elements as the RegexLineParser along with the request duration if
+        the line ends with it. A '-' byte count is read as 0
+
+        :param line: string representing the line extracted from the log file
+        :return: a tuple of elements extracted from the line, None if the line is malformed
+        """
+        match = FAST_LOG_REGEX.match(line)
+
+        if not match:
+            return None
+
+        remote_host, auth_user, date, request_verb, resource, http_version, status, bytes, duration = match.groups()
+
+        parsed_date = self.timestamp_decoder.decode(date)
+
+        if parsed_date is None:
+            return None
+
+        parsed_bytes = int(bytes) if bytes != '-' else 0
+
+        return remote_host, auth_user, parsed_date, request_verb, resource, http_version, int(status), parsed_bytes, \
+            parse_duration(duration)
+
+
+class TimestampDecoder:
+    """
+    Decode log dates, remembering the datetime of the last distinct date strings seen, as consecutive lines mostly
+    share the same second
+    """
+
+    def __init__(self, cache_size=TIMESTAMP_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def decode(self, date):
+        """
+        :param date: a date formatted as '09/May/2018:16:00:39 +0000'
+        :return: the naive datetime of the date (we assume logs will always be UTC time), None if it is malformed
+        """
+        parsed_date = self.cache.get(date)
+
+        if parsed_date is not None:
+            return parsed_date
+
+        parsed_date = self._decode_uncached(date)
+
+        if parsed_date is None:
+            return None
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+
+        self.cache[date] = parsed_date
+
+        return parsed_date
+
+    @staticmethod
+    def _decode_uncached(date):
+        # Slicing the fixed width fields is much faster than strptime
+        month = MONTHS.get(date[3:6])
+
+        if len(date) == LOG_DATE_LENGTH and month:
+            try:
+                return datetime(int(date[7:11]), month, int(date[0:2]), int(date[12:14]), int(date[15:17]),
+                                int(date[18:20]))
+            except ValueError:
+                return None
+
+        try:
+            return datetime.strptime(date, LOG_DATE_FORMAT).replace(tzinfo=None)
+        except ValueError:
+            return None
+
+
+def parse_duration(duration):
+    """
+    :param duration: the request duration field of a log line, None if the line has none
+    :return: the duration in seconds, None if it is not given
+    """
+    if duration is None:
+        return None
+
+    if '.' in duration:
+        return float(duration)
+
+    return int(duration) / 1000000
+
+
+LINE_PARSERS = {
+    ENGINE_REGEX: RegexLineParser,
+    ENGINE_FAST: FastLineParser
+}
+
+
+def create_line_parser(engine):
+    return LINE_PARSERS[engine]()
@@ -1,9 +1,24 @@
 import argparse
+import glob
+import json
 import sys
 import os
+from datetime import datetime
 
 from lib import app_config
-from lib.app_config import KEY_LOG_RETENTION_TIME_S, KEY_REQUEST_FREQUENCY_PER_S, KEY_REFRESH_TIME_S, KEY_LOG_FILE_PATH
+from lib.app_config import KEY_LOG_RETENTION_TIME_S, KEY_REQUEST_FREQUENCY_PER_S, KEY_REFRESH_TIME_S, \
+    KEY_LOG_FILE_PATHS, KEY_PARSER_ENGINE, KEY_LOG_STORE, KEY_PARSER_WORKERS, KEY_MAX_RETAINED_LOGS, \
+    KEY_MAX_MEMORY_MB, KEY_OVERLOAD_POLICY, KEY_REPLAY, KEY_QUIET, KEY_TOP_K_CAPACITY, KEY_ALERT_RULES, \
+    KEY_ALERT_EVALUATION_TIME_S, KEY_ALERT_HYSTERESIS_S, KEY_HISTORY_PATH, KEY_HISTORY_QUERY, \
+    KEY_CHECKPOINT_PATH, KEY_CHECKPOINT_TIME_S, KEY_FOLLOWER_START, KEY_INGESTION_HOST, KEY_INGESTION_UDP_PORT, \
+    KEY_INGESTION_TCP_PORT
+from lib.alerts import create_rule
+from lib.archives import is_compressed
+from lib.follower import STARTS
+from lib.log_queue import LOG_QUEUES, POLICY_DROP, POLICY_SAMPLE
+from lib.parser import LINE_PARSERS
+
+QUERY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 def parse_config():
@@ -17,7 +32,34 @@ def parse_config():
     parser.add_argument("-u", "--update", help="update frequency (in s)", type=int)
     parser.add_argument("-r", "--retention", help="time interval to analyse for alerts (in s)", type=int)
     parser.add_argument("-f", "--frequency", help="threshold of requests/s", type=int)
-    parser.add_argument("-p", "--path", help="file path to the log file")
+    parser.add_argument("-p", "--path", help="file paths or glob patterns of the log files", nargs='+')
+    parser.add_argument("-e", "--engine", help="log line parser engine", choices=sorted(LINE_PARSERS))
+    parser.add_argument("-s", "--store", help="storage of the retained logs", choices=sorted(LOG_QUEUES))
+    parser.add_argument("-w", "--workers", help="number of parser worker processes (0 to parse in threads)", type=int)
+    parser.add_argument("--max-logs", help="maximum number of logs retained", type=int)
+    parser.add_argument("--max-memory", help="maximum memory used by the logs retained (in MB)", type=int)
+    parser.add_argument("--overload", help="policy once the logs retained reach their maximum",
+                        choices=[POLICY_DROP, POLICY_SAMPLE])
+    parser.add_argument("--replay", help="replay the log files from their beginning as fast as possible, without UI",
+                        action='store_true')
+    parser.add_argument("-q", "--quiet", help="only output the alerts when replaying", action='store_true')
+    parser.add_argument("--top-capacity", help="number of sections, hosts and users counted to find the most hit ones",
+                        type=int)
+    parser.add_argument("--rules", help="JSON file of the list of alert rules")
+    parser.add_argument("--alert-interval", help="time between the evaluations of the alerts (in s)", type=float)
+    parser.add_argument("--hysteresis", help="time during which an alert must not be detected to recover (in s)",
+                        type=int)
+    parser.add_argument("--history", help="SQLite file storing the aggregates of each second once expired")
+    parser.add_argument("--query", help="print the traffic stored in the history between 2 UTC dates "
+                                        "('YYYY-MM-DD HH:MM:SS'), without UI", nargs=2, metavar=('START', 'END'))
+    parser.add_argument("--checkpoint", help="file periodically saving the file positions, retained aggregates and "
+                                             "alerts, to resume from on restart")
+    parser.add_argument("--checkpoint-interval", help="time between 2 checkpoints (in s)", type=int)
+    parser.add_argument("--start", help="where the log files are first read from: their beginning, their end or the "
+                                        "first line of the retention time", choices=STARTS)
+    parser.add_argument("--udp", help="UDP port receiving syslog messages of log lines", type=int)
+    parser.add_argument("--tcp", help="TCP port receiving newline delimited log lines", type=int)
+    parser.add_argument("--listen", help="address the UDP and TCP ports listen on")
 
     args = parser.parse_args()
 
@@ -34,20 +76,160 @@ def parse_config():
         print('Argument frequency "-f" or "--frequency" must be a positive integer')
         sys.exit()
 
-    # Check that the file to parse actually exists
-    if args.path and not os.path.exists(args.path):
-        print('Argument path "-p" or "--path" must be an existing file')
+    if args.workers and args.workers < 0:
+        print('Argument workers "-w" or "--workers" must be a positive integer')
+        sys.exit()
+
+    if args.max_logs is not None and args.max_logs <= 0:
+        print('Argument "--max-logs" must be a positive integer')
+        sys.exit()
+
+    if args.max_memory is not None and args.max_memory <= 0:
+        print('Argument "--max-memory" must be a positive integer')
+        sys.exit()
+
+    if args.top_capacity is not None and args.top_capacity <= 0:
+        print('Argument "--top-capacity" must be a positive integer')
         sys.exit()
 
-    default_path = app_config.get(KEY_LOG_FILE_PATH)
+    if args.alert_interval is not None and args.alert_interval <= 0:
+        print('Argument "--alert-interval" must be a positive number')
+        sys.exit()
+
+    if args.hysteresis is not None and args.hysteresis < 0:
+        print('Argument "--hysteresis" must be a positive integer')
+        sys.exit()
+
+    if args.checkpoint_interval is not None and args.checkpoint_interval <= 0:
+        print('Argument "--checkpoint-interval" must be a positive integer')
+        sys.exit()
+
+    for port_argument, port in (('--udp', args.udp), ('--tcp', args.tcp)):
+        if port is not None and not 0 < port < 65536:
+            print('Argument "{}" must be a port number'.format(port_argument))
+            sys.exit()
+
+    if args.replay and (args.udp or args.tcp):
+        print('Arguments "--udp" and "--tcp" can not be used with "--replay"')
+        sys.exit()
+
+    rules = _load_rules(args.rules) if args.rules else None
+
+    if args.query and not args.history:
+        print('Argument "--query" requires the "--history" file to query')
+        sys.exit()
+
+    query = _parse_query(args.query) if args.query else None
+
+    if query:
+        # The history is queried without following any log file
+        return {KEY_HISTORY_PATH: args.history, KEY_HISTORY_QUERY: query}
+
+    # Check that the files to parse actually exist
+    paths = _expand_paths(args.path) if args.path else None
+
+    if args.path and not paths:
+        print('Argument path "-p" or "--path" must match existing files')
+        sys.exit()
+
+    if paths and not args.replay and any(is_compressed(path) for path in paths):
+        print('Compressed log files can only be replayed with "--replay"')
+        sys.exit()
+
+    # The logs may only be received over the network
+    if not args.path and (args.udp or args.tcp):
+        paths = []
+
+    default_paths = app_config.get(KEY_LOG_FILE_PATHS)
 
-    if not args.path and not os.path.exists(default_path):
-        print('Could no find log file at location: {}'.format(default_path))
+    if paths is None and not all(os.path.exists(default_path) for default_path in default_paths):
+        print('Could no find log file at location: {}'.format(', '.join(default_paths)))
         sys.exit()
 
     return {
         KEY_LOG_RETENTION_TIME_S: args.retention,
         KEY_REQUEST_FREQUENCY_PER_S: args.frequency,
         KEY_REFRESH_TIME_S: args.update,
-        KEY_LOG_FILE_PATH: args.path,
-    }
\ No newline at end of file
+        KEY_LOG_FILE_PATHS: paths,
+        KEY_PARSER_ENGINE: args.engine,
+        KEY_LOG_STORE: args.store,
+        KEY_PARSER_WORKERS: args.workers,
+        KEY_MAX_RETAINED_LOGS: args.max_logs,
+        KEY_MAX_MEMORY_MB: args.max_memory,
+        KEY_OVERLOAD_POLICY: args.overload,
+        KEY_REPLAY: args.replay,
+        KEY_QUIET: args.quiet,
+        KEY_TOP_K_CAPACITY: args.top_capacity,
+        KEY_ALERT_RULES: rules,
+        KEY_ALERT_EVALUATION_TIME_S: args.alert_interval,
+        KEY_ALERT_HYSTERESIS_S: args.hysteresis,
+        KEY_HISTORY_PATH: args.history,
+        KEY_CHECKPOINT_PATH: args.checkpoint,
+        KEY_CHECKPOINT_TIME_S: args.checkpoint_interval,
+        KEY_FOLLOWER_START: args.start,
+        KEY_INGESTION_HOST: args.listen,
+        KEY_INGESTION_UDP_PORT: args.udp,
+        KEY_INGESTION_TCP_PORT: args.tcp,
+    }
+
+
+def _expand_paths(patterns):
+    """
+    Expand the glob patterns given (patterns quoted in the shell are not expanded by it)
+
+    :param patterns: list of file paths or glob patterns
+    :return: the sorted list of the distinct existing files matched, or None if a pattern matches no file
+    """
+    paths = set()
+
+    for pattern in patterns:
+        matched_paths = [path for path in glob.glob(pattern) if os.path.isfile(path)]
+
+        if not matched_paths:
+            return None
+
+        paths.update(matched_paths)
+
+    return sorted(paths)
+
+
+def _parse_query(dates):
+    """
+    :param dates: the start and end dates of the query, as strings
+    :return: a tuple of the start and end datetimes, exiting if they are not valid
+    """
+    try:
+        start, end = [datetime.strptime(date, QUERY_DATE_FORMAT) for date in dates]
+    except ValueError:
+        print('Argument "--query" must be 2 dates formatted as "YYYY-MM-DD HH:MM:SS"')
+        sys.exit()
+
+    if start >= end:
+        print('Argument "--query" must be a start date before an end date')
+        sys.exit()
+
+    return start, end
+
+
+def _load_rules(file_path):
+    """
+    Load the alert rules of a JSON file, exiting if they are not valid
+
+    :param file_path: path of a JSON file of a list of rules, like [{"type": "section_traffic", "threshold": 50}]
+    :return: the list of rule configs
+    """
+    try:
+        with open(file_path) as file:
+            rules = json.load(file)
+
+        if not isinstance(rules, list):
+            raise ValueError('The alert rules must be a list')
+
+        for rule in rules:
+            create_rule(rule)
+
+    except (OSError, ValueError) as error:
+        print('Argument "--rules" must be a JSON file of valid alert rules: {}'.format(error))
+        sys.exit()
+
+    return rules
@@ -0,0 +1,155 @@
+import collections
+import math
+import multiprocessing
+from array import array
+
+from lib import app_config
+from lib.aggregates import Bucket
+from lib.app_config import KEY_TOP_K_CAPACITY, KEY_ALERT_RULES
+from lib.log import Log
+from lib.log_queue import StringInterner, to_timestamp, from_timestamp, encode_status, encode_duration, \
+    decode_duration
+from lib.parser import create_line_parser
+
+# Number of blocks sent to each worker process that can wait for their result, bounding the memory used when the
+# workers do not keep up
+PENDING_BLOCKS_PER_WORKER = 2
+
+# The entries of the app config the buckets of the worker processes depend on: the accumulators they hold and their
+# capacities. They are sent to the workers when they start, as a worker process does not inherit the app config of the
+# main process unless it is forked
+WORKER_CONFIG_KEYS = [KEY_TOP_K_CAPACITY, KEY_ALERT_RULES]
+
+_worker_line_parser = None  # The line parser of a worker process, created once when the process starts
+
+
+class ParserPool:
+    """
+    A pool of worker processes parsing blocks of lines, so parsing is not limited to the single core the GIL gives to
+    all our threads. Workers send back each block as a compact LogBatch with its logs already aggregated per second, so
+    the main process only has to merge them into the log queue.
+    """
+
+    def __init__(self, worker_count, engine):
+        self.worker_count = worker_count
+        self.pool = multiprocessing.Pool(worker_count, initializer=_init_worker,
+                                         initargs=(engine, get_worker_config()))
+
+    def parse_blocks(self, blocks):
+        """
+        Parse the blocks of lines in the worker processes, keeping their order
+
+        :param blocks: iterable of lists of lines, an empty list meaning no more lines are available for now
+        :return: yields a LogBatch per block parsed
+        """
+        pending_results = collections.deque()
+
+        for lines in blocks:
+            if lines:
+                pending_results.append(self.pool.apply_async(_parse_block, ('\n'.join(lines),)))
+
+                if len(pending_results) < self.worker_count * PENDING_BLOCKS_PER_WORKER:
+                    continue
+
+                yield pending_results.popleft().get()
+                continue
+
+            # No more lines for now, do not keep the blocks already read waiting
+            while pending_results:
+                yield pending_results.popleft().get()
+
+        while pending_results:
+            yield pending_results.popleft().get()
+
+    def close(self):
+        self.pool.terminate()
+
+
+class LogBatch:
+    """
+    The logs parsed from a block of lines, stored by column to be cheap to send between processes, along with their
+    per second aggregates
+    """
+
+    def __init__(self):
+        self.dates = array('d')
+        self.statuses = array('H')
+        self.bytes = array('q')
+        self.durations = array('d')
+        self.string_columns = [(array('I'), StringInterner()) for _ in range(5)]
+
+        self.buckets = {}
+        self.ignored_count = 0
+
+    def add(self, log):
+        timestamp = to_timestamp(log.date)
+        second = math.floor(timestamp)
+
+        bucket = self.buckets.get(second)
+
+        if bucket is None:
+            bucket = self.buckets[second] = Bucket()
+
+        bucket.add(log)
+
+        self.dates.append(timestamp)
+        self.statuses.append(encode_status(log.status))
+        self.bytes.append(log.bytes)
+        self.durations.append(encode_duration(log.duration))
+
+        for (codes, interner), string in zip(self.string_columns, (log.remote_host, log.auth_user, log.request_verb,
+                                                                   log.resource, log.protocol)):
+            codes.append(interner.intern(string))
+
+    def get_rows(self):
+        """
+        :return: yields a tuple (timestamp in epoch seconds, Log) per log of the batch
+        """
+        string_columns = [[interner.get(code) for code in codes] for codes, interner in self.string_columns]
+
+        timestamp = date = None
+
+        for i, (remote_host, auth_user, request_verb, resource, protocol) in enumerate(zip(*string_columns)):
+            if self.dates[i] != timestamp:
+                timestamp = self.dates[i]
+                date = from_timestamp(timestamp)  # Consecutive logs mostly share the same date
+
+            yield timestamp, Log(remote_host, auth_user, date, request_verb, resource, protocol, self.statuses[i],
+                                 self.bytes[i], decode_duration(self.durations[i]))
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def get_worker_config():
+    """
+    :return: the entries of WORKER_CONFIG_KEYS of the app config, to apply to a worker process with app_config.update
+    """
+    return {key: app_config.get(key) for key in WORKER_CONFIG_KEYS}
+
+
+def _init_worker(engine, config):
+    global _worker_line_parser
+    app_config.update(config)
+    _worker_line_parser = create_line_parser(engine)
+
+
+def _parse_block(text):
+    """
+    Task of the worker processes, parsing a block of lines
+
+    :param text: the lines of the block joined by line ends
+    :return: a LogBatch of the logs parsed
+    """
+    batch = LogBatch()
+
+    for line in text.split('\n'):
+        parsed_line = _worker_line_parser.parse(line)
+
+        if not parsed_line:
+            batch.ignored_count += 1
+            continue
+
+        batch.add(Log(*parsed_line))
+
+    return batch
@@ -0,0 +1,138 @@
+import heapq
+import sys
+import time
+from datetime import timedelta
+
+from lib import app_config
+from lib.app_config import KEY_REFRESH_TIME_S, KEY_LOG_RETENTION_TIME_S, KEY_PARSER_ENGINE, KEY_REORDER_WINDOW_S
+from lib.archives import is_compressed, read_blocks_in_background, group_rotated_files, merge_rotated
+from lib.log import Log
+from lib.log_queue import from_timestamp
+from lib.monitor import Monitor
+from lib.parser import create_line_parser
+from lib.scanner import Scanner
+
+
+class Replayer:
+    """
+    Replay historical log files from their beginning, as fast as possible and without UI. The clock is simulated from
+    the dates of the logs: a Monitor pass runs each time the logs read go past the end of a refresh interval, and the
+    stats and the alert transitions of each pass are written to the output.
+    With worker processes, uncompressed files are scanned in parallel into per second aggregates, which are replayed
+    instead of the logs themselves. Otherwise, files are read and decompressed by a separate thread while their lines
+    are parsed.
+    """
+
+    def __init__(self, log_queue, console_model, file_paths, output=sys.stdout, quiet=False, worker_count=0):
+        self.log_queue = log_queue
+        self.console_model = console_model
+        self.file_paths = file_paths
+        self.output = output
+        self.quiet = quiet  # Only write the alert transitions, not the stats
+        self.worker_count = worker_count
+
+        self.refresh_time = timedelta(seconds=app_config.get(KEY_REFRESH_TIME_S))
+        self.retention_time = timedelta(seconds=app_config.get(KEY_LOG_RETENTION_TIME_S))
+
+        # Wait for the logs to be this late after the end of an interval before closing it, as the logs can be
+        # slightly out of order
+        self.reorder_window = timedelta(seconds=app_config.get(KEY_REORDER_WINDOW_S))
+
+        self.log_count = 0
+
+        self.start_interval = None
+        self.end_interval = None
+
+    def run(self):
+        """
+        :return: the time the replay took, in seconds
+        """
+        start_time = time.perf_counter()
+
+        # Compressed files can not be memory mapped, and the scanned aggregates replace the logs so they can only be
+        # replayed into a queue aggregating them on append
+        scannable = self.log_queue.AGGREGATE_ON_APPEND and not any(is_compressed(path) for path in self.file_paths)
+
+        if self.worker_count and scannable:
+            self._replay_scanned_buckets()
+        else:
+            self._replay_logs()
+
+        if self.end_interval is not None:
+            self._run_monitor(self.start_interval, self.end_interval)
+
+            # Nothing is received after the replay, the seconds still retained are final
+            if self.log_queue.history is not None:
+                self.log_queue.flush_expired(self.end_interval + self.reorder_window)
+
+        return time.perf_counter() - start_time
+
+    def _replay_logs(self):
+        for log in self._read_logs():
+            self._advance_clock(log.date)
+
+            self.log_queue.append(log)
+            self.log_count += 1
+
+    def _replay_scanned_buckets(self):
+        scanner = Scanner(self.worker_count, app_config.get(KEY_PARSER_ENGINE))
+
+        try:
+            # The buckets of the files are merged by second as they are scanned, instead of being all kept until the
+            # end of the scan
+            for second, bucket in heapq.merge(*[scanner.scan(file_path) for file_path in self.file_paths],
+                                              key=lambda item: item[0]):
+                self._advance_clock(from_timestamp(second))
+
+                self.log_queue.append_batch((), {second: bucket})
+                self.log_count += bucket.hits
+        finally:
+            scanner.close()
+
+    def _advance_clock(self, date):
+        """
+        Run the Monitor passes of all the intervals ending before the given date
+        """
+        if self.end_interval is None:
+            self.start_interval = date
+            self.end_interval = date + self.refresh_time
+
+        while date >= self.end_interval + self.reorder_window:
+            self._run_monitor(self.start_interval, self.end_interval)
+            self.start_interval, self.end_interval = self.end_interval, self.end_interval + self.refresh_time
+
+    def _run_monitor(self, start_interval, end_interval):
+        alert_history_count = len(self.console_model.get_alert_history_messages())
+
+        Monitor(self.log_queue, self.console_model, end_interval, start_interval, end_interval,
+                end_interval - self.retention_time).run()
+
+        if not self.quiet:
+            stats = ' | '.join(str(stat) for stat in self.console_model.get_stats_messages())
+            self.output.write('{} {}\n'.format(self.console_model.get_last_updated_message(), stats))
+
+        # The history has the most recent alerts first
+        new_alert_count = len(self.console_model.get_alert_history_messages()) - alert_history_count
+
+        for alert in reversed(self.console_model.get_alert_history_messages()[:new_alert_count]):
+            self.output.write('{} {}\n'.format('RECOVERED' if alert.recovered else 'ALERT', alert))
+
+    def _read_logs(self):
+        """
+        :return: yields the logs of all the files, merged by date. The rotated files of a log are read one after the
+        other, from the oldest one
+        """
+        return heapq.merge(*[merge_rotated([self._read_file_logs(file_path) for file_path in file_paths],
+                                           key=lambda log: log.date)
+                             for file_paths in group_rotated_files(self.file_paths)],
+                           key=lambda log: log.date)
+
+    def _read_file_logs(self, file_path):
+        line_parser = create_line_parser(app_config.get(KEY_PARSER_ENGINE))
+
+        for lines in read_blocks_in_background(file_path):
+            for line in lines:
+                parsed_line = line_parser.parse(line)
+
+                if parsed_line:
+                    yield Log(*parsed_line)
@@ -0,0 +1,147 @@
+import collections
+import math
+import mmap
+import multiprocessing
+import os
+import re
+
+from lib import app_config
+from lib.aggregates import Bucket
+from lib.log import Log
+from lib.log_queue import to_timestamp
+from lib.parser import LOG_REGEX, FAST_LOG_REGEX, ENGINE_REGEX, ENGINE_FAST, TimestampDecoder, parse_duration
+from lib.parser_pool import get_worker_config
+
+# Each worker process gets several chunks, so a chunk slower to parse than the others does not leave workers idle
+CHUNKS_PER_WORKER = 4
+
+# Large files are split into more chunks, so the per second buckets of a chunk stay small
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Number of chunks sent to each worker process that can wait for their result, bounding the memory used by the buckets
+# scanned ahead of the replay
+PENDING_CHUNKS_PER_WORKER = 2
+
+# The line patterns of the parser engines, anchored on every line start so they can scan a whole chunk at once. The
+# negated character classes of the fast pattern also exclude line ends, so a malformed line is not joined to the next
+# one, as '.' already does for the regex pattern
+SCAN_PATTERNS = {
+    ENGINE_REGEX: '^' + LOG_REGEX,
+    ENGINE_FAST: '^' + FAST_LOG_REGEX.pattern.replace('[^', r'[^\n')
+}
+
+
+class Scanner:
+    """
+    Aggregate per second all the logs of files, parsing them in parallel: a file is memory mapped and split into chunks
+    ending on line ends, and each chunk is parsed by a worker process matching the line pattern directly on the mapped
+    memory. The buckets of the chunks are streamed in file order, so only the chunks being scanned are held in memory
+    rather than the whole file.
+    """
+
+    def __init__(self, worker_count, engine):
+        self.worker_count = worker_count
+        self.engine = engine
+        self.pool = multiprocessing.Pool(worker_count, initializer=app_config.update,
+                                         initargs=(get_worker_config(),))
+
+    def scan(self, file_path, chunk_count=None):
+        """
+        :param file_path: path of an uncompressed log file
+        :param chunk_count: number of chunks to split the file into, by default CHUNKS_PER_WORKER per worker, or more
+        for the chunks to be at most MAX_CHUNK_SIZE
+        :return: yields a tuple (epoch second, Bucket of the logs of that second) per second of each chunk, the chunks
+        in file order and the seconds of a chunk in order. A second at the boundary of two chunks is yielded by both
+        """
+        if chunk_count is None:
+            chunk_count = max(self.worker_count * CHUNKS_PER_WORKER,
+                              math.ceil(os.path.getsize(file_path) / MAX_CHUNK_SIZE))
+
+        pending_results = collections.deque()
+
+        for start, end in split_chunks(file_path, chunk_count):
+            pending_results.append(self.pool.apply_async(_scan_chunk, ((file_path, start, end, self.engine),)))
+
+            if len(pending_results) >= self.worker_count * PENDING_CHUNKS_PER_WORKER:
+                yield from sorted(pending_results.popleft().get().items())
+
+        while pending_results:
+            yield from sorted(pending_results.popleft().get().items())
+
+    def close(self):
+        self.pool.terminate()
+
+
+def split_chunks(file_path, chunk_count):
+    """
+    :return: a list of (start offset, end offset) of chunks of the file of about the same size, each ending on a line
+    end
+    """
+    size = os.path.getsize(file_path)
+
+    if not size:
+        return []
+
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+        boundaries = [0]
+
+        for i in range(1, chunk_count):
+            line_end = mapped_file.find(b'\n', max(size * i // chunk_count, boundaries[-1]))
+
+            if line_end < 0:
+                break
+
+            boundaries.append(line_end + 1)
+
+        boundaries.append(size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def _scan_chunk(task):
+    """
+    Task of the worker processes, aggregating per second the logs of a chunk of the file
+
+    :param task: tuple (file path, start offset, end offset, parser engine)
+    :return: dictionary of epoch second to Bucket
+    """
+    file_path, start, end, engine = task
+
+    pattern = re.compile(SCAN_PATTERNS[engine].encode(), re.MULTILINE)
+    timestamp_decoder = TimestampDecoder()
+
+    buckets = {}
+
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+        # The pattern is matched on the mapped memory itself, only the matched fields are copied
+        for match in pattern.finditer(mapped_file, start, end):
+            fields = match.groups()
+
+            remote_host, auth_user, date, request_verb, resource, protocol, status, bytes = [
+                field.decode('utf-8', 'replace') for field in fields[:8]]
+
+            # Only the pattern of the fast engine has the optional request duration
+            duration = fields[8].decode() if len(fields) > 8 and fields[8] is not None else None
+
+            parsed_date = timestamp_decoder.decode(date)
+
+            try:
+                parsed_status = int(status)
+                parsed_bytes = int(bytes) if bytes != '-' else 0
+                parsed_duration = parse_duration(duration)
+            except ValueError:
+                continue
+
+            if parsed_date is None:
+                continue
+
+            second = math.floor(to_timestamp(parsed_date))
+            bucket = buckets.get(second)
+
+            if bucket is None:
+                bucket = buckets[second] = Bucket()
+
+            bucket.add(Log(remote_host, auth_user, parsed_date, request_verb, resource, protocol, parsed_status,
+                           parsed_bytes, parsed_duration))
+
+    return buckets
@@ -0,0 +1,307 @@
+import hashlib
+import heapq
+import math
+from operator import itemgetter
+
+HLL_PRECISION = 12  # 2^12 registers
+
+# Registers of a HyperLogLog are kept in a dictionary until this share of them is set, as it is then no smaller
+HLL_SPARSE_RATIO = 16
+
+# Quantiles of a DDSketch are within 1% of the actual values, for at most 2048 bins
+DDSKETCH_RELATIVE_ACCURACY = 0.01
+DDSKETCH_MAX_BINS = 2048
+
+# Hashes of the last distinct keys seen, as the same hosts and resources come back again and again
+HASH_CACHE_SIZE = 10000
+
+_hash_cache = {}
+
+
+class SpaceSaving:
+    """
+    Heavy hitters of a stream of keys in bounded memory, with the Space-Saving algorithm: at most `capacity` keys are
+    monitored, and a new key arriving once the sketch is full replaces the key with the smallest count, inheriting its
+    count. Counts are never underestimated, and are overestimated by at most the total count divided by the capacity.
+    Sketches are mergeable, so the sketches of several seconds are merged into the sketch of an interval.
+    Keys with the same count are kept in the order they were first seen, like in a Counter.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.keys_by_count = {}  # The keys monitored per count, as ordered sets, to find a key to replace in O(1)
+        self.min_count = 0
+
+    def add(self, key):
+        count = self.counts.get(key)
+
+        if count is not None:
+            self._unlink(key, count)
+        elif len(self.counts) < self.capacity:
+            count = 0
+            self.min_count = 0  # Updated to 1 below, the count of the new key
+        else:
+            count = self.min_count
+            replaced_key = next(iter(self.keys_by_count[count]))
+
+            self._unlink(replaced_key, count)
+            del self.counts[replaced_key]
+
+        self.counts[key] = count + 1
+        self._link(key, count + 1)
+
+        if count == self.min_count and count not in self.keys_by_count:
+            self.min_count = count + 1
+
+    def add_counts(self, counts):
+        """
+        :param counts: dictionary of key to its exact count, to add to the sketch
+        """
+        self._merge_counts(counts, 0)
+
+    def merge(self, sketch):
+        """
+        Merge another sketch into this one. A key only monitored by one of the sketches may have been replaced in the
+        other one, so it gets the smallest count of the other sketch if that one is full, keeping the error bound
+        """
+        self._merge_counts(sketch.counts, sketch.get_max_error())
+
+    def most_common(self, n=None):
+        """
+        :param n: number of keys to return, all the keys monitored if None
+        :return: a list of tuples (key, count) of the keys with the highest counts, from the highest
+        """
+        if n is None:
+            return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def get_max_error(self):
+        """
+        :return: the maximum overestimation of the counts, 0 as long as the sketch is not full
+        """
+        return self.min_count if len(self.counts) >= self.capacity else 0
+
+    def copy(self):
+        sketch = SpaceSaving(self.capacity)
+        sketch.merge(self)
+        return sketch
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _link(self, key, count):
+        keys = self.keys_by_count.get(count)
+
+        if keys is None:
+            keys = self.keys_by_count[count] = {}
+
+        keys[key] = None
+
+    def _unlink(self, key, count):
+        keys = self.keys_by_count[count]
+        del keys[key]
+
+        if not keys:
+            del self.keys_by_count[count]
+
+    def _merge_counts(self, other_counts, other_max_error):
+        own_max_error = self.get_max_error()
+
+        counts = {}
+
+        for key, count in self.counts.items():
+            counts[key] = count + other_counts.get(key, other_max_error)
+
+        for key, count in other_counts.items():
+            if key not in counts:
+                counts[key] = count + own_max_error
+
+        if len(counts) > self.capacity:
+            kept_keys = set(key for key, _ in heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1)))
+            counts = {key: count for key, count in counts.items() if key in kept_keys}
+
+        self.counts = counts
+        self._rebuild()
+
+    def _rebuild(self):
+        self.keys_by_count = {}
+
+        for key, count in self.counts.items():
+            self._link(key, count)
+
+        self.min_count = min(self.counts.values()) if self.counts else 0
+
+
+class HyperLogLog:
+    """
+    Approximate number of distinct keys in a constant memory, with the HyperLogLog algorithm: each key is hashed to one
+    of 2^precision registers, which keeps the longest run of leading zeros seen in the hashes. With the default
+    precision the standard error is 1.04 / sqrt(4096), about 1.6%, for 4 KB per sketch.
+    Registers are kept in a dictionary while few of them are set, as the sketch of a single second mostly sees a few
+    keys. Sketches are merged by keeping the maximum of each register.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.sparse_registers = {}  # Register index to its value, until more than a few registers are set
+        self.registers = None
+
+    def add(self, key):
+        self._set_register(*_hash_key(key, self.precision))
+
+    def merge(self, sketch):
+        if sketch.registers is None:
+            for index, rank in sketch.sparse_registers.items():
+                self._set_register(index, rank)
+            return
+
+        if self.registers is None:
+            self._densify()
+
+        self.registers = bytearray(map(max, self.registers, sketch.registers))
+
+    def count(self):
+        """
+        :return: the estimated number of distinct keys added
+        """
+        if self.registers is None:
+            ranks = self.sparse_registers.values()
+            zero_count = self.register_count - len(self.sparse_registers)
+        else:
+            ranks = self.registers
+            zero_count = self.registers.count(0)
+
+        # Unset registers count for 2^0 in the harmonic mean
+        harmonic_sum = zero_count + sum(2.0 ** -rank for rank in ranks if rank)
+
+        alpha = 0.7213 / (1 + 1.079 / self.register_count)
+        estimate = alpha * self.register_count ** 2 / harmonic_sum
+
+        # Linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * self.register_count and zero_count:
+            estimate = self.register_count * math.log(self.register_count / zero_count)
+
+        return round(estimate)
+
+    def _set_register(self, index, rank):
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+            return
+
+        if rank > self.sparse_registers.get(index, 0):
+            self.sparse_registers[index] = rank
+
+            if len(self.sparse_registers) > self.register_count // HLL_SPARSE_RATIO:
+                self._densify()
+
+    def _densify(self):
+        self.registers = bytearray(self.register_count)
+
+        for index, rank in self.sparse_registers.items():
+            self.registers[index] = rank
+
+        self.sparse_registers = {}
+
+
+def _hash_key(key, precision):
+    """
+    :return: a tuple (register index, rank) of the key: the first bits of its 64 bits hash give the index, and the rank
+    is the position of the first 1 bit in the remaining bits
+    """
+    hashed_key = _hash_cache.get(key)
+
+    if hashed_key is None:
+        if len(_hash_cache) >= HASH_CACHE_SIZE:
+            _hash_cache.clear()
+
+        # A stable hash, unlike hash() which is salted per process, as sketches are merged across processes
+        hashed_key = _hash_cache[key] = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    remaining_bit_count = 64 - precision
+    remaining_bits = hashed_key & ((1 << remaining_bit_count) - 1)
+
+    return hashed_key >> remaining_bit_count, remaining_bit_count - remaining_bits.bit_length() + 1
+
+
+class DDSketch:
+    """
+    Approximate quantiles of positive values in a bounded memory, with the DDSketch algorithm: values are counted in
+    bins whose width grows exponentially, so that any quantile is returned with a relative error of at most
+    `relative_accuracy`. Sketches are merged and subtracted by adding and subtracting the counts of their bins.
+    The number of bins only grows with the logarithm of the range of the values, if it still exceeds DDSKETCH_MAX_BINS
+    the lowest bins are collapsed together, keeping the high quantiles accurate.
+    """
+
+    def __init__(self, relative_accuracy=DDSKETCH_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.multiplier = 1 / math.log(self.gamma)
+        self.bins = {}  # Index of the bin to the count of the values in ]gamma^(index - 1), gamma^index]
+        self.zero_count = 0  # Count of the values too small to be binned, like empty responses
+        self.count = 0
+
+    def add(self, value, count=1):
+        self.count += count
+
+        if value <= 0:
+            self.zero_count += count
+            return
+
+        index = math.ceil(math.log(value) * self.multiplier)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+        if len(self.bins) > DDSKETCH_MAX_BINS:
+            self._collapse()
+
+    def merge(self, sketch):
+        for index, count in sketch.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+        self.zero_count += sketch.zero_count
+        self.count += sketch.count
+
+        if len(self.bins) > DDSKETCH_MAX_BINS:
+            self._collapse()
+
+    def subtract(self, sketch):
+        for index, count in sketch.bins.items():
+            remaining_count = self.bins.get(index, 0) - count
+
+            if remaining_count > 0:
+                self.bins[index] = remaining_count
+            else:
+                self.bins.pop(index, None)  # Do not keep empty bins
+
+        self.zero_count -= sketch.zero_count
+        self.count -= sketch.count
+
+    def quantile(self, q):
+        """
+        :param q: the quantile, between 0 and 1
+        :return: the estimated value of the quantile, None if the sketch is empty
+        """
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        cumulated_count = self.zero_count
+
+        if rank < cumulated_count:
+            return 0
+
+        for index in sorted(self.bins):
+            cumulated_count += self.bins[index]
+
+            if cumulated_count > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)  # The middle of the bin, in relative error
+
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        collapsed_indexes = indexes[:len(indexes) - DDSKETCH_MAX_BINS + 1]
+
+        self.bins[collapsed_indexes[-1]] = sum(self.bins.pop(index) for index in collapsed_indexes)
@@ -1,10 +1,14 @@
-from collections import Counter
-from math import floor
-
 from lib import app_config
-from lib.app_config import KEY_REFRESH_TIME_S
+from lib.aggregates import SECTION_HITS, REMOTE_HOST_HITS, AUTH_USER_HITS, UNIQUE_REMOTE_HOSTS, UNIQUE_RESOURCES, \
+    RESPONSE_CODE_TYPES, BYTES, BYTES_QUANTILES, DURATION_QUANTILES
+from lib.app_config import KEY_REFRESH_TIME_S, KEY_LOG_RETENTION_TIME_S
+from lib.log import RESPONSE_CODE_TYPES_FORMATTED
 
 TOP_SECTIONS_COUNT = 5
+TOP_REMOTE_HOSTS_COUNT = 3
+TOP_AUTH_USERS_COUNT = 3
+
+PERCENTILES = [0.5, 0.95, 0.99]
 
 
 class Stat:
@@ -17,41 +21,48 @@ class Stat:
         return '{}'.format(self.message)
 
 
-def compute(time, logs):
+def compute(time, aggregates, retained_aggregates=None, interval_time_s=None):
+    """
+    Compute the stats of an interval of time from the aggregates of its logs, followed by the stats of the whole
+    retention window if its aggregates are given
+
+    :param time: the time at which the update task started
+    :param aggregates: a Bucket aggregating the logs of the interval
+    :param retained_aggregates: a Bucket aggregating all the logs retained
+    :param interval_time_s: the length of the interval in seconds, the refresh time if None. A pass coalescing skipped
+    ticks has a longer interval
+    :return: a list of Stat objects
+    """
+    if interval_time_s is None:
+        interval_time_s = app_config.get(KEY_REFRESH_TIME_S)
+
     stats = []
 
-    if not logs:
+    if not aggregates.hits:
         return [Stat(time, 'Currently no traffic')]
 
     for compute_stat in STAT_COMPUTERS:
-        stats += compute_stat(time, logs)
+        stats += compute_stat(time, aggregates, interval_time_s)
+
+    if retained_aggregates is not None:
+        for compute_stat in RETAINED_STAT_COMPUTERS:
+            stats += compute_stat(time, retained_aggregates)
 
     return stats
 
 
-def _compute_stat_total_hits(time, logs):
-    return [Stat(time, 'Total hits: {}'.format(len(logs)))]
+def _compute_stat_total_hits(time, aggregates, interval_time_s):
+    return [Stat(time, 'Total hits: {}'.format(aggregates.hits))]
 
 
-def _compute_hits_per_second(time, logs):
-    refresh_time = app_config.get(KEY_REFRESH_TIME_S)
-    average_hit_count = round(len(logs) / refresh_time, 1)
+def _compute_hits_per_second(time, aggregates, interval_time_s):
+    average_hit_count = round(aggregates.hits / interval_time_s, 1)
     return [Stat(time, 'Average hit count: {}/s'.format(average_hit_count))]
 
 
-def _compute_stats_sections_with_most_hits(time, logs):
-    section_hit_mapping = {}
-
-    for log in logs:
-        section_hit = log.get_section_hit()
-
-        if section_hit_mapping.get(section_hit):
-            section_hit_mapping[section_hit] += 1
-        else:
-            section_hit_mapping[section_hit] = 1
+def _compute_stats_sections_with_most_hits(time, aggregates, interval_time_s):
+    most_hit_sections = dict(aggregates.get(SECTION_HITS).most_common(TOP_SECTIONS_COUNT))
 
-    most_hit_sections = dict(Counter(section_hit_mapping).most_common(TOP_SECTIONS_COUNT))
-    
     i = 1
     stats = []
 
@@ -62,30 +73,79 @@ def _compute_stats_sections_with_most_hits(time, logs):
     return stats
 
 
-def _compute_stats_response_codes(time, logs):
-    code_type_count_mapping = {}
+def _compute_stats_most_active_remote_hosts(time, aggregates, interval_time_s):
+    most_active_remote_hosts = aggregates.get(REMOTE_HOST_HITS).most_common(TOP_REMOTE_HOSTS_COUNT)
+
+    return [Stat(time, 'Most active host {}: {} ({})'.format(i + 1, remote_host, hits))
+            for i, (remote_host, hits) in enumerate(most_active_remote_hosts)]
+
+
+def _compute_stats_most_active_auth_users(time, aggregates, interval_time_s):
+    most_active_auth_users = aggregates.get(AUTH_USER_HITS).most_common(TOP_AUTH_USERS_COUNT)
+
+    return [Stat(time, 'Most active user {}: {} ({})'.format(i + 1, auth_user, hits))
+            for i, (auth_user, hits) in enumerate(most_active_auth_users)]
+
+
+def _compute_stats_unique_visitors(time, aggregates, interval_time_s):
+    # Counted with a sketch, about 1.6% off
+    return [Stat(time, 'Unique clients: ~{}'.format(aggregates.get(UNIQUE_REMOTE_HOSTS).count())),
+            Stat(time, 'Unique resources: ~{}'.format(aggregates.get(UNIQUE_RESOURCES).count()))]
 
-    for log in logs:
-        code_type = log.get_response_code_type_formatted()
 
-        if code_type_count_mapping.get(code_type):
-            code_type_count_mapping[code_type] += 1
-        else:
-            code_type_count_mapping[code_type] = 1
+def _compute_stats_response_codes(time, aggregates, interval_time_s):
+    code_type_count_mapping = {RESPONSE_CODE_TYPES_FORMATTED.get(code_type, 'None'): count
+                               for code_type, count in aggregates.get(RESPONSE_CODE_TYPES).items()}
 
     return [Stat(time, '{} count: {}'.format(code_type, code_type_count_mapping[code_type]))
             for code_type in sorted(code_type_count_mapping)]
 
 
-def _compute_stat_bytes_sent(time, logs):
-    total_bytes = sum([log.bytes for log in logs])
-    return [Stat(time, 'Total bytes transfered: {}'.format(total_bytes))]
+def _compute_stat_bytes_sent(time, aggregates, interval_time_s):
+    return [Stat(time, 'Total bytes transfered: {}'.format(aggregates.get(BYTES)))]
 
 
+def _compute_stats_percentiles(time, aggregates, scope=''):
+    stats = []
+
+    bytes_quantiles = aggregates.get(BYTES_QUANTILES)
+    duration_quantiles = aggregates.get(DURATION_QUANTILES)
+
+    if bytes_quantiles.count:
+        stats.append(Stat(time, 'Bytes p50/p95/p99{}: {}'.format(
+            scope, ' / '.join('{:.0f}'.format(bytes_quantiles.quantile(q)) for q in PERCENTILES))))
+
+    # Only given by the log formats with the request duration
+    if duration_quantiles.count:
+        stats.append(Stat(time, 'Response time p50/p95/p99{}: {} ms'.format(
+            scope, ' / '.join('{:.1f}'.format(duration_quantiles.quantile(q) * 1000) for q in PERCENTILES))))
+
+    return stats
+
+
+def _compute_stats_interval_percentiles(time, aggregates, interval_time_s):
+    return _compute_stats_percentiles(time, aggregates)
+
+
+def _compute_stats_retained_percentiles(time, aggregates):
+    return _compute_stats_percentiles(time, aggregates,
+                                      scope=' over {}s'.format(app_config.get(KEY_LOG_RETENTION_TIME_S)))
+
+
+# Stats of the interval, the computers also get the length of the interval in seconds
 STAT_COMPUTERS = [
     _compute_stat_total_hits,
     _compute_hits_per_second,
     _compute_stats_sections_with_most_hits,
+    _compute_stats_most_active_remote_hosts,
+    _compute_stats_most_active_auth_users,
+    _compute_stats_unique_visitors,
     _compute_stats_response_codes,
-    _compute_stat_bytes_sent
+    _compute_stat_bytes_sent,
+    _compute_stats_interval_percentiles
+]
+
+# Stats of the whole retention window rather than of the last interval
+RETAINED_STAT_COMPUTERS = [
+    _compute_stats_retained_percentiles
 ]
\ No newline at end of file
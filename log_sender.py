@@ -0,0 +1,54 @@
+import argparse
+import random
+import socket
+import time
+
+from datetime import datetime
+
+from log_generator import HOSTS, NAMES, METHODS, URL, PROTOCOL
+
+SYSLOG_PRIORITY = 190  # local7.info, the facility and severity of the access logs of nginx
+
+
+def create_line():
+    time_now = datetime.utcnow().strftime("%d/%b/%Y:%H:%M:%S +0000")
+
+    return '{} - {} [{}] "{} {} {}" {} {}'.format(
+        random.choice(HOSTS),
+        random.choice(NAMES),
+        time_now,
+        random.choice(METHODS),
+        random.choice(URL),
+        random.choice(PROTOCOL),
+        random.randint(100, 600),
+        random.randint(0, 10000)
+    )
+
+
+def to_syslog_message(line):
+    return '<{}>{} {} nginx: {}'.format(SYSLOG_PRIORITY, datetime.utcnow().strftime('%b %d %H:%M:%S'),
+                                        socket.gethostname(), line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", help="address of the monitoring console")
+    parser.add_argument("--udp", help="UDP port to send syslog messages to", type=int)
+    parser.add_argument("--tcp", help="TCP port to send newline delimited lines to", type=int)
+    parser.add_argument("-r", "--rate", help="lines sent per second", type=int)
+    args = parser.parse_args()
+
+    host = args.host if args.host else 'localhost'
+    rate = args.rate if args.rate else 10
+
+    if args.tcp:
+        connection = socket.create_connection((host, args.tcp))
+        send = lambda line: connection.sendall((line + '\n').encode())
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        address = (host, args.udp if args.udp else 514)
+        send = lambda line: connection.sendto(to_syslog_message(line).encode(), address)
+
+    while True:
+        send(create_line())
+        time.sleep(1 / rate)
@@ -1,11 +1,21 @@
+import sys
+
 import npyscreen
 
-from lib import console, app_config, parser_command_line
+from lib import console, app_config, parser_command_line, checkpoint
+from lib.alert_evaluator import AlertEvaluatorThread
+from lib.app_config import KEY_LOG_STORE, KEY_LOG_FILE_PATHS, KEY_PARSER_WORKERS, KEY_PARSER_ENGINE, KEY_REPLAY, \
+    KEY_QUIET, KEY_HISTORY_PATH, KEY_HISTORY_QUERY, KEY_CHECKPOINT_PATH, KEY_INGESTION_HOST, KEY_INGESTION_UDP_PORT, \
+    KEY_INGESTION_TCP_PORT
 from lib.clock import ClockThread
 from lib.console_ui import ConsoleUI
-from lib.log_queue import LogQueue
+from lib.history import HistoryStore
+from lib.ingestion import IngestionServer, IngestionParserThread
+from lib.log_queue import create_log_queue, to_timestamp
 from lib.monitor import MonitorThreadGenerator
 from lib.parser import ParserThread
+from lib.parser_pool import ParserPool
+from lib.replay import Replayer
 
 if __name__ == '__main__':
     config = parser_command_line.parse_config()
@@ -13,17 +23,74 @@ if __name__ == '__main__':
     # Update the application config (global for the app), according to the checked parsed arguments
     app_config.update(config)
 
-    log_queue = LogQueue()
+    # Optionally keep the aggregates of each second on disk once they expire, to look back at them
+    history = HistoryStore(app_config.get(KEY_HISTORY_PATH)) if app_config.get(KEY_HISTORY_PATH) else None
+
+    if app_config.get(KEY_HISTORY_QUERY):
+        start, end = app_config.get(KEY_HISTORY_QUERY)
+
+        for message in history.summarize(to_timestamp(start), to_timestamp(end)).get_messages():
+            print(message)
+
+        sys.exit()
 
-    # Launch the parser thread responsible for adding logs to the LogQueue
-    ParserThread(log_queue).start()
+    log_queue = create_log_queue(app_config.get(KEY_LOG_STORE), history)
+
+    if app_config.get(KEY_REPLAY):
+        # Headless analysis of historical logs, driven by the dates of the logs rather than by the clock
+        replayer = Replayer(log_queue, console.ConsoleModel(), app_config.get(KEY_LOG_FILE_PATHS),
+                            quiet=app_config.get(KEY_QUIET), worker_count=app_config.get(KEY_PARSER_WORKERS))
+        elapsed = replayer.run()
+
+        print('Replayed {} logs in {:.2f}s'.format(replayer.log_count, elapsed), file=sys.stderr)
+        sys.exit()
+
+    # Optionally parse the lines in worker processes, shared by all the parser threads
+    parser_workers = app_config.get(KEY_PARSER_WORKERS)
+    parser_pool = ParserPool(parser_workers, app_config.get(KEY_PARSER_ENGINE)) if parser_workers else None
 
     console_model = console.ConsoleModel()
-    generator = MonitorThreadGenerator(log_queue, console_model)
+
+    # Optionally resume from the last checkpoint, rather than parsing the log files again from their beginning
+    checkpoint_path = app_config.get(KEY_CHECKPOINT_PATH)
+    saved_checkpoint = checkpoint.load(checkpoint_path) if checkpoint_path else None
+    positions = checkpoint.restore(saved_checkpoint, log_queue, console_model) if saved_checkpoint else {}
+
+    # Launch the parser threads responsible for adding logs to the LogQueue, one per log file
+    parser_threads = [ParserThread(log_queue, file_path, parser_pool=parser_pool,
+                                   start_position=positions.get(file_path))
+                      for file_path in app_config.get(KEY_LOG_FILE_PATHS)]
+    input_metrics = [parser_thread.metrics for parser_thread in parser_threads]
+
+    # Optionally receive log lines over the network, parsed by their own parser thread
+    if app_config.get(KEY_INGESTION_UDP_PORT) or app_config.get(KEY_INGESTION_TCP_PORT):
+        ingestion_server = IngestionServer(app_config.get(KEY_INGESTION_HOST), app_config.get(KEY_INGESTION_UDP_PORT),
+                                           app_config.get(KEY_INGESTION_TCP_PORT))
+        ingestion_server.start()
+
+        try:
+            ingestion_server.wait_ready()
+        except OSError as error:
+            sys.exit('Could not listen for log lines: {}'.format(error))
+
+        parser_threads.append(IngestionParserThread(log_queue, ingestion_server, parser_pool=parser_pool))
+        input_metrics += [ingestion_server.metrics, parser_threads[-1].metrics]
+
+    for parser_thread in parser_threads:
+        parser_thread.start()
+
+    checkpointer = checkpoint.Checkpointer(checkpoint_path, log_queue, console_model, parser_threads) \
+        if checkpoint_path else None
+    generator = MonitorThreadGenerator(log_queue, console_model,
+                                       input_metrics=input_metrics,
+                                       evaluate_alerts=False)
 
     # Launch the clock thread spawning Monitor thread
     ClockThread(generator=generator).start()
 
+    # Launch the thread evaluating the alerts, more often than the stats are refreshed
+    AlertEvaluatorThread(log_queue, console_model, checkpointer).start()
+
     try:
         # Run the main UI thread
         ConsoleUI(console_model).run()
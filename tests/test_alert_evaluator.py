@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from lib import app_config
+from lib.alert_evaluator import AlertEvaluatorThread
+from lib.aggregates import REMOTE_HOST_COUNTS
+from lib.app_config import KEY_LOG_RETENTION_TIME_S, KEY_ALERT_RULES
+from lib.console import ConsoleModel
+from lib.log import Log
+from lib.log_queue import LogQueue
+
+
+class AlertEvaluatorThreadTest(unittest.TestCase):
+
+    def setUp(self):
+        rule_configs = app_config.get(KEY_ALERT_RULES)
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: rule_configs})
+
+        app_config.update({
+            KEY_LOG_RETENTION_TIME_S: 10,
+            KEY_ALERT_RULES: [{'type': 'host_traffic', 'threshold': 2}]
+        })
+
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+        self.log_queue = LogQueue()
+        self.console_model = ConsoleModel()
+        self.evaluator = AlertEvaluatorThread(self.log_queue, self.console_model)
+
+    def _add_logs(self, count, time_delta_s):
+        date = self.date + timedelta(seconds=time_delta_s)
+
+        for _ in range(count):
+            self.log_queue.append(Log('10.0.0.1', 'paul', date, 'GET', '/book/1', 'HTTP/1.0', 200, 20))
+
+    def test_burst_is_flagged_at_the_next_evaluation(self):
+        # Given
+        self._add_logs(15, time_delta_s=0)
+        self.evaluator.evaluate(self.date + timedelta(seconds=0.5))
+        self.assertEqual(self.console_model.get_current_alerts(), [])
+
+        self._add_logs(15, time_delta_s=1)
+
+        # When
+        self.evaluator.evaluate(self.date + timedelta(seconds=1.5))
+
+        # Then
+        self.assertEqual([alert.message for alert in self.console_model.get_current_alerts()],
+                         ['High traffic on host 10.0.0.1 - 3 hits/s'])
+
+    def test_alert_recovers_once_the_burst_expires(self):
+        # Given
+        self._add_logs(40, time_delta_s=0)
+        self.evaluator.evaluate(self.date + timedelta(seconds=1))
+
+        # When
+        self.evaluator.evaluate(self.date + timedelta(seconds=11))
+
+        # Then
+        self.assertEqual(self.console_model.get_current_alerts(), [])
+        self.assertEqual(len(self.console_model.get_previous_alerts()), 1)
+
+    def test_recovered_alert_is_kept_until_a_display_refresh_has_shown_it(self):
+        # Given
+        self._add_logs(40, time_delta_s=0)
+        self.evaluator.evaluate(self.date + timedelta(seconds=1))
+        self.console_model.update_stats(self.date + timedelta(seconds=10), [])
+        self.evaluator.evaluate(self.date + timedelta(seconds=11))
+
+        # When
+        self.evaluator.evaluate(self.date + timedelta(seconds=12))
+        self.console_model.update_stats(self.date + timedelta(seconds=20), [])
+
+        # Then
+        self.assertEqual(len(self.console_model.get_previous_alerts()), 1)
+        self.assertTrue(self.console_model.get_previous_alerts()[0].recovered)
+
+        self.console_model.update_stats(self.date + timedelta(seconds=30), [])
+        self.assertEqual(self.console_model.get_previous_alerts(), [])
+
+    def test_only_the_accumulators_read_by_the_rules_are_aggregated(self):
+        # Given
+        self._add_logs(10, time_delta_s=0)
+
+        # When
+        aggregates = self.log_queue.get_retained_aggregates([REMOTE_HOST_COUNTS])
+
+        # Then
+        self.assertEqual(list(aggregates.accumulators), [REMOTE_HOST_COUNTS])
+        self.assertEqual(aggregates.get(REMOTE_HOST_COUNTS), {'10.0.0.1': 10})
+
+    def test_evaluation_goes_on_after_an_exception(self):
+        # Given
+        self.evaluator.evaluation_time = 0.01
+        self.evaluator.evaluate = mock.Mock(side_effect=[TypeError('invalid threshold'), SystemExit])
+
+        # When
+        with self.assertLogs(level='ERROR') as logs:
+            self.evaluator.start()
+            self.evaluator.join(5)
+
+        # Then the thread only stopped on the second evaluation
+        self.assertFalse(self.evaluator.is_alive())
+        self.assertEqual(self.evaluator.evaluate.call_count, 2)
+        self.assertIn('invalid threshold', logs.output[0])
@@ -1,11 +1,14 @@
+import random
 import unittest
 from datetime import datetime, timedelta
 
-from lib import app_config, alerts
-from lib.app_config import KEY_REQUEST_FREQUENCY_PER_S, KEY_LOG_RETENTION_TIME_S
+from lib import app_config, alerts, numpy_backend
+from lib.aggregates import Bucket, BucketWindow, BUCKET_ACCUMULATORS, SECTION_COUNTS, REMOTE_HOST_COUNTS
+from lib.app_config import KEY_REQUEST_FREQUENCY_PER_S, KEY_LOG_RETENTION_TIME_S, KEY_ALERT_RULES, \
+    KEY_TOP_K_CAPACITY, KEY_ALERT_HYSTERESIS_S
 from lib.console import ConsoleModel
 from lib.log import Log
-from lib.log_queue import LogQueue
+from lib.log_queue import LogQueue, ColumnarLogQueue, NumpyLogQueue
 from lib.monitor import Monitor
 
 
@@ -56,6 +59,53 @@ class AlertsTest(unittest.TestCase):
         for _ in range(count):
             self.log_queue.append(Log(remote_host, auth_user, date, request_verb, resource, protocol, status, bytes))
 
+    def test_alerts_of_the_same_type_on_different_scopes_are_tracked_separately(self):
+        # Given
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: app_config.get(KEY_ALERT_RULES)})
+        app_config.update({KEY_ALERT_RULES: [{'type': 'section_traffic', 'threshold': 2}]})
+        date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+        self._generate_logs(count=30, date=date, resource='/api/user')
+        monitor = self._create_monitor(count=30, time_delta_s=0)
+
+        # When
+        monitor.run()
+
+        self._generate_logs(count=30, date=date + timedelta(seconds=11), resource='/api/user')
+        self._create_monitor(count=0, time_delta_s=11).run()
+
+        # Then
+        self.assertEqual([str(alert) for alert in reversed(self.console_model.get_alert_history_messages())], [
+            '[2018-12-12 00:00:01] High traffic on section /api - 3 hits/s',
+            '[2018-12-12 00:00:01] High traffic on section /book - 3 hits/s',
+            '[2018-12-12 00:00:12] Recovered "High traffic on section /book - 3 hits/s"'
+        ])
+        self.assertEqual([alert.scope for alert in self.console_model.get_current_alerts()], ['/api'])
+
+    def test_alert_not_detected_during_less_than_the_hysteresis_does_not_recover(self):
+        # Given
+        self.addCleanup(app_config.update, {KEY_ALERT_HYSTERESIS_S: app_config.get(KEY_ALERT_HYSTERESIS_S)})
+        app_config.update({KEY_ALERT_HYSTERESIS_S: 5})
+        console_model = ConsoleModel()
+
+        date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+        console_model.update_alerts(date, [alerts.Alert(date, alerts.TYPE_HIGH_TRAFFIC, 'High traffic - 12 hits/s')])
+
+        # When
+        for time_delta_s in range(1, 5):
+            console_model.update_alerts(date + timedelta(seconds=time_delta_s), [])
+
+        console_model.update_alerts(date + timedelta(seconds=5), [
+            alerts.Alert(date, alerts.TYPE_HIGH_TRAFFIC, 'High traffic - 11 hits/s')])
+
+        # Then
+        self.assertEqual(len(console_model.get_alert_history_messages()), 1)
+        self.assertEqual(len(console_model.get_current_alerts()), 1)
+
+        console_model.update_alerts(date + timedelta(seconds=10), [])
+        self.assertEqual(len(console_model.get_current_alerts()), 0)
+        self.assertEqual(len(console_model.get_previous_alerts()), 1)
+
     def test_sending_less_logs_than_threshold_should_not_trigger_an_alert(self):
         # Given
         log_to_generate_count = self.request_frequency_per_s * self.log_retention_time_s - 1  # normal
@@ -180,4 +230,254 @@ class AlertsTest(unittest.TestCase):
         # Then
         self.assertEqual(len(self.console_model.get_alert_history_messages()), 3)
         self.assertEqual(len(self.console_model.get_current_alerts()), 1)
-        self.assertEqual(len(self.console_model.get_previous_alerts()), 0)
\ No newline at end of file
+        self.assertEqual(len(self.console_model.get_previous_alerts()), 0)
+
+
+class RuleEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+        self.aggregates = Bucket(list(BUCKET_ACCUMULATORS))  # The rules are not the ones of the app config
+
+        app_config.update({
+            KEY_LOG_RETENTION_TIME_S: 10
+        })
+
+    def _add_logs(self, count, remote_host='127.0.0.1', resource='/book/1', status=200, bytes=20):
+        for _ in range(count):
+            self.aggregates.add(Log(remote_host, 'paul', self.date, 'GET', resource, 'HTTP/1.0', status, bytes))
+
+    def _evaluate(self, rule_configs):
+        return [alert.message for alert in alerts.RuleEngine(rule_configs).evaluate(self.date, self.aggregates)]
+
+    def test_high_traffic_rule_with_a_zero_threshold_does_not_use_the_app_config_one(self):
+        # Given
+        self._add_logs(5)
+
+        # When
+        messages = self._evaluate([{'type': 'high_traffic', 'threshold': 0}])
+
+        # Then
+        self.assertEqual(messages, ['High traffic - 0 hits/s'])
+
+    def test_host_rule_without_scope_checks_every_host(self):
+        # Given
+        self._add_logs(50, remote_host='10.0.0.1')
+        self._add_logs(30, remote_host='10.0.0.2')
+        self._add_logs(10, remote_host='10.0.0.3')
+
+        # When
+        messages = self._evaluate([{'type': 'host_traffic', 'threshold': 3}])
+
+        # Then
+        self.assertEqual(messages, ['High traffic on host 10.0.0.1 - 5 hits/s',
+                                    'High traffic on host 10.0.0.2 - 3 hits/s'])
+
+    def test_scoped_rules_only_check_their_scope(self):
+        # Given
+        self._add_logs(50, resource='/api/user')
+        self._add_logs(50, resource='/book/1')
+
+        # When
+        messages = self._evaluate([{'type': 'section_traffic', 'threshold': 3, 'scope': '/api'}] +
+                                  [{'type': 'section_traffic', 'threshold': 1, 'scope': '/section{}'.format(i)}
+                                   for i in range(500)])
+
+        # Then
+        self.assertEqual(messages, ['High traffic on section /api - 5 hits/s'])
+
+    def test_host_rule_counts_every_host_exactly(self):
+        # Given only 2 hosts counted to find the most active ones
+        top_k_capacity = app_config.get(KEY_TOP_K_CAPACITY)
+        self.addCleanup(app_config.update, {KEY_TOP_K_CAPACITY: top_k_capacity})
+        app_config.update({KEY_TOP_K_CAPACITY: 2})
+        self.aggregates = Bucket(list(BUCKET_ACCUMULATORS))
+
+        self._add_logs(40, remote_host='10.0.0.1')
+
+        for i in range(30):
+            self._add_logs(1, remote_host='10.0.1.{}'.format(i))
+
+        self._add_logs(5, remote_host='10.0.0.2')
+
+        # When
+        messages = self._evaluate([{'type': 'host_traffic', 'threshold': 3}])
+
+        # Then
+        self.assertEqual(messages, ['High traffic on host 10.0.0.1 - 4 hits/s'])
+
+    def test_host_rule_recovers_once_the_hits_of_the_host_expire(self):
+        # Given
+        rule_configs = [{'type': 'host_traffic', 'threshold': 5, 'scope': '10.0.0.1'}]
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: app_config.get(KEY_ALERT_RULES)})
+        app_config.update({KEY_ALERT_RULES: rule_configs})
+        window = BucketWindow()
+
+        for second in range(3):
+            for _ in range(20):
+                window.add(Log('10.0.0.1', 'paul', self.date, 'GET', '/book/1', 'HTTP/1.0', 200, 20), second)
+
+        self.aggregates = window.get_total()
+        self.assertEqual(self._evaluate(rule_configs), ['High traffic on host 10.0.0.1 - 6 hits/s'])
+
+        # When
+        window.flush_expired(1)
+        self.aggregates = window.get_total()
+
+        # Then
+        self.assertEqual(self._evaluate(rule_configs), [])
+
+    def test_exact_counts_are_only_kept_for_the_scopes_of_the_rules(self):
+        # Given
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: app_config.get(KEY_ALERT_RULES)})
+        window, scoped_window = BucketWindow(), BucketWindow()
+
+        def add_logs(bucket_window, rule_configs):
+            app_config.update({KEY_ALERT_RULES: rule_configs})
+
+            for i in range(10):
+                bucket_window.add(Log('10.0.0.{}'.format(i), 'paul', self.date, 'GET', '/book/1', 'HTTP/1.0', 200, 20),
+                                  0)
+
+        # When
+        add_logs(window, [{'type': 'high_traffic'}])
+        add_logs(scoped_window, [{'type': 'host_traffic', 'threshold': 5, 'scope': '10.0.0.1'},
+                                 {'type': 'host_traffic', 'threshold': 5, 'scope': '10.0.0.2'}])
+
+        # Then
+        self.assertNotIn(REMOTE_HOST_COUNTS, window.buckets[0].accumulators)
+        self.assertNotIn(SECTION_COUNTS, window.buckets[0].accumulators)
+        self.assertEqual(scoped_window.get_total().get(REMOTE_HOST_COUNTS), {'10.0.0.1': 1, '10.0.0.2': 1})
+        self.assertNotIn(SECTION_COUNTS, scoped_window.buckets[0].accumulators)
+
+    def test_error_ratio_and_bytes_rate_rules(self):
+        # Given
+        self._add_logs(70, bytes=1000)
+        self._add_logs(30, status=503, bytes=0)
+
+        # When
+        messages = self._evaluate([{'type': 'error_ratio', 'threshold': 0.25},
+                                   {'type': 'bytes_rate', 'threshold': 5000},
+                                   {'type': 'bytes_rate', 'threshold': 8000}])
+
+        # Then
+        self.assertEqual(messages, ['High server error ratio - 30% of requests', 'High bandwidth - 7000 bytes/s'])
+
+    def _replay_anomaly_rule(self, rule_config, hits_by_second, start_date, rule_engine=None, error_ratio=0):
+        """
+        Helper receiving the given number of hits each second from the start date, evaluating the rule every 5 seconds
+
+        :return: the rule engine, and the alert messages of the last evaluation
+        """
+        rule_engine = rule_engine or alerts.RuleEngine([rule_config])
+        log_queue = LogQueue()
+        messages = []
+
+        for i, hits in enumerate(hits_by_second):
+            date = start_date + timedelta(seconds=i)
+
+            for j in range(hits):
+                status = 500 if j < hits * error_ratio else 200
+                log_queue.append(Log('127.0.0.1', 'paul', date, 'GET', '/book/1', 'HTTP/1.0', status, 20))
+
+            if i % 5 == 4:
+                log_queue.flush_expired(date - timedelta(seconds=10))
+                aggregates = log_queue.get_retained_aggregates(rule_engine.accumulator_names)
+                messages = [alert.message for alert in rule_engine.evaluate(date, aggregates)]
+
+        return rule_engine, messages
+
+    def test_anomaly_rule_detects_a_burst_compared_to_the_usual_traffic(self):
+        # Given
+        rule_config = {'type': 'anomaly', 'deviations': 3, 'half_life': 300, 'warmup': 60}
+        usual_traffic = [8, 12, 10, 9, 11, 13, 7] * 30
+
+        # When
+        rule_engine, usual_messages = self._replay_anomaly_rule(rule_config, usual_traffic, self.date)
+        _, burst_messages = self._replay_anomaly_rule(rule_config, [30] * 20, self.date + timedelta(seconds=210),
+                                                      rule_engine)
+
+        # Then
+        self.assertEqual(usual_messages, [])
+        self.assertEqual(len(burst_messages), 1)
+        self.assertTrue(burst_messages[0].startswith('Traffic anomaly - 30 hits/s, usually 1'))
+
+    def test_seasonal_anomaly_rule_compares_the_traffic_to_the_same_hour(self):
+        # Given a quiet hour and a busy hour
+        rule_config = {'type': 'anomaly', 'seasonal': True, 'half_life': 300, 'warmup': 60}
+        rule_engine, _ = self._replay_anomaly_rule(rule_config, [1, 3, 2] * 40, self.date)
+        self._replay_anomaly_rule(rule_config, [18, 22, 20] * 40, self.date + timedelta(hours=1), rule_engine)
+
+        # When
+        busy_hour_date = self.date + timedelta(days=1, hours=1)
+        _, busy_hour_messages = self._replay_anomaly_rule(rule_config, [20] * 30, busy_hour_date, rule_engine)
+        _, quiet_hour_messages = self._replay_anomaly_rule(rule_config, [20] * 30, self.date + timedelta(days=2),
+                                                           rule_engine)
+
+        # Then
+        self.assertEqual(busy_hour_messages, [])
+        self.assertEqual(len(quiet_hour_messages), 1)
+
+    def test_anomaly_rule_detects_an_unusual_ratio_of_server_errors(self):
+        # Given
+        rule_config = {'type': 'anomaly', 'metric': 'error_ratio', 'half_life': 300, 'warmup': 60}
+        rule_engine, usual_messages = self._replay_anomaly_rule(rule_config, [20] * 100, self.date, error_ratio=0.05)
+        self._replay_anomaly_rule(rule_config, [20] * 100, self.date + timedelta(seconds=100), rule_engine,
+                                  error_ratio=0.1)
+
+        # When
+        _, messages = self._replay_anomaly_rule(rule_config, [20] * 20, self.date + timedelta(seconds=200),
+                                                rule_engine, error_ratio=0.5)
+
+        # Then
+        self.assertEqual(usual_messages, [])
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('Server error ratio anomaly - 50.0% of requests, usually'))
+
+    def test_anomaly_rule_detects_a_lasting_change_smaller_than_the_variations_of_single_seconds(self):
+        # Given hits varying by about 3 hits/s from a second to the next one, retained for the default retention time
+        app_config.update({KEY_LOG_RETENTION_TIME_S: 120})
+        rule_config = {'type': 'anomaly', 'half_life': 600, 'warmup': 300}
+        random_generator = random.Random(0)
+        usual_traffic = [random_generator.randint(5, 15) for _ in range(1200)]
+
+        rule_engine, usual_messages = self._replay_anomaly_rule(rule_config, usual_traffic, self.date)
+
+        # When 2 hits/s more during the retention time
+        _, messages = self._replay_anomaly_rule(rule_config, [12] * 120, self.date + timedelta(seconds=1200),
+                                                rule_engine)
+
+        # Then
+        self.assertEqual(usual_messages, [])
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('Traffic anomaly - 12 hits/s, usually 10'))
+
+    def test_invalid_rules_are_rejected(self):
+        for rule_config in [{'type': 'unknown'}, {'type': 'bytes_rate'}, {'type': 'error_ratio', 'foo': 1}, 'rule',
+                            {'type': 'anomaly', 'metric': 'bytes'}, {'type': 'anomaly', 'half_life': 0},
+                            {'type': 'high_traffic', 'threshold': '10'}, {'type': 'section_traffic', 'threshold': None},
+                            {'type': 'host_traffic', 'threshold': 2, 'scope': 1}, {'type': 'anomaly', 'seasonal': 1},
+                            {'type': 'error_ratio', 'threshold': True}]:
+            with self.assertRaises(ValueError):
+                alerts.create_rule(rule_config)
+
+    def test_default_parameters_can_be_given_explicitly(self):
+        for rule_config in [{'type': 'high_traffic', 'threshold': None}, {'type': 'high_traffic', 'threshold': 2.5},
+                            {'type': 'section_traffic', 'threshold': 2, 'scope': None},
+                            {'type': 'anomaly', 'seasonal': True, 'warmup': 60}]:
+            alerts.create_rule(rule_config)
+
+
+class ColumnarAlertsTest(AlertsTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log_queue = ColumnarLogQueue()
+
+
+@unittest.skipIf(not numpy_backend.is_available(), 'numpy is not installed')
+class NumpyAlertsTest(AlertsTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log_queue = NumpyLogQueue()
@@ -0,0 +1,98 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib import archives
+from lib.archives import read_blocks_in_background, group_rotated_files, merge_rotated
+
+
+class ArchivesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, file_name, content, open_file=open):
+        file_path = os.path.join(self.directory, file_name)
+
+        with open_file(file_path, 'wb') as file:
+            file.write(content)
+
+        return file_path
+
+    def test_compressed_file_is_read_like_the_uncompressed_one(self):
+        # Given
+        content = b''.join(b'line %d of the log\n' % i for i in range(10000)) + b'unterminated'
+        file_path = self._write('access.log', content)
+        compressed_file_path = self._write('access.log.1.gz', content, open_file=gzip.open)
+
+        # When
+        lines = [line for lines in read_blocks_in_background(file_path, block_size=1000) for line in lines]
+        compressed_lines = [line for lines in read_blocks_in_background(compressed_file_path, block_size=1000)
+                            for line in lines]
+
+        # Then
+        self.assertEqual(compressed_lines, lines)
+        self.assertEqual(len(lines), 10001)
+        self.assertEqual(lines[-2:], ['line 9999 of the log', 'unterminated'])
+
+    def test_compressed_file_is_closed_along_with_its_decompressor(self):
+        # Given
+        file_path = self._write('access.log.1.gz', b'line\n', open_file=gzip.open)
+        open_file_count = len(os.listdir('/proc/self/fd'))
+
+        # When
+        with archives.open_log_file(file_path) as file:
+            file.read()
+
+        # Then
+        self.assertEqual(len(os.listdir('/proc/self/fd')), open_file_count)
+
+    @unittest.skipIf(archives.zstandard is None, 'zstandard is not installed')
+    def test_zstd_compressed_file_is_read(self):
+        # Given
+        content = b''.join(b'line %d\n' % i for i in range(1000))
+        file_path = self._write('access.log.1.zst', archives.zstandard.ZstdCompressor().compress(content))
+
+        # When
+        lines = [line for lines in read_blocks_in_background(file_path) for line in lines]
+
+        # Then
+        self.assertEqual(lines, ['line %d' % i for i in range(1000)])
+
+    def test_error_while_reading_is_raised_to_the_reader(self):
+        with self.assertRaises(FileNotFoundError):
+            list(read_blocks_in_background(os.path.join(self.directory, 'missing.log')))
+
+    def test_rotated_files_are_grouped_from_the_oldest_to_the_current_one(self):
+        # When
+        groups = group_rotated_files(['/logs/access.log', '/logs/access.log.1', '/logs/access.log.10.gz',
+                                      '/logs/access.log.2.gz', '/logs/error.log', '/logs/error.log-20181212.zst',
+                                      '/logs/error.log-20181211.gz'])
+
+        # Then
+        self.assertEqual(groups, [['/logs/access.log.10.gz', '/logs/access.log.2.gz', '/logs/access.log.1',
+                                   '/logs/access.log'],
+                                  ['/logs/error.log-20181211.gz', '/logs/error.log-20181212.zst', '/logs/error.log']])
+
+    def test_rotated_files_are_only_read_once_the_merge_reaches_them(self):
+        # Given
+        started = []
+
+        def read(name, items):
+            started.append(name)
+            yield from items
+
+        iterables = [read('2', [1, 2, 3]), read('1', [4, 6]), read('current', [5, 7])]
+
+        # When
+        merged = merge_rotated(iterables, key=lambda item: item)
+
+        # Then
+        self.assertEqual([next(merged) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(started, ['2', '1'])
+        self.assertEqual(list(merged), [4, 5, 6, 7])
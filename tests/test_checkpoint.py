@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from lib import app_config, checkpoint, numpy_backend
+from lib.aggregates import REMOTE_HOST_COUNTS, SECOND_HITS, SECOND_SERVER_ERRORS, RESPONSE_CODE_TYPES, BYTES
+from lib.alert_evaluator import AlertEvaluatorThread
+from lib.app_config import KEY_LOG_RETENTION_TIME_S, KEY_ALERT_RULES
+from lib.checkpoint import Checkpointer
+from lib.console import ConsoleModel
+from lib.log import Log
+from lib.log_queue import create_log_queue, STORE_OBJECTS, STORE_COLUMNAR, STORE_NUMPY
+from lib.parser import ParserThread
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        rule_configs = app_config.get(KEY_ALERT_RULES)
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: rule_configs})
+
+        app_config.update({
+            KEY_LOG_RETENTION_TIME_S: 10,
+            KEY_ALERT_RULES: [{'type': 'host_traffic', 'threshold': 2}]
+        })
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint')
+        self.log_path = os.path.join(self.directory, 'access.log')
+
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _add_logs(self, log_queue, count, time_delta_s):
+        date = self.date + timedelta(seconds=time_delta_s)
+
+        for i in range(count):
+            log_queue.append(Log('10.0.0.{}'.format(i % 2), 'paul', date, 'GET', '/book/{}'.format(i % 3),
+                                 'HTTP/1.0', 200 if i % 4 else 503, 20))
+
+    def _save(self, log_queue, console_model, parser_threads=()):
+        Checkpointer(self.path, log_queue, console_model, list(parser_threads)).save()
+
+    def _test_retained_aggregates_are_restored(self, store):
+        # Given
+        log_queue = create_log_queue(store)
+
+        for second in range(20):
+            self._add_logs(log_queue, 10, time_delta_s=second)
+
+        log_queue.flush_expired(self.date + timedelta(seconds=5))
+        self._save(log_queue, ConsoleModel())
+
+        # When
+        restored_log_queue = create_log_queue(store)
+        checkpoint.restore(checkpoint.load(self.path), restored_log_queue, ConsoleModel())
+
+        # Then
+        aggregates = log_queue.get_retained_aggregates()
+        restored_aggregates = restored_log_queue.get_retained_aggregates()
+
+        self.assertEqual(restored_aggregates.hits, 140)
+
+        for name in [REMOTE_HOST_COUNTS, SECOND_HITS, SECOND_SERVER_ERRORS, RESPONSE_CODE_TYPES, BYTES]:
+            self.assertEqual(restored_aggregates.get(name), aggregates.get(name))
+
+    def test_retained_aggregates_are_restored(self):
+        self._test_retained_aggregates_are_restored(STORE_OBJECTS)
+
+    def test_retained_aggregates_of_the_columnar_store_are_restored(self):
+        self._test_retained_aggregates_are_restored(STORE_COLUMNAR)
+
+    @unittest.skipIf(not numpy_backend.is_available(), 'numpy is not installed')
+    def test_retained_aggregates_of_the_numpy_store_are_restored(self):
+        self._test_retained_aggregates_are_restored(STORE_NUMPY)
+
+    def test_alerts_are_right_from_the_first_evaluation_after_a_restart(self):
+        # Given
+        log_queue = create_log_queue(STORE_OBJECTS)
+        console_model = ConsoleModel()
+
+        self._add_logs(log_queue, 60, time_delta_s=0)
+        AlertEvaluatorThread(log_queue, console_model).evaluate(self.date + timedelta(seconds=1))
+        self._save(log_queue, console_model)
+
+        # When
+        restored_log_queue = create_log_queue(STORE_OBJECTS)
+        restored_console_model = ConsoleModel()
+        checkpoint.restore(checkpoint.load(self.path), restored_log_queue, restored_console_model)
+
+        AlertEvaluatorThread(restored_log_queue, restored_console_model).evaluate(self.date + timedelta(seconds=2))
+
+        # Then the alerts are still the ones detected before the restart, and not detected a second time
+        self.assertEqual(sorted(alert.message for alert in restored_console_model.get_current_alerts()),
+                         ['High traffic on host 10.0.0.0 - 3 hits/s', 'High traffic on host 10.0.0.1 - 3 hits/s'])
+        self.assertEqual(len(restored_console_model.alerts_history), 2)
+
+    def test_positions_of_the_log_files_only_are_saved(self):
+        # Given
+        parser_thread = ParserThread(create_log_queue(STORE_OBJECTS), self.log_path, start_position=(1, 2, 300))
+        network_parser_thread = ParserThread(parser_thread.log_queue, source='udp:514')
+
+        # When
+        self._save(parser_thread.log_queue, ConsoleModel(), [parser_thread, network_parser_thread])
+
+        # Then
+        positions = checkpoint.restore(checkpoint.load(self.path), create_log_queue(STORE_OBJECTS), ConsoleModel())
+
+        self.assertEqual(positions, {self.log_path: (1, 2, 300)})
+
+    def test_checkpoint_of_another_store_is_not_restored(self):
+        # Given
+        log_queue = create_log_queue(STORE_OBJECTS)
+        self._add_logs(log_queue, 10, time_delta_s=0)
+        self._save(log_queue, ConsoleModel())
+
+        # When
+        restored_log_queue = create_log_queue(STORE_COLUMNAR)
+        positions = checkpoint.restore(checkpoint.load(self.path), restored_log_queue, ConsoleModel())
+
+        # Then
+        self.assertEqual(positions, {})
+        self.assertEqual(restored_log_queue.get_retained_aggregates().hits, 0)
+
+    def test_missing_or_corrupted_checkpoint_is_ignored(self):
+        self.assertIsNone(checkpoint.load(self.path))
+
+        with open(self.path, 'wb') as checkpoint_file:
+            checkpoint_file.write(b'not a checkpoint')
+
+        self.assertIsNone(checkpoint.load(self.path))
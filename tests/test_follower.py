@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.follower import FileFollower, find_end_offset, find_date_offset
+
+
+class FollowerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'access.log')
+        self._write('', mode='w')
+
+        self.follower = FileFollower(self.file_path, block_size=16)
+
+    def tearDown(self):
+        self.follower.close()
+        shutil.rmtree(self.directory)
+
+    def _write(self, content, mode='a'):
+        with open(self.file_path, mode) as file:
+            file.write(content)
+
+    def _read_all_lines(self):
+        """
+        Helper reading blocks until no more data is available, checking for rotation like the follower would do
+
+        :return: all the lines read
+        """
+        lines = []
+
+        while True:
+            new_lines = self.follower.read_lines()
+            lines += new_lines
+
+            if not new_lines and not self.follower._reopen_if_replaced():
+                return lines
+
+    def test_reading_complete_lines_spanning_multiple_blocks_returns_them_in_order(self):
+        # Given
+        self._write('first line of the log\nsecond line\nthird\n')
+
+        # When
+        lines = self._read_all_lines()
+
+        # Then
+        self.assertEqual(lines, ['first line of the log', 'second line', 'third'])
+
+    def test_incomplete_line_is_only_returned_once_terminated(self):
+        # Given
+        self._write('first\nsecond is not fin')
+        self.assertEqual(self._read_all_lines(), ['first'])
+
+        # When
+        self._write('ished\n')
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['second is not finished'])
+
+    def test_truncated_file_is_read_again_from_the_beginning(self):
+        # Given
+        self._write('a line written before the truncation\n')
+        self._read_all_lines()
+
+        # When
+        self._write('new\n', mode='w')
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['new'])
+
+    def test_rotated_file_is_read_until_the_end_before_switching_to_the_new_file(self):
+        # Given
+        self._write('old 1\n')
+        self._read_all_lines()
+
+        # When
+        self._write('old 2\n')
+        os.rename(self.file_path, self.file_path + '.1')
+        self._write('new 1\n', mode='w')
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['old 2', 'new 1'])
+
+    def test_reading_resumes_from_the_position_of_a_previous_follower(self):
+        # Given
+        self._write('first\nsecond is not fin')
+        self._read_all_lines()
+        position = self.follower.get_position()
+        self.follower.close()
+
+        # When
+        self._write('ished\nthird\n')
+        self.follower = FileFollower(self.file_path, block_size=16, start_position=position)
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['second is not finished', 'third'])
+
+    def test_file_replaced_since_the_position_of_a_previous_follower_is_read_from_the_beginning(self):
+        # Given
+        self._write('old 1\nold 2\n')
+        self._read_all_lines()
+        position = self.follower.get_position()
+        self.follower.close()
+
+        # When
+        os.rename(self.file_path, self.file_path + '.1')
+        self._write('new 1\n', mode='w')
+        self.follower = FileFollower(self.file_path, block_size=16, start_position=position)
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['new 1'])
+
+    def test_reading_from_the_end_starts_at_the_last_line_not_terminated(self):
+        # Given
+        self._write('first\nsecond\nthird is not fin')
+        self.follower = FileFollower(self.file_path, block_size=16,
+                                     find_start_offset=lambda fd, size: find_end_offset(fd, size, block_size=4))
+
+        # When
+        self._read_all_lines()
+        self._write('ished\nfourth\n')
+
+        # Then
+        self.assertEqual(self._read_all_lines(), ['third is not finished', 'fourth'])
+
+    def test_date_offset_is_the_start_of_the_first_line_not_older_than_the_date(self):
+        # Given lines starting with their date in seconds, with a few lines without date
+        lines = ['{:05d} GET /book'.format(second) if second % 7 else 'malformed' for second in range(2000)]
+        self._write(''.join(line + '\n' for line in lines))
+
+        def get_date(line):
+            return int(line[:5]) if line[0].isdigit() else None
+
+        fd = os.open(self.file_path, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+
+        # When
+        offset = find_date_offset(fd, os.fstat(fd).st_size, get_date, 1500, block_size=64)
+
+        # Then it is less than a block before the line of the date
+        expected_offset = sum(len(line) + 1 for line in lines[:1500])
+
+        self.assertLessEqual(offset, expected_offset)
+        self.assertLess(expected_offset - offset, 64)
+        self.assertIn(offset, [sum(len(line) + 1 for line in lines[:i]) for i in range(1500)] + [expected_offset])
+
+    def test_date_offset_of_a_date_before_the_file_is_its_beginning(self):
+        # Given
+        self._write(''.join('{:05d} GET /book\n'.format(second) for second in range(100, 1000)))
+
+        fd = os.open(self.file_path, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+
+        # When
+        offset = find_date_offset(fd, os.fstat(fd).st_size, lambda line: int(line[:5]), 50, block_size=64)
+
+        # Then
+        self.assertEqual(offset, 0)
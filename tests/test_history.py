@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from lib import numpy_backend
+from lib.aggregates import Bucket
+from lib.history import HistoryStore, RESOLUTION_SECOND, RESOLUTION_MINUTE, RESOLUTION_HOUR
+from lib.log import Log, RESPONSE_CODE_SUCCESS, RESPONSE_CODE_SERVER_ERROR
+from lib.log_queue import create_log_queue, to_timestamp, STORE_OBJECTS, STORE_COLUMNAR, STORE_NUMPY
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.db')
+        self.history = HistoryStore(self.path)
+
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+        self.timestamp = int(to_timestamp(self.date))
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def _create_bucket(self, second, hits):
+        """
+        Helper creating the bucket of a second with the given number of hits, 1 out of 4 being a server error on /api
+        """
+        bucket = Bucket()
+        date = self.date + timedelta(seconds=second)
+
+        for i in range(hits):
+            if i % 4:
+                bucket.add(Log('127.0.0.1', 'paul', date, 'GET', '/book/1', 'HTTP/1.0', 200, 100))
+            else:
+                bucket.add(Log('127.0.0.1', 'paul', date, 'GET', '/api/user', 'HTTP/1.0', 503, 10))
+
+        return bucket
+
+    def _append_seconds(self, seconds, hits=4):
+        """
+        Helper appending the given seconds since the date in chronological order, expiring each one in turn
+        """
+        for second in seconds:
+            self.history.append({self.timestamp + second: self._create_bucket(second, hits)}, self.timestamp + second)
+
+    def test_summary_of_an_interval_counts_every_second(self):
+        # Given 2 hours and a half of traffic
+        self._append_seconds(range(0, 9000, 3))
+
+        # When
+        summary = self.history.summarize(self.timestamp + 30, self.timestamp + 8000)
+
+        # Then
+        self.assertEqual(summary.hits, 4 * len(range(30, 8000, 3)))
+        self.assertEqual(summary.bytes, 310 * len(range(30, 8000, 3)))
+        self.assertEqual(summary.response_code_types, {RESPONSE_CODE_SUCCESS: 3 * len(range(30, 8000, 3)),
+                                                       RESPONSE_CODE_SERVER_ERROR: len(range(30, 8000, 3))})
+        self.assertEqual(summary.sections.most_common(), [('/book', 3 * len(range(30, 8000, 3))),
+                                                         ('/api', len(range(30, 8000, 3)))])
+
+    def test_expired_minutes_and_hours_are_rolled_up(self):
+        # Given
+        self._append_seconds(range(0, 7300, 10))
+
+        # When
+        hours = self.history.query(self.timestamp, self.timestamp + 7300, RESOLUTION_HOUR)
+        minutes = self.history.query(self.timestamp, self.timestamp + 7300, RESOLUTION_MINUTE)
+        seconds = self.history.query(self.timestamp + 7200, self.timestamp + 7300, RESOLUTION_SECOND)
+
+        # Then
+        self.assertEqual([(time - self.timestamp, summary.hits) for time, summary in hours],
+                         [(0, 4 * 360), (3600, 4 * 360)])
+        self.assertEqual(len(minutes), 121)
+        self.assertEqual([summary.hits for _, summary in minutes], [24] * 121)
+        self.assertEqual(len(seconds), 10)
+
+    def test_history_is_kept_when_reopened(self):
+        # Given
+        self._append_seconds(range(0, 4000, 5))
+        self.history.close()
+
+        # When
+        self.history = HistoryStore(self.path)
+        self._append_seconds(range(4000, 4100, 5))
+
+        # Then
+        self.assertEqual(self.history.summarize(self.timestamp, self.timestamp + 4100).hits, 4 * len(range(0, 4100, 5)))
+
+    def test_late_logs_of_a_second_already_stored_are_added(self):
+        # Given
+        self._append_seconds([0])
+
+        # When
+        self._append_seconds([0], hits=2)
+
+        # Then
+        self.assertEqual(self.history.summarize(self.timestamp, self.timestamp + 1).hits, 6)
+
+    def test_late_logs_of_a_minute_already_rolled_up_are_added_to_its_rollup(self):
+        # Given
+        self._append_seconds(range(0, 130, 10))
+
+        # When
+        self.history.append({self.timestamp + 5: self._create_bucket(5, hits=2)}, self.timestamp + 130)
+
+        # Then
+        minutes = self.history.query(self.timestamp, self.timestamp + 120, RESOLUTION_MINUTE)
+        self.assertEqual([summary.hits for _, summary in minutes], [26, 24])
+        self.assertEqual(self.history.summarize(self.timestamp, self.timestamp + 120).hits, 50)
+
+    def _test_expired_logs_are_stored(self, store):
+        # Given
+        log_queue = create_log_queue(store, self.history)
+
+        for second in range(20):
+            for _ in range(3):
+                log_queue.append(Log('127.0.0.1', 'paul', self.date + timedelta(seconds=second), 'GET', '/book/1',
+                                     'HTTP/1.0', 200, 100))
+
+        # When
+        log_queue.flush_expired(self.date + timedelta(seconds=9))
+
+        # Then
+        seconds = self.history.query(self.timestamp, self.timestamp + 20, RESOLUTION_SECOND)
+
+        self.assertEqual([(time - self.timestamp, summary.hits, summary.bytes) for time, summary in seconds],
+                         [(second, 3, 300) for second in range(10)])
+        self.assertEqual(seconds[0][1].sections, {'/book': 3})
+
+    def test_expired_logs_are_stored(self):
+        self._test_expired_logs_are_stored(STORE_OBJECTS)
+
+    def test_expired_logs_of_the_columnar_store_are_stored(self):
+        self._test_expired_logs_are_stored(STORE_COLUMNAR)
+
+    @unittest.skipIf(not numpy_backend.is_available(), 'numpy is not installed')
+    def test_expired_logs_of_the_numpy_store_are_stored(self):
+        self._test_expired_logs_are_stored(STORE_NUMPY)
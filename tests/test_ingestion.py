@@ -0,0 +1,151 @@
+import socket
+import time
+import unittest
+from threading import Thread
+
+from lib.ingestion import IngestionServer, IngestionParserThread, IngestionMetrics, strip_syslog_header, \
+    UDP_BATCH_SIZE, BATCH_QUEUE_SIZE, MAX_COUNTED_SENDERS, OTHER_SENDERS
+from lib.log_queue import LogQueue
+
+LINE = '10.0.0.1 - paul [09/May/2018:16:00:39 +0000] "GET /book/1 HTTP/1.0" 200 20'
+
+WAIT_TIMEOUT_S = 10
+
+
+class IngestionTest(unittest.TestCase):
+
+    def _start_server(self, udp=False, tcp=False):
+        server = IngestionServer('127.0.0.1', udp_port=0 if udp else None, tcp_port=0 if tcp else None)
+        server.start()
+        server.wait_ready()
+        self.addCleanup(server.stop)
+
+        return server
+
+    def _wait_until(self, condition):
+        deadline = time.monotonic() + WAIT_TIMEOUT_S
+
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Condition not met in {}s'.format(WAIT_TIMEOUT_S))
+
+            time.sleep(0.01)
+
+    def test_syslog_header_is_stripped(self):
+        self.assertEqual(strip_syslog_header('<190>Dec 12 00:00:00 web1 nginx: ' + LINE), LINE)
+        self.assertEqual(strip_syslog_header('<190>Dec  2 00:00:00 web1 nginx[123]: ' + LINE), LINE)
+        self.assertEqual(strip_syslog_header('<190>nginx: ' + LINE), LINE)
+        self.assertEqual(strip_syslog_header('<190>1 2018-12-12T00:00:00Z web1 nginx 123 - - ' + LINE), LINE)
+        self.assertEqual(strip_syslog_header('<190>1 2018-12-12T00:00:00Z web1 nginx - access [meta a="\\]"][b c="1"] '
+                                             + LINE), LINE)
+        self.assertEqual(strip_syslog_header('<190>' + LINE), LINE)
+        self.assertEqual(strip_syslog_header(LINE), LINE)
+
+    def test_lines_received_over_udp_and_tcp_are_parsed_into_the_queue(self):
+        # Given
+        server = self._start_server(udp=True, tcp=True)
+        log_queue = LogQueue()
+        IngestionParserThread(log_queue, server).start()
+
+        # When
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(udp_socket.close)
+
+        for _ in range(10):
+            udp_socket.sendto('<190>Dec 12 00:00:00 web1 nginx: {}'.format(LINE).encode(), server.udp_address)
+
+        with socket.create_connection(server.tcp_address) as tcp_socket:
+            tcp_socket.sendall(''.join(LINE + '\n' for _ in range(20)).encode() + LINE.encode())
+
+        # Then
+        self._wait_until(lambda: len(log_queue) == 31)
+
+        self.assertEqual(log_queue.get_retained_aggregates().hits, 31)
+        self.assertEqual(server.metrics.counts, {'127.0.0.1': [31, 0]})
+        self.assertTrue(server.metrics.get_report().startswith('Input udp:0 tcp:0: '))
+
+    def test_error_while_starting_to_listen_is_raised_to_the_caller(self):
+        # Given a port already listened on
+        server = self._start_server(tcp=True)
+        other_server = IngestionServer('127.0.0.1', tcp_port=server.tcp_address[1])
+
+        # When
+        other_server.start()
+
+        # Then
+        with self.assertRaises(OSError):
+            other_server.wait_ready()
+
+        other_server.stop()
+        self.assertFalse(other_server.is_alive())
+
+    def test_parser_thread_of_the_received_lines_has_no_file_position(self):
+        # Given
+        server = IngestionServer('127.0.0.1', udp_port=0)
+
+        # When
+        parser_thread = IngestionParserThread(LogQueue(), server)
+
+        # Then
+        self.assertIsNone(parser_thread.file_path)
+        self.assertIsNone(parser_thread.get_position())
+        self.assertEqual(parser_thread.metrics.name, 'udp:0')
+
+    def test_tcp_senders_are_slowed_down_while_the_parser_is_behind(self):
+        # Given a parser not consuming any batch
+        server = self._start_server(tcp=True)
+        line_count = 200000
+
+        def send():
+            with socket.create_connection(server.tcp_address) as tcp_socket:
+                tcp_socket.sendall(''.join(LINE + '\n' for _ in range(line_count)).encode())
+
+        sender_thread = Thread(target=send, daemon=True)
+        sender_thread.start()
+
+        # When
+        self._wait_until(server.batches.full)
+        time.sleep(0.2)
+
+        # Then the sender waits, and no line is lost once the parser catches up
+        self.assertTrue(sender_thread.is_alive())
+
+        received_count = 0
+
+        while received_count < line_count:
+            received_count += len(server.batches.get(timeout=WAIT_TIMEOUT_S))
+
+        self.assertEqual(received_count, line_count)
+        self.assertEqual(server.metrics.counts, {'127.0.0.1': [line_count, 0]})
+
+    def test_udp_datagrams_are_dropped_while_the_parser_is_behind(self):
+        # Given a full queue
+        server = IngestionServer('127.0.0.1', udp_port=0)
+
+        while not server.batches.full():
+            server.batches.put_nowait([LINE])
+
+        # When
+        for _ in range(UDP_BATCH_SIZE + 5):
+            server.receive_datagram(LINE.encode(), '10.0.0.2')
+
+        # Then the lines of the batch being built are kept, and the next ones dropped
+        self.assertEqual(len(server.udp_batch), UDP_BATCH_SIZE)
+        self.assertEqual(server.batches.qsize(), BATCH_QUEUE_SIZE)
+        self.assertEqual(server.metrics.counts, {'10.0.0.2': [UDP_BATCH_SIZE, 5]})
+
+    def test_senders_counted_are_bounded_and_reset_at_each_report(self):
+        # Given
+        metrics = IngestionMetrics('udp:0')
+
+        # When
+        for i in range(MAX_COUNTED_SENDERS + 10):
+            metrics.add('10.0.{}.{}'.format(i // 256, i % 256), received_count=1, dropped_count=1)
+
+        # Then
+        self.assertEqual(len(metrics.counts), MAX_COUNTED_SENDERS + 1)
+        self.assertEqual(metrics.counts[OTHER_SENDERS], [10, 10])
+
+        metrics.get_report()
+        self.assertEqual(metrics.counts, {})
+        self.assertEqual(metrics.dropped_count, MAX_COUNTED_SENDERS + 10)
@@ -0,0 +1,139 @@
+import unittest
+from datetime import datetime, timedelta
+
+from lib.aggregates import RESPONSE_CODE_TYPES
+from lib.log import Log, RESPONSE_CODE_SERVER_ERROR
+from lib.log_queue import LogQueue, ColumnarLogQueue, POLICY_DROP, POLICY_SAMPLE
+
+
+class LogQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log_queue = LogQueue()
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+    def _append_log(self, time_delta_s, resource='/book/1', status=200):
+        log = Log('127.0.0.1', 'paul', self.date + timedelta(seconds=time_delta_s), 'GET', resource, 'HTTP/1.0',
+                  status, 20)
+        self.log_queue.append(log)
+
+        return log
+
+    def test_get_logs_returns_the_logs_of_the_interval_excluding_its_end(self):
+        # Given
+        self._append_log(0)
+        log_in_interval = self._append_log(1, resource='/api/user', status=503)
+        self._append_log(2)
+
+        # When
+        logs = self.log_queue.get_logs(self.date + timedelta(seconds=1), self.date + timedelta(seconds=2))
+
+        # Then
+        self.assertEqual([str(log) for log in logs], [str(log_in_interval)])
+
+    def test_flush_expired_removes_the_logs_up_to_the_expiry_time(self):
+        # Given
+        for time_delta_s in range(10):
+            self._append_log(time_delta_s)
+
+        # When
+        self.log_queue.flush_expired(self.date + timedelta(seconds=6))
+
+        # Then
+        self.assertEqual([log.date for log in self.log_queue.get_all_logs()],
+                         [self.date + timedelta(seconds=7), self.date + timedelta(seconds=8),
+                          self.date + timedelta(seconds=9)])
+
+    def test_logs_appended_out_of_order_are_returned_in_chronological_order(self):
+        # Given
+        for time_delta_s in [0, 2, 1, 3, 5, 4]:
+            self._append_log(time_delta_s)
+
+        # When
+        logs = self.log_queue.get_logs(self.date, self.date + timedelta(seconds=10))
+
+        # Then
+        self.assertEqual([log.date for log in logs], [self.date + timedelta(seconds=i) for i in range(6)])
+
+    def test_log_older_than_the_reorder_window_is_still_counted(self):
+        # Given
+        for time_delta_s in range(10):
+            self._append_log(time_delta_s)
+
+        # When
+        self._append_log(0)
+
+        # Then
+        self.assertEqual(len(self.log_queue.get_all_logs()), 11)
+        self.assertEqual(self.log_queue.late_count, 1)
+
+    def test_logs_above_capacity_are_dropped_but_still_aggregated(self):
+        # Given
+        self.log_queue.capacity = 10
+        self.log_queue.overload_policy = POLICY_DROP
+
+        # When
+        for _ in range(15):
+            self._append_log(0)
+
+        # Then
+        self.assertEqual(len(self.log_queue.get_all_logs()), 10)
+        self.assertEqual(self.log_queue.dropped_count, 5)
+        self.assertEqual(self.log_queue.get_retained_aggregates().hits, 15)
+
+    def test_logs_are_sampled_once_the_queue_is_half_full(self):
+        # Given
+        self.log_queue.capacity = 10
+        self.log_queue.overload_policy = POLICY_SAMPLE
+
+        # When
+        for _ in range(25):
+            self._append_log(0)
+
+        # Then
+        self.assertEqual(len(self.log_queue.get_all_logs()), 7)
+        self.assertEqual(self.log_queue.sampled_out_count, 18)
+        self.assertEqual(self.log_queue.dropped_count, 0)
+
+
+class ColumnarLogQueueTest(LogQueueTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log_queue = ColumnarLogQueue()
+
+    def test_statuses_out_of_the_range_of_the_column_are_clamped(self):
+        # When
+        self._append_log(0, status=70000)
+        self._append_log(1, status=-1)
+
+        # Then
+        self.assertEqual([log.status for log in self.log_queue.get_all_logs()], [65535, 0])
+        self.assertEqual(dict(self.log_queue.get_retained_aggregates().get(RESPONSE_CODE_TYPES)),
+                         {RESPONSE_CODE_SERVER_ERROR: 1, None: 1})
+
+    def test_strings_are_stored_once(self):
+        # Given
+        for time_delta_s in range(10):
+            self._append_log(time_delta_s)
+
+        # When
+        self.log_queue.get_all_logs()
+
+        # Then
+        self.assertEqual(self.log_queue.resource_codes.strings, ['/book/1'])
+        self.assertEqual(list(self.log_queue.resources), [0] * 10)
+
+    def test_strings_of_the_expired_logs_are_released(self):
+        # Given logs of distinct resources
+        for i in range(4000):
+            self._append_log(i // 100, resource='/book/{}'.format(i))
+
+        # When
+        self.log_queue.flush_expired(self.date + timedelta(seconds=29))
+
+        # Then
+        self.assertEqual([log.resource for log in self.log_queue.get_all_logs()],
+                         ['/book/{}'.format(i) for i in range(3000, 4000)])
+        self.assertEqual(len(self.log_queue.resource_codes.strings), 1000)
+        self.assertEqual(self.log_queue.remote_host_codes.strings, ['127.0.0.1'])
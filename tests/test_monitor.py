@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime, timedelta
+from threading import Event
+
+from lib.console import ConsoleModel
+from lib.log_queue import LogQueue
+from lib.monitor import MonitorThreadGenerator
+
+
+class BlockingLogQueue(LogQueue):
+    """
+    A LogQueue blocking the monitor passes until they are released, to simulate slow passes
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = Event()
+        self.intervals = []
+
+    def flush_expired(self, expiry_time):
+        self.release.wait()
+
+    def get_aggregates(self, start_interval_time, end_interval_time):
+        self.intervals.append((start_interval_time, end_interval_time))
+        return super().get_aggregates(start_interval_time, end_interval_time)
+
+
+class MonitorThreadGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log_queue = BlockingLogQueue()
+        self.generator = MonitorThreadGenerator(self.log_queue, ConsoleModel())
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+    def tearDown(self):
+        self._wait_for_passes()
+
+    def _generate(self, tick):
+        """
+        Helper generating the pass of the given tick, ticking every 10s
+        """
+        start_interval = self.date + timedelta(seconds=(tick - 1) * 10)
+        end_interval = self.date + timedelta(seconds=tick * 10)
+
+        return self.generator.generate(task_start_time=end_interval, start_interval=start_interval,
+                                       end_interval=end_interval, expiry_time=self.date)
+
+    def _wait_for_passes(self):
+        self.log_queue.release.set()
+        self.generator.executor.submit(lambda: None).result()
+
+    def test_tick_happening_while_a_pass_is_running_is_skipped(self):
+        # Given
+        self.assertTrue(self._generate(tick=1))
+
+        # When
+        dispatched = self._generate(tick=2)
+
+        # Then
+        self.assertFalse(dispatched)
+        self.assertEqual(self.generator.metrics.skipped_passes, 1)
+
+    def test_interval_of_a_skipped_tick_is_coalesced_into_the_next_pass(self):
+        # Given
+        self._generate(tick=1)
+        self._generate(tick=2)
+        self._wait_for_passes()
+
+        # When
+        self._generate(tick=3)
+        self._wait_for_passes()
+
+        # Then
+        self.assertEqual(self.log_queue.intervals, [
+            (self.date, self.date + timedelta(seconds=10)),
+            (self.date + timedelta(seconds=10), self.date + timedelta(seconds=30))
+        ])
+
+    def test_exception_of_a_pass_is_logged_and_does_not_stop_the_next_passes(self):
+        # Given
+        self.log_queue.release.set()
+        self.log_queue.get_aggregates = lambda start_interval_time, end_interval_time: 1 / 0
+
+        # When
+        with self.assertLogs(level='ERROR') as logs:
+            self._generate(tick=1)
+            self._wait_for_passes()
+
+        # Then
+        self.assertIn('ZeroDivisionError', logs.output[0])
+
+        del self.log_queue.get_aggregates
+        self.assertTrue(self._generate(tick=2))
@@ -0,0 +1,114 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from lib import numpy_backend, stats, alerts
+from lib.aggregates import SECOND_HITS, SECOND_SERVER_ERRORS
+from lib.log import Log
+from lib.log_queue import ColumnarLogQueue, NumpyLogQueue, POLICY_DROP, POLICY_SAMPLE
+
+
+@unittest.skipIf(not numpy_backend.is_available(), 'numpy is not installed')
+class NumpyBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+    def _generate_logs(self, count):
+        """
+        Helper generating logs slightly out of order, with sections hit the same number of times
+        """
+        generator = random.Random(42)
+
+        return [Log(generator.choice(['10.0.0.1', '10.0.0.2']), 'paul',
+                    self.date + timedelta(seconds=i // 50 - generator.randint(0, 1)), 'GET',
+                    generator.choice(['/book/1', '/api/user', '/api', '/report/2', '/', '/help/faq']), 'HTTP/1.0',
+                    generator.choice([200, 201, 302, 404, 500, 503]), generator.randint(0, 5000),
+                    generator.choice([None, generator.random()]))
+                for i in range(count)]
+
+    def _compute_messages(self, log_queue, logs):
+        for log in logs:
+            log_queue.append(log)
+
+        log_queue.flush_expired(self.date + timedelta(seconds=5))
+
+        interval_stats = stats.compute(self.date, log_queue.get_aggregates(self.date + timedelta(seconds=10),
+                                                                           self.date + timedelta(seconds=20)))
+        retained_stats = stats.compute(self.date, log_queue.get_retained_aggregates())
+        retained_alerts = alerts.compute(self.date, log_queue.get_retained_aggregates())
+
+        return [str(message) for message in interval_stats + retained_stats + retained_alerts]
+
+    def test_vectorized_aggregates_give_the_same_stats_and_alerts(self):
+        # Given
+        logs = self._generate_logs(2000)
+
+        # When
+        messages = self._compute_messages(NumpyLogQueue(), logs)
+
+        # Then
+        self.assertEqual(messages, self._compute_messages(ColumnarLogQueue(), logs))
+
+    def test_logs_not_retained_under_overload_are_still_counted(self):
+        for policy in (POLICY_SAMPLE, POLICY_DROP):
+            # Given
+            logs = self._generate_logs(2000)
+            numpy_log_queue, columnar_log_queue = NumpyLogQueue(), ColumnarLogQueue()
+
+            for log_queue in (numpy_log_queue, columnar_log_queue):
+                log_queue.capacity = 300
+                log_queue.overload_policy = policy
+
+            # When
+            messages = self._compute_messages(numpy_log_queue, logs)
+
+            # Then
+            self.assertGreater(numpy_log_queue.dropped_count + numpy_log_queue.sampled_out_count, 1000)
+            self.assertEqual(messages, self._compute_messages(columnar_log_queue, logs))
+            self.assertEqual(numpy_log_queue.get_retained_aggregates().hits,
+                             columnar_log_queue.get_retained_aggregates().hits)
+
+    def test_vectorized_hits_per_second(self):
+        # Given
+        logs = self._generate_logs(500)
+        numpy_log_queue, columnar_log_queue = NumpyLogQueue(), ColumnarLogQueue()
+
+        # When
+        self._compute_messages(numpy_log_queue, logs)
+        self._compute_messages(columnar_log_queue, logs)
+
+        # Then
+        for name in (SECOND_HITS, SECOND_SERVER_ERRORS):
+            self.assertEqual(numpy_log_queue.get_retained_aggregates([name]).get(name),
+                             columnar_log_queue.get_retained_aggregates([name]).get(name))
+
+    def test_sections_are_still_counted_once_the_strings_of_the_expired_logs_are_released(self):
+        # Given logs of distinct resources
+        logs = [Log('10.0.0.1', 'paul', self.date + timedelta(seconds=i // 100), 'GET',
+                    '/section{}/{}'.format(i % 7, i), 'HTTP/1.0', 200, 10) for i in range(4000)]
+        numpy_log_queue, columnar_log_queue = NumpyLogQueue(), ColumnarLogQueue()
+
+        # When
+        for log_queue in (numpy_log_queue, columnar_log_queue):
+            for log in logs[:3000]:
+                log_queue.append(log)
+
+            log_queue.flush_expired(self.date + timedelta(seconds=24))
+
+            for log in logs[3000:]:
+                log_queue.append(log)
+
+        # Then
+        self.assertLessEqual(len(numpy_log_queue.resource_codes.strings), 1500)
+        self.assertEqual([str(message) for message in stats.compute(self.date,
+                                                                    numpy_log_queue.get_retained_aggregates())],
+                         [str(message) for message in stats.compute(self.date,
+                                                                    columnar_log_queue.get_retained_aggregates())])
+
+    def test_no_logs_gives_no_traffic(self):
+        # When
+        messages = self._compute_messages(NumpyLogQueue(), [])
+
+        # Then
+        self.assertEqual(messages, self._compute_messages(ColumnarLogQueue(), []))
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime
+
+from lib.parser import RegexLineParser, FastLineParser, TimestampDecoder
+
+LINES = [
+    '127.0.0.1 - james [09/May/2018:16:00:39 +0000] "GET /report HTTP/1.0" 200 123',
+    '127.0.0.1 - jill [09/May/2018:16:00:41 +0000] "GET /api/user HTTP/1.0" 200 234',
+    '127.0.0.1 - frank [09/May/2018:16:00:42 +0000] "POST /api/user HTTP/1.0" 200 34',
+    '127.0.0.1 - mary [09/May/2018:16:00:42 +0000] "POST /api/user HTTP/1.0" 503 12'
+]
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_fast_parser_returns_the_same_elements_as_the_regex_parser(self):
+        # Given
+        regex_parser = RegexLineParser()
+        fast_parser = FastLineParser()
+
+        # When
+        regex_parsed_lines = [regex_parser.parse(line) for line in LINES]
+        fast_parsed_lines = [fast_parser.parse(line) for line in LINES]
+
+        # Then
+        self.assertEqual(fast_parsed_lines, regex_parsed_lines)
+
+    def test_fast_parser_extracts_all_elements(self):
+        # When
+        parsed_line = FastLineParser().parse(LINES[3])
+
+        # Then
+        self.assertEqual(parsed_line, ('127.0.0.1', 'mary', datetime(2018, 5, 9, 16, 0, 42), 'POST', '/api/user',
+                                       'HTTP/1.0', 503, 12, None))
+
+    def test_fast_parser_extracts_the_request_duration_ending_the_line(self):
+        # Given
+        fast_parser = FastLineParser()
+
+        # When
+        microseconds_duration = fast_parser.parse(LINES[3] + ' 1500')[-1]
+        seconds_duration = fast_parser.parse(LINES[3] + ' "-" "curl/7.58.0" 0.250')[-1]
+        no_duration = fast_parser.parse(LINES[3] + ' "-" "curl/7.58.0"')[-1]
+
+        # Then
+        self.assertEqual(microseconds_duration, 0.0015)
+        self.assertEqual(seconds_duration, 0.25)
+        self.assertIsNone(no_duration)
+
+    def test_fast_parser_does_not_take_any_trailing_number_for_the_request_duration(self):
+        # Given
+        fast_parser = FastLineParser()
+
+        # When
+        durations = [fast_parser.parse(LINES[3] + suffix)[-1] for suffix in
+                     [' "-" "curl/7.58.0" "10.0.0.2" 42', ' "-" "curl/7.58.0" upstream 42', ' 1500 1', ' 0.25']]
+
+        # Then
+        self.assertEqual(durations, [None, None, None, None])
+
+    def test_fast_parser_ignores_malformed_lines(self):
+        # Given
+        fast_parser = FastLineParser()
+
+        # Then
+        self.assertIsNone(fast_parser.parse('not a log line'))
+        self.assertIsNone(fast_parser.parse('127.0.0.1 - mary [99/Foo/2018:16:00:42 +0000] "GET / HTTP/1.0" 200 1'))
+
+    def test_timestamp_decoder_reuses_the_datetime_of_an_already_seen_date(self):
+        # Given
+        decoder = TimestampDecoder()
+
+        # When
+        first_date = decoder.decode('09/May/2018:16:00:39 +0000')
+        second_date = decoder.decode('09/May/2018:16:00:39 +0000')
+
+        # Then
+        self.assertIs(first_date, second_date)
@@ -0,0 +1,61 @@
+import multiprocessing
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from lib import app_config
+from lib.aggregates import SECTION_COUNTS
+from lib.app_config import KEY_ALERT_RULES
+from lib.log_queue import LogQueue
+from lib.parser import ENGINE_FAST
+from lib.parser_pool import ParserPool
+
+LINES = [
+    '127.0.0.1 - james [09/May/2018:16:00:39 +0000] "GET /report HTTP/1.0" 200 123',
+    '127.0.0.1 - jill [09/May/2018:16:00:41 +0000] "GET /api/user HTTP/1.0" 200 234',
+    'not a log line',
+    '127.0.0.1 - mary [09/May/2018:16:00:42 +0000] "POST /api/user HTTP/1.0" 503 12'
+]
+
+
+class ParserPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser_pool = ParserPool(2, ENGINE_FAST)
+        self.log_queue = LogQueue()
+
+    def tearDown(self):
+        self.parser_pool.close()
+
+    def test_blocks_parsed_by_workers_are_merged_in_order_with_their_aggregates(self):
+        # When
+        batches = list(self.parser_pool.parse_blocks([LINES[:2], LINES[2:], []]))
+
+        for batch in batches:
+            self.log_queue.append_batch(batch.get_rows(), batch.buckets)
+
+        # Then
+        self.assertEqual([str(log.date) for log in self.log_queue.get_all_logs()],
+                         ['2018-05-09 16:00:39', '2018-05-09 16:00:41', '2018-05-09 16:00:42'])
+        self.assertEqual([batch.ignored_count for batch in batches], [0, 1])
+
+        aggregates = self.log_queue.get_aggregates(datetime(2018, 5, 9, 16, 0, 40), datetime(2018, 5, 9, 16, 0, 43))
+        self.assertEqual(aggregates.hits, 2)
+        self.assertEqual(aggregates.get('section_hits').most_common(), [('/api', 2)])
+
+    def test_workers_started_without_fork_get_the_alert_rules(self):
+        # Given
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: app_config.get(KEY_ALERT_RULES)})
+        app_config.update({KEY_ALERT_RULES: [{'type': 'section_traffic', 'threshold': 2, 'scope': '/api'}]})
+
+        with mock.patch('multiprocessing.Pool', multiprocessing.get_context('spawn').Pool):
+            parser_pool = ParserPool(1, ENGINE_FAST)
+
+        self.addCleanup(parser_pool.close)
+
+        # When
+        batches = list(parser_pool.parse_blocks([LINES, []]))
+
+        # Then
+        self.assertEqual([bucket.get(SECTION_COUNTS) for bucket in batches[0].buckets.values()],
+                         [{}, {'/api': 1}, {'/api': 1}])
@@ -0,0 +1,112 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from lib import app_config
+from lib.app_config import KEY_REFRESH_TIME_S, KEY_LOG_RETENTION_TIME_S, KEY_REQUEST_FREQUENCY_PER_S
+from lib.console import ConsoleModel
+from lib.history import HistoryStore
+from lib.log_queue import LogQueue, create_log_queue, to_timestamp, STORE_OBJECTS
+from lib.replay import Replayer
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+        app_config.update({
+            KEY_REFRESH_TIME_S: 10,
+            KEY_LOG_RETENTION_TIME_S: 10,
+            KEY_REQUEST_FREQUENCY_PER_S: 5
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_log_file(self, file_name, hits_per_second, open_file=open):
+        """
+        Helper writing a log file with, for each second, the number of hits given
+
+        :param hits_per_second: list of the number of hits of each second since the date
+        :return: the path of the file
+        """
+        file_path = os.path.join(self.directory, file_name)
+
+        with open_file(file_path, 'wt') as file:
+            for second, hits in enumerate(hits_per_second):
+                date = (self.date + timedelta(seconds=second)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+
+                for _ in range(hits):
+                    file.write('127.0.0.1 - paul [{}] "GET /book/1 HTTP/1.0" 200 20\n'.format(date))
+
+        return file_path
+
+    def _replay(self, file_paths, worker_count=0):
+        output = io.StringIO()
+        Replayer(LogQueue(), ConsoleModel(), file_paths, output=output, quiet=True, worker_count=worker_count).run()
+
+        return output.getvalue().splitlines()
+
+    def test_replaying_a_spike_outputs_the_alert_and_its_recovery(self):
+        # Given
+        file_path = self._write_log_file('access.log', [1] * 10 + [10] * 10 + [1] * 30)
+
+        # When
+        output = self._replay([file_path])
+
+        # Then
+        self.assertEqual(output, ['ALERT [2018-12-12 00:00:20] High traffic - 9 hits/s',
+                                  'RECOVERED [2018-12-12 00:00:30] Recovered "High traffic - 9 hits/s"'])
+
+    def test_replaying_compressed_files_merges_them_by_date(self):
+        # Given
+        file_paths = [self._write_log_file('access.log.1.gz', [3] * 20 + [1] * 30, open_file=gzip.open),
+                      self._write_log_file('access.log', [3] * 20 + [1] * 30)]
+
+        # When
+        output = self._replay(file_paths)
+
+        # Then
+        self.assertEqual(output, ['ALERT [2018-12-12 00:00:10] High traffic - 6 hits/s',
+                                  'RECOVERED [2018-12-12 00:00:30] Recovered "High traffic - 6 hits/s"'])
+
+    def test_replaying_compressed_files_with_workers_outputs_the_same_alerts(self):
+        # Given
+        file_paths = [self._write_log_file('access.log.2.gz', [1] * 10 + [10] * 10, open_file=gzip.open),
+                      self._write_log_file('access.log.1.gz', [1] * 30, open_file=gzip.open)]
+
+        # When
+        output = self._replay(file_paths, worker_count=2)
+
+        # Then
+        self.assertEqual(output, self._replay(file_paths))
+        self.assertEqual(output[0], 'ALERT [2018-12-12 00:00:20] High traffic - 10 hits/s')
+
+    def test_replaying_with_workers_scans_the_files_into_the_same_alerts(self):
+        # Given
+        file_path = self._write_log_file('access.log', [1] * 10 + [10] * 10 + [1] * 30)
+
+        # When
+        output = self._replay([file_path], worker_count=2)
+
+        # Then
+        self.assertEqual(output, self._replay([file_path]))
+
+    def test_replaying_into_a_history_stores_every_second(self):
+        # Given
+        file_path = self._write_log_file('access.log', [1] * 10 + [10] * 10 + [1] * 30)
+        history = HistoryStore(os.path.join(self.directory, 'history.db'))
+        self.addCleanup(history.close)
+
+        # When
+        Replayer(create_log_queue(STORE_OBJECTS, history), ConsoleModel(), [file_path], output=io.StringIO()).run()
+
+        # Then
+        self.assertEqual(history.summarize(to_timestamp(self.date), to_timestamp(self.date + timedelta(hours=1))).hits,
+                         140)
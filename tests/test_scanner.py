@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from lib import app_config
+from lib.aggregates import SECTION_HITS, REMOTE_HOST_HITS, RESPONSE_CODE_TYPES, BYTES, SECTION_COUNTS
+from lib.app_config import KEY_ALERT_RULES
+from lib.parser import ENGINE_FAST, ENGINE_REGEX
+from lib.scanner import Scanner, split_chunks
+
+
+class ScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'access.log')
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+        with open(self.file_path, 'w') as file:
+            for i in range(100):
+                date = (self.date + timedelta(seconds=i // 10)).strftime('%d/%b/%Y:%H:%M:%S +0000')
+                file.write('127.0.0.1 - paul [{}] "GET /{}/1 HTTP/1.0" {} 20\n'.format(
+                    date, 'book' if i % 2 else 'report', 200 if i % 3 else 503))
+
+            file.write('a malformed line\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _scan(self, worker_count, engine, chunk_count=None):
+        """
+        :return: a tuple (dictionary of epoch second to the Bucket of the logs of that second, list of the seconds in
+        the order they were scanned)
+        """
+        scanner = Scanner(worker_count, engine)
+        self.addCleanup(scanner.close)
+
+        buckets = {}
+        seconds = []
+
+        for second, bucket in scanner.scan(self.file_path, chunk_count):
+            seconds.append(second)
+
+            if second in buckets:
+                buckets[second].merge(bucket)
+            else:
+                buckets[second] = bucket
+
+        return buckets, seconds
+
+    def test_chunks_end_on_line_ends(self):
+        # When
+        chunks = split_chunks(self.file_path, 7)
+
+        # Then
+        with open(self.file_path, 'rb') as file:
+            data = file.read()
+
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(data))
+
+        for start, end in chunks:
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_scanning_in_chunks_gives_the_aggregates_of_a_single_chunk(self):
+        for engine in (ENGINE_FAST, ENGINE_REGEX):
+            # When
+            buckets, seconds = self._scan(2, engine, chunk_count=7)
+            single_chunk_buckets, _ = self._scan(1, engine, chunk_count=1)
+
+            # Then
+            self.assertEqual(seconds, sorted(seconds))
+            self.assertEqual(sum(bucket.hits for bucket in buckets.values()), 100)
+            self.assertEqual(sorted(buckets), sorted(single_chunk_buckets))
+            self.assertEqual(len(buckets), 10)
+
+            for second, bucket in buckets.items():
+                self.assertEqual(bucket.hits, 10)
+
+                for name in (SECTION_HITS, REMOTE_HOST_HITS):
+                    self.assertEqual(bucket.get(name).most_common(),
+                                     single_chunk_buckets[second].get(name).most_common())
+
+                for name in (RESPONSE_CODE_TYPES, BYTES):
+                    self.assertEqual(bucket.get(name), single_chunk_buckets[second].get(name))
+
+    def test_a_malformed_line_is_not_joined_to_the_next_line(self):
+        # Given
+        with open(self.file_path, 'w') as file:
+            file.write('truncated\n127.0.0.1 - paul [12/Dec/2018:00:00:00 +0000] "GET /book/1 HTTP/1.0" 200 20\n')
+
+        for engine in (ENGINE_FAST, ENGINE_REGEX):
+            # When
+            buckets, _ = self._scan(1, engine)
+
+            # Then
+            self.assertEqual(list(buckets), [1544572800])
+            self.assertEqual(buckets[1544572800].get(REMOTE_HOST_HITS).most_common(), [('127.0.0.1', 1)])
+
+    def test_workers_started_without_fork_get_the_alert_rules(self):
+        # Given
+        self.addCleanup(app_config.update, {KEY_ALERT_RULES: app_config.get(KEY_ALERT_RULES)})
+        app_config.update({KEY_ALERT_RULES: [{'type': 'section_traffic', 'threshold': 2, 'scope': '/book'}]})
+
+        # When
+        with mock.patch('multiprocessing.Pool', multiprocessing.get_context('spawn').Pool):
+            buckets, _ = self._scan(1, ENGINE_FAST)
+
+        # Then
+        self.assertEqual([bucket.get(SECTION_COUNTS) for bucket in buckets.values()], [{'/book': 5}] * 10)
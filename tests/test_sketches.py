@@ -0,0 +1,113 @@
+import random
+import unittest
+from collections import Counter
+
+from lib.sketches import SpaceSaving, HyperLogLog
+
+
+class SpaceSavingTest(unittest.TestCase):
+
+    def _generate_keys(self, count, distinct_count):
+        """
+        Helper generating a skewed stream of keys, a few keys being much more frequent than the others
+        """
+        generator = random.Random(42)
+        return ['/{}'.format(int(generator.paretovariate(1)) % distinct_count) for _ in range(count)]
+
+    def test_counts_are_exact_while_the_sketch_is_not_full(self):
+        # Given
+        keys = ['/api', '/book', '/api', '/report', '/book', '/api']
+        sketch = SpaceSaving(10)
+
+        # When
+        for key in keys:
+            sketch.add(key)
+
+        # Then
+        self.assertEqual(sketch.most_common(2), Counter(keys).most_common(2))
+        self.assertEqual(sketch.get_max_error(), 0)
+
+    def test_memory_is_bounded_and_heavy_hitters_are_found_within_the_error_bound(self):
+        # Given
+        keys = self._generate_keys(20000, 5000)
+        sketch = SpaceSaving(50)
+
+        # When
+        for key in keys:
+            sketch.add(key)
+
+        # Then
+        exact_counts = Counter(keys)
+
+        self.assertEqual(len(sketch), 50)
+        self.assertLessEqual(sketch.get_max_error(), len(keys) / 50)
+        self.assertEqual([key for key, _ in sketch.most_common(3)], [key for key, _ in exact_counts.most_common(3)])
+
+        for key, count in sketch.most_common():
+            self.assertGreaterEqual(count, exact_counts[key])
+            self.assertLessEqual(count, exact_counts[key] + sketch.get_max_error())
+
+    def test_merged_sketches_keep_the_error_bound(self):
+        # Given
+        keys = self._generate_keys(20000, 5000)
+        sketches = [SpaceSaving(50) for _ in range(4)]
+
+        for i, key in enumerate(keys):
+            sketches[i % 4].add(key)
+
+        # When
+        merged_sketch = SpaceSaving(50)
+
+        for sketch in sketches:
+            merged_sketch.merge(sketch)
+
+        # Then
+        exact_counts = Counter(keys)
+
+        self.assertEqual(len(merged_sketch), 50)
+        self.assertLessEqual(merged_sketch.get_max_error(), len(keys) / 50)
+
+        for key, count in merged_sketch.most_common():
+            self.assertGreaterEqual(count, exact_counts[key])
+            self.assertLessEqual(count, exact_counts[key] + merged_sketch.get_max_error())
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def test_small_counts_are_exact(self):
+        # Given
+        sketch = HyperLogLog()
+
+        # When
+        for key in ['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3']:
+            sketch.add(key)
+
+        # Then
+        self.assertEqual(sketch.count(), 3)
+
+    def test_large_counts_are_within_the_error_rate(self):
+        # Given
+        sketch = HyperLogLog()
+
+        # When
+        for i in range(100000):
+            sketch.add('/book/{}'.format(i % 50000))
+
+        # Then
+        self.assertAlmostEqual(sketch.count(), 50000, delta=50000 * 0.05)
+
+    def test_merged_sketches_count_the_union_of_their_keys(self):
+        # Given
+        sketches = [HyperLogLog() for _ in range(3)]
+
+        for i in range(30000):
+            sketches[i % 3].add('10.0.{}.{}'.format(i // 256 % 40, i % 256))
+
+        # When
+        merged_sketch = HyperLogLog()
+
+        for sketch in sketches:
+            merged_sketch.merge(sketch)
+
+        # Then
+        self.assertAlmostEqual(merged_sketch.count(), 10240, delta=10240 * 0.05)
@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime, timedelta
+
+from lib import app_config
+from lib.app_config import KEY_REFRESH_TIME_S, KEY_LOG_RETENTION_TIME_S
+from lib.console import ConsoleModel
+from lib.log import Log
+from lib.log_queue import LogQueue
+from lib.monitor import Monitor
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.console_model = ConsoleModel()
+        self.log_queue = LogQueue()
+
+        self.refresh_time_s = 10
+        self.date = datetime(year=2018, month=12, day=12, hour=0, minute=0, second=0)
+
+        app_config.update({
+            KEY_REFRESH_TIME_S: self.refresh_time_s,
+            KEY_LOG_RETENTION_TIME_S: 60
+        })
+
+    def _append_log(self, time_delta_s, resource='/book/1', status=200, bytes=20, duration=None):
+        self.log_queue.append(Log('127.0.0.1', 'paul', self.date + timedelta(seconds=time_delta_s), 'GET', resource,
+                                  'HTTP/1.0', status, bytes, duration))
+
+    def _run_monitor(self, interval_time_s=None):
+        """
+        Helper running a monitor over the interval [date, date + interval time[, the interval time being the refresh
+        time by default
+
+        :return: the messages of the stats computed
+        """
+        end_interval_time = self.date + timedelta(seconds=interval_time_s or self.refresh_time_s)
+
+        Monitor(self.log_queue, self.console_model, end_interval_time, self.date, end_interval_time,
+                self.date - timedelta(seconds=60)).run()
+
+        return [str(stat) for stat in self.console_model.get_stats_messages()]
+
+    def test_no_logs_in_interval_shows_no_traffic(self):
+        # Given
+        self._append_log(self.refresh_time_s)
+
+        # When
+        stats = self._run_monitor()
+
+        # Then
+        self.assertEqual(stats, ['Currently no traffic'])
+
+    def test_hits_per_second_are_averaged_over_a_coalesced_interval(self):
+        # Given the logs of 3 refresh intervals, the ticks of the first 2 having been skipped
+        for time_delta_s in range(3 * self.refresh_time_s):
+            self._append_log(time_delta_s)
+
+        # When
+        stats = self._run_monitor(interval_time_s=3 * self.refresh_time_s)
+
+        # Then
+        self.assertEqual(stats[:2], ['Total hits: 30', 'Average hit count: 1.0/s'])
+
+    def test_stats_only_count_the_logs_of_the_interval(self):
+        # Given
+        self._append_log(-1)
+        self._append_log(0, resource='/api/user', status=503, bytes=100)
+        self._append_log(3, resource='/api/order', status=201, bytes=10)
+        self._append_log(5, resource='/book/4', status=404, bytes=1)
+        self._append_log(9, resource='/api', status=200, bytes=5)
+        self._append_log(self.refresh_time_s)
+
+        # When
+        stats = self._run_monitor()
+
+        # Then
+        self.assertEqual(stats, [
+            'Total hits: 4',
+            'Average hit count: 0.4/s',
+            'Most hit section 1: /api (3)',
+            'Most hit section 2: /book (1)',
+            'Most active host 1: 127.0.0.1 (4)',
+            'Most active user 1: paul (4)',
+            'Unique clients: ~1',
+            'Unique resources: ~4',
+            '2xx count: 2',
+            '4xx count: 1',
+            '5xx count: 1',
+            'Total bytes transfered: 116',
+            'Bytes p50/p95/p99: 5 / 10 / 10',
+            'Bytes p50/p95/p99 over 60s: 10 / 20 / 20'
+        ])
+
+    def test_response_time_percentiles_are_shown_for_logs_with_a_duration(self):
+        # Given
+        for i in range(100):
+            self._append_log(i % 10, duration=(i + 1) / 1000)
+
+        # When
+        stats = self._run_monitor()
+
+        # Then
+        percentiles_stat = next(stat for stat in stats if stat.startswith('Response time p50/p95/p99:'))
+        percentiles = [float(value) for value in percentiles_stat.split(': ')[1][:-len(' ms')].split(' / ')]
+
+        for percentile, expected_percentile in zip(percentiles, [50, 95, 99]):
+            self.assertAlmostEqual(percentile, expected_percentile, delta=expected_percentile * 0.01 + 1)